@@ -0,0 +1,315 @@
+#import the necessary modules
+import html as htmlEntities
+import json
+import os
+import random
+from typing import Dict, List
+from scraping_utils.http_functions import fetchPage
+
+#define the ingredients, units and preparations synthetic recipes are drawn from
+ingredientNames = ['chicken thighs', 'chicken breasts', 'lemon', 'garlic cloves', 'olive oil', 'butter', 'double cream', 'milk', 'parmesan', 'onion', 'red onion', 'chopped tomatoes', 'basil', 'rice', 'spaghetti', 'plain flour', 'caster sugar', 'eggs', 'beef mince', 'carrots', 'celery', 'thyme', 'rosemary', 'chickpeas', 'coconut milk', 'curry paste', 'spinach', 'feta', 'potatoes', 'salmon fillets', 'soy sauce', 'ginger', 'honey', 'mushrooms', 'vegetable stock']
+quantities = ['1', '2', '3', '4', '½', '200g', '400g', '1 tbsp', '2 tbsp', '1 tsp', '100ml', '250ml', 'a handful of', 'a pinch of']
+preparations = ['', ', chopped', ', sliced', ', crushed', ', grated', ', finely chopped', ', to serve']
+titleWords = ['Lemon', 'Garlic', 'Creamy', 'Spicy', 'Easy', 'One-pot', 'Roast', 'Herby', 'Smoky', 'Quick', 'Traybake', 'Curry', 'Pasta', 'Stew', 'Salad', 'Soup', 'Pie', 'Risotto']
+skillLevels = ['Easy', 'More effort', 'A challenge']
+
+#define the size of the markup surrounding the recipe, so that parsing costs resemble a real page
+defaultPaddingBytes = 200_000
+
+
+def generatePadding(generator: random.Random, paddingBytes: int) -> str:
+    """
+    Generates navigation, promotional and script markup that the scraper does not read, as found around the content of a real page.
+
+    Args:
+        generator (random.Random): The random generator to draw from
+        paddingBytes (int): The approximate size of the markup to generate
+
+    Returns:
+        str: The generated markup
+    """
+
+    parts = []
+    size = 0
+
+    while size < paddingBytes:
+        slug = '-'.join(generator.sample(titleWords, 3)).lower()
+        part = (
+            f'<div class="card card--promo"><a class="card__link" href="/recipes/collection/{slug}">'
+            f'<img class="card__image" src="https://images.example.com/{slug}.jpg" alt="{slug}"><span class="card__title">{slug.replace("-", " ")}</span></a>'
+            f'<script>window.dataLayer=window.dataLayer||[];window.dataLayer.push({{"event":"impression","slug":"{slug}"}});</script></div>\n'
+        )
+        parts.append(part)
+        size += len(part)
+
+    return ''.join(parts)
+
+
+def generateRecipe(index: int) -> Dict[str, any]:
+    """
+    Generates the content of a synthetic recipe, the same for every call with the same index.
+
+    Args:
+        index (int): The index of the recipe
+
+    Returns:
+        Dict[str, any]: The recipe's slug, title, author, ingredients, method, times, skill level, rating and nutrition
+    """
+
+    generator = random.Random(index)
+    title = ' '.join(generator.sample(titleWords, 3))
+    ingredients = []
+
+    for name in generator.sample(ingredientNames, generator.randint(5, 14)):
+        ingredients.append({'name': name, 'text': f'{generator.choice(quantities)} {name}{generator.choice(preparations)}', 'linked': generator.random() < 0.7})
+
+    return {
+        'slug': f'{title.lower().replace(" ", "-")}-{index}',
+        'title': title,
+        'author': f'Cook {generator.randint(1, 40)}',
+        'ingredients': ingredients,
+        'method': [f'Step {step + 1}: ' + ' '.join(generator.choice(['Heat', 'Stir', 'Add', 'Simmer', 'Season', 'Bake', 'Serve']) + ' the ' + generator.choice(ingredientNames) + '.' for _ in range(generator.randint(2, 5))) for step in range(generator.randint(3, 8))],
+        'prepTime': generator.choice([5, 10, 15, 20, 30, 45]),
+        'cookTime': generator.choice([10, 20, 30, 45, 60, 90, 120]),
+        'skillLevel': generator.choice(skillLevels),
+        'rating': round(generator.uniform(2.5, 5.0), 1),
+        'ratingsCount': generator.randint(1, 900),
+        'nutrition': {name: round(generator.uniform(low, high), 1) for name, low, high in (('kcal', 150, 1100), ('fat', 1, 60), ('saturates', 0, 25), ('carbs', 2, 120), ('sugars', 0, 50), ('fibre', 0, 15), ('protein', 2, 70), ('salt', 0, 4))}
+    }
+
+
+def formatDuration(minutes: int) -> str:
+    """
+    Formats a number of minutes as the text shown on a recipe page, such as '1 hr and 10 mins'.
+
+    Args:
+        minutes (int): The number of minutes
+
+    Returns:
+        str: The formatted duration
+    """
+
+    hours, minutes = divmod(minutes, 60)
+    parts = ([f'{hours} hr'] if hours else []) + ([f'{minutes} mins'] if minutes else [])
+
+    return ' and '.join(parts)
+
+
+def generateRecipePage(index: int, paddingBytes: int = defaultPaddingBytes) -> str:
+    """
+    Generates a synthetic recipe page with the structure of a BBC Good Food recipe page, including its JSON-LD block.
+
+    Args:
+        index (int): The index of the recipe, determining its content
+        paddingBytes (int): The approximate size of the markup surrounding the recipe
+
+    Returns:
+        str: The html of the page
+    """
+
+    recipe = generateRecipe(index)
+    generator = random.Random(-index - 1)
+    escape = htmlEntities.escape
+    nutrition = recipe['nutrition']
+
+    structuredData = {
+        '@context': 'https://schema.org',
+        '@type': 'Recipe',
+        'name': recipe['title'],
+        'image': {'@type': 'ImageObject', 'url': f'https://images.example.com/{recipe["slug"]}.jpg'},
+        'author': {'@type': 'Person', 'name': recipe['author']},
+        'prepTime': f'PT{recipe["prepTime"]}M',
+        'cookTime': f'PT{recipe["cookTime"] // 60}H{recipe["cookTime"] % 60}M',
+        'recipeIngredient': [ingredient['text'] for ingredient in recipe['ingredients']],
+        'recipeInstructions': [{'@type': 'HowToStep', 'text': f'<p>{escape(step)}</p>'} for step in recipe['method']],
+        'nutrition': {'@type': 'NutritionInformation', 'calories': f'{nutrition["kcal"]} calories', 'fatContent': f'{nutrition["fat"]} grams fat', 'saturatedFatContent': f'{nutrition["saturates"]} grams saturated fat', 'carbohydrateContent': f'{nutrition["carbs"]} grams carbohydrates', 'sugarContent': f'{nutrition["sugars"]} grams sugar', 'fiberContent': f'{nutrition["fibre"]} grams fiber', 'proteinContent': f'{nutrition["protein"]} grams protein'},
+        'aggregateRating': {'@type': 'AggregateRating', 'ratingValue': recipe['rating'], 'ratingCount': recipe['ratingsCount']}
+    }
+
+    #build each ingredient, linking its name as the site does for most ingredients
+    ingredientItems = []
+
+    for ingredient in recipe['ingredients']:
+        text = escape(ingredient['text'])
+
+        if ingredient['linked']:
+            text = text.replace(escape(ingredient['name']), f'<a class="link--styled" href="/glossary/{ingredient["name"].replace(" ", "-")}">{escape(ingredient["name"])}</a>', 1)
+
+        ingredientItems.append(f'<li class="pb-xxs pt-xxs list-item">{text}</li>')
+
+    nutritionRows = ''.join(f'<tr class="key-value-blocks__item"><td class="key-value-blocks__key">{key}</td><td class="key-value-blocks__value">{value}{"" if key == "kcal" else "g"}</td></tr>' for key, value in nutrition.items())
+    methodSteps = ''.join(f'<li class="pb-xs pt-xs list-item"><div class="editor-content"><p>{escape(step)}</p></div></li>' for step in recipe['method'])
+
+    return f'''<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{escape(recipe["title"])} | Good Food</title>
+<script type="application/ld+json">{json.dumps(structuredData)}</script>
+</head>
+<body>
+<header class="site-header"><nav>{generatePadding(generator, paddingBytes // 2)}</nav></header>
+<main>
+<div class="post-header">
+<div class="post-header__title"><h1 class="heading-1">{escape(recipe["title"])}</h1></div>
+<div class="author-link"><a href="/author/{recipe["author"].replace(" ", "-").lower()}">{escape(recipe["author"])}</a></div>
+<ul class="post-header__cook-and-prep-time">
+<li>Prep: <time datetime="PT{recipe["prepTime"]}M">{formatDuration(recipe["prepTime"])}</time></li>
+<li>Cook: <time datetime="PT{recipe["cookTime"]}M">{formatDuration(recipe["cookTime"])}</time></li>
+</ul>
+<div class="post-header__skill-level">{recipe["skillLevel"]}</div>
+<div class="rating__values"><span class="sr-only">A star rating of {recipe["rating"]} out of 5.</span><span class="rating__count-text">{recipe["ratingsCount"]} ratings</span></div>
+</div>
+<div class="image__container"><img class="image__img" src="https://images.example.com/{recipe["slug"]}.jpg" alt="{escape(recipe["title"])}"></div>
+<table class="key-value-blocks">{nutritionRows}</table>
+<section class="recipe__ingredients"><ul>{"".join(ingredientItems)}</ul></section>
+<section class="recipe__method-steps"><ul>{methodSteps}</ul></section>
+</main>
+<footer class="site-footer">{generatePadding(generator, paddingBytes - paddingBytes // 2)}</footer>
+</body>
+</html>
+'''
+
+
+def generateSearchPage(page: int, recipesPerPage: int = 24, paddingBytes: int = defaultPaddingBytes // 2) -> str:
+    """
+    Generates a synthetic search page linking to the recipes of that page, with the structure of a BBC Good Food search page.
+
+    Args:
+        page (int): The search page number, determining the recipes linked
+        recipesPerPage (int): The number of recipes linked from each page
+        paddingBytes (int): The approximate size of the markup surrounding the recipe cards
+
+    Returns:
+        str: The html of the page
+    """
+
+    generator = random.Random(page * 7919)
+    cards = []
+
+    for index in range((page - 1) * recipesPerPage, page * recipesPerPage):
+        recipe = generateRecipe(index)
+        cards.append(f'<article class="card"><a class="link d-block" href="/recipes/{recipe["slug"]}"><h2 class="heading-4">{htmlEntities.escape(recipe["title"])}</h2></a></article>')
+
+    return f'''<!DOCTYPE html>
+<html lang="en">
+<head><meta charset="utf-8"><title>Search | Good Food</title></head>
+<body>
+<header class="site-header"><nav>{generatePadding(generator, paddingBytes // 2)}</nav></header>
+<div class="layout-md-rail__primary">{"".join(cards)}</div>
+<footer class="site-footer">{generatePadding(generator, paddingBytes - paddingBytes // 2)}</footer>
+</body>
+</html>
+'''
+
+
+def generateSitemapIndex(siteUrl: str, sitemapCount: int) -> str:
+    """
+    Generates a synthetic sitemap index listing the recipe sitemaps of the site, along with a sitemap of other pages.
+
+    Args:
+        siteUrl (str): The url the site is served at, as sitemaps list absolute urls
+        sitemapCount (int): The number of recipe sitemaps
+
+    Returns:
+        str: The xml of the sitemap index
+    """
+
+    sitemaps = [f'<sitemap><loc>{siteUrl}/sitemaps/recipe-{part}.xml</loc><lastmod>2024-06-01</lastmod></sitemap>' for part in range(1, sitemapCount + 1)]
+    sitemaps.append(f'<sitemap><loc>{siteUrl}/sitemaps/article-1.xml</loc></sitemap>')
+
+    return '<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">' + ''.join(sitemaps) + '</sitemapindex>\n'
+
+
+def generateRecipeSitemap(siteUrl: str, part: int, recipeCount: int, recipesPerSitemap: int) -> str:
+    """
+    Generates a synthetic recipe sitemap, listing a range of the site's recipes and a collection page, each with a lastmod.
+
+    Args:
+        siteUrl (str): The url the site is served at, as sitemaps list absolute urls
+        part (int): The number of the sitemap, determining the recipes listed
+        recipeCount (int): The number of recipes on the site
+        recipesPerSitemap (int): The number of recipes listed in each sitemap
+
+    Returns:
+        str: The xml of the sitemap
+    """
+
+    urls = [f'<url><loc>{siteUrl}/recipes/collection/collection-{part}</loc></url>']
+
+    for index in range((part - 1) * recipesPerSitemap, min(part * recipesPerSitemap, recipeCount)):
+        urls.append(f'<url><loc>{siteUrl}/recipes/{generateRecipe(index)["slug"]}</loc><lastmod>2024-{index % 12 + 1:02d}-{index % 28 + 1:02d}</lastmod></url>')
+
+    return '<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">' + ''.join(urls) + '</urlset>\n'
+
+
+def findRecipeIndex(slug: str) -> int | None:
+    """
+    Finds the index of a synthetic recipe from the slug it is linked by.
+
+    Args:
+        slug (str): The recipe slug, ending in its index
+
+    Returns:
+        int | None: The recipe's index, or None if the slug is not of a synthetic recipe
+    """
+
+    index = slug.rsplit('-', 1)[-1]
+    return int(index) if index.isdigit() else None
+
+
+def getFixturePath(directory: str, path: str) -> str:
+    """
+    Finds the file a recorded page is stored in, from the path it was requested at.
+
+    Args:
+        directory (str): The fixture directory
+        path (str): The request path, such as '/search?page=2' or '/recipes/lemon-chicken'
+
+    Returns:
+        str: The fixture file path
+    """
+
+    name = path.strip('/').replace('?', '_').replace('=', '_').replace('/', os.sep)
+    return os.path.join(directory, f'{name}.html')
+
+
+def recordFixtures(directory: str, startPage: int, endPage: int, recipesPerPage: int | None = None) -> List[str]:
+    """
+    Records real search pages, and the recipe pages they link to, into a fixture directory for the stand-in server to replay.
+
+    Args:
+        directory (str): The directory to record pages in
+        startPage (int): The first search page to record
+        endPage (int): The last search page to record
+        recipesPerPage (int | None): The maximum number of recipes to record from each search page, or None to record them all
+
+    Returns:
+        List[str]: The paths of the pages recorded
+    """
+
+    from scraping_utils.scraping_functions import baseUrl, getRecipeUrlsFromPage
+
+    recorded = []
+
+    def record(path: str) -> None:
+        html = fetchPage(f'{baseUrl}{path}')
+
+        if html is None:
+            return
+
+        filename = getFixturePath(directory, path)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+        with open(filename, mode='w', encoding='utf-8') as file:
+            file.write(html)
+
+        recorded.append(path)
+
+    for page in range(startPage, endPage + 1):
+        record(f'/search?page={page}')
+
+        for url in (getRecipeUrlsFromPage(page) or [])[:recipesPerPage]:
+            record(url[len(baseUrl):])
+
+    return recorded
@@ -0,0 +1,358 @@
+#import the necessary modules
+import argparse
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+from benchmarks.fixture_functions import generateRecipe, generateRecipePage, recordFixtures
+from benchmarks.stand_in_server import StandInServer
+from monitoring_utils.logging_functions import configureLogging
+from scraping_utils.cache_functions import configureCache
+from scraping_utils.http_functions import configureHttpClient
+from scraping_utils.scraping_functions import compareExtractionPaths, configureBaseUrl, extractRecipeDetails, getRecipeDetailsMany, getRecipeUrlsFromPages
+from text_utils.ingredient_cache import configureIngredientCache
+
+#define the version of the results format
+resultsFormatVersion = 1
+
+
+def getCommit() -> str | None:
+    """
+    Finds the git commit the benchmarks are run on, so that results can be compared across commits.
+
+    Returns:
+        str | None: The commit hash, or None if it cannot be found
+    """
+
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except(Exception):
+        return None
+
+
+def benchmarkUrlDiscovery(server: StandInServer, pages: int, concurrency: int) -> Dict[str, float]:
+    """
+    Measures the rate at which getRecipeUrlsFromPages crawls search pages from the stand-in server.
+
+    Args:
+        server (StandInServer): The running stand-in server
+        pages (int): The number of search pages to crawl
+        concurrency (int): The maximum number of pages requested at once
+
+    Returns:
+        Dict[str, float]: The pages crawled per second, the total seconds and the number of urls found
+    """
+
+    start = time.perf_counter()
+    urls = getRecipeUrlsFromPages(1, pages, concurrency)
+    seconds = time.perf_counter() - start
+
+    return {'pagesPerSecond': pages / seconds, 'seconds': seconds, 'urls': len(urls)}
+
+
+def benchmarkExtraction(recipes: int, repeats: int) -> Dict[str, float]:
+    """
+    Measures the time extractRecipeDetails takes to parse a recipe page, the work getRecipeDetails does once a page is fetched.
+
+    Args:
+        recipes (int): The number of distinct synthetic recipe pages to parse
+        repeats (int): The number of times each page is parsed
+
+    Returns:
+        Dict[str, float]: The mean milliseconds per page and the mean page size in kilobytes
+    """
+
+    pages = [generateRecipePage(index) for index in range(recipes)]
+
+    #parse each page once before timing, so that one-off imports are not measured
+    extractRecipeDetails(pages[0], 'warm-up', False)
+
+    start = time.perf_counter()
+
+    for _ in range(repeats):
+        for index, html in enumerate(pages):
+            extractRecipeDetails(html, f'recipe-{index}', False)
+
+    seconds = time.perf_counter() - start
+
+    return {'millisecondsPerPage': seconds * 1000 / (recipes * repeats), 'pageKilobytes': sum(len(page) for page in pages) / len(pages) / 1024}
+
+
+def benchmarkRecipeDetails(server: StandInServer, recipes: int, concurrency: int, processes: int) -> Dict[str, float]:
+    """
+    Measures the rate at which getRecipeDetailsMany fetches and extracts recipe pages from the stand-in server.
+
+    Args:
+        server (StandInServer): The running stand-in server
+        recipes (int): The number of recipes to scrape
+        concurrency (int): The maximum number of pages requested at once
+        processes (int): The number of processes to parse pages in, or zero to parse them on the fetching threads
+
+    Returns:
+        Dict[str, float]: The recipes scraped per second, the total seconds and the number of recipes that failed
+    """
+
+    urls = [f'{server.url}/recipes/{generateRecipe(index)["slug"]}' for index in range(recipes)]
+
+    start = time.perf_counter()
+    failures = sum(1 for _, details in getRecipeDetailsMany(urls, False, concurrency, processes=processes) if details is None)
+    seconds = time.perf_counter() - start
+
+    return {'recipesPerSecond': recipes / seconds, 'seconds': seconds, 'failures': failures}
+
+
+def benchmarkIngredientParsing(recipes: int) -> Dict[str, float]:
+    """
+    Measures the time the NLP takes to find raw ingredient names, parsing each distinct ingredient individually and then in batches.
+
+    The ingredient cache is emptied before each measurement so that every ingredient is parsed.
+
+    Args:
+        recipes (int): The number of synthetic recipes whose measured ingredients are parsed
+
+    Returns:
+        Dict[str, float]: The mean milliseconds per ingredient for individual and batched parsing, or the error raised if the NLP is unavailable
+    """
+
+    from text_utils.text_manipulation import findRawIngredient, findRawIngredients, getIngredientParser
+
+    texts = list(dict.fromkeys(ingredient['text'] for index in range(recipes) for ingredient in generateRecipe(index)['ingredients']))
+
+    #parse one ingredient directly, as findRawIngredient hides the parser's errors, to check the NLP and its model are available
+    try:
+        getIngredientParser().parse_ingredient(texts[0])
+    except(Exception) as e:
+        return {'error': str(e)}
+
+    configureIngredientCache()
+    start = time.perf_counter()
+
+    for text in texts:
+        findRawIngredient(text)
+
+    individualSeconds = time.perf_counter() - start
+
+    configureIngredientCache()
+    start = time.perf_counter()
+    findRawIngredients(texts)
+    batchSeconds = time.perf_counter() - start
+
+    return {'millisecondsPerIngredient': individualSeconds * 1000 / len(texts), 'batchMillisecondsPerIngredient': batchSeconds * 1000 / len(texts), 'ingredients': len(texts)}
+
+
+def runBenchmarks(arguments: argparse.Namespace) -> Dict[str, any]:
+    """
+    Runs every benchmark against a stand-in server configured from the command line arguments.
+
+    Args:
+        arguments (argparse.Namespace): The parsed arguments of the run subcommand
+
+    Returns:
+        Dict[str, any]: The results, along with the commit, environment and settings they were measured under
+    """
+
+    results = {}
+
+    #retry injected failures quickly, and never serve pages from a cache
+    configureHttpClient(retries=5, backoffFactor=0.05, maxBackoff=1.0, poolSize=max(arguments.concurrency))
+    configureCache(None)
+
+    with StandInServer(arguments.fixtures, arguments.latency, arguments.jitter, arguments.error_rate, arguments.rate_limit_rate, searchPages=arguments.pages) as server:
+        configureBaseUrl(server.url)
+
+        #silence the scraper's progress output while measuring, leaving only errors
+        configureLogging('ERROR')
+
+        for concurrency in arguments.concurrency:
+            results[f'urlDiscovery.concurrency={concurrency}'] = benchmarkUrlDiscovery(server, arguments.pages, concurrency)
+
+        results['extraction'] = benchmarkExtraction(arguments.extraction_pages, arguments.repeats)
+
+        for concurrency in arguments.concurrency:
+            results[f'recipeDetails.concurrency={concurrency}'] = benchmarkRecipeDetails(server, arguments.recipes, concurrency, arguments.processes)
+
+        if not arguments.skip_nlp:
+            results['ingredientParsing'] = benchmarkIngredientParsing(arguments.nlp_recipes)
+
+        statusCounts = dict(server.statusCounts)
+
+    return {
+        'version': resultsFormatVersion,
+        'commit': getCommit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(), 'processor': platform.processor()},
+        'settings': {key: value for key, value in vars(arguments).items() if key not in ('command', 'output')},
+        'serverStatusCounts': statusCounts,
+        'results': results
+    }
+
+
+def compareResults(baseline: Dict[str, any], current: Dict[str, any], threshold: float) -> List[str]:
+    """
+    Compares two sets of results, finding the metrics that regressed by more than a threshold.
+
+    Metrics ending in 'PerSecond' are better when higher, and metrics starting with 'milliseconds' are better when lower. Other values are not compared.
+
+    Args:
+        baseline (Dict[str, any]): The results to compare against, such as those of the previous commit
+        current (Dict[str, any]): The results to check
+        threshold (float): The proportional change beyond which a metric has regressed, such as 0.1 for 10%
+
+    Returns:
+        List[str]: A description of each regression found
+    """
+
+    regressions = []
+
+    for benchmark, metrics in current['results'].items():
+        for metric, value in metrics.items():
+            baselineValue = baseline['results'].get(benchmark, {}).get(metric)
+
+            if not isinstance(value, (int, float)) or not isinstance(baselineValue, (int, float)) or baselineValue == 0:
+                continue
+
+            change = (value - baselineValue) / baselineValue
+
+            if metric.endswith('PerSecond'):
+                regressed = change < -threshold
+            elif metric.startswith('milliseconds') or metric.startswith('batchMilliseconds'):
+                regressed = change > threshold
+            else:
+                continue
+
+            print(f'{benchmark} {metric}: {baselineValue:.3f} -> {value:.3f} ({change:+.1%})' + (' REGRESSION' if regressed else ''))
+
+            if regressed:
+                regressions.append(f'{benchmark} {metric} changed by {change:+.1%}')
+
+    return regressions
+
+
+def checkExtractionPaths(directory: str, precise: bool) -> int:
+    """
+    Extracts every recorded recipe page with and without its json-ld, printing each field the two paths disagree on.
+
+    Args:
+        directory (str): The fixture directory the pages were recorded in
+        precise (bool): Determines whether additional precision should be used for obtaining ingredient names
+
+    Returns:
+        int: The number of pages the paths disagree on
+    """
+
+    filenames = sorted(glob.glob(os.path.join(directory, 'recipes', '*.html')))
+    disagreements = 0
+
+    for filename in filenames:
+        with open(filename, mode='r', encoding='utf-8') as file:
+            differences = compareExtractionPaths(file.read(), precise)
+
+        if differences:
+            disagreements += 1
+
+            for field, (structuredValue, markupValue) in differences.items():
+                print(f'{os.path.basename(filename)}: {field} is {structuredValue!r} from the json-ld but {markupValue!r} from the markup')
+
+    print(f'The extraction paths agreed on {len(filenames) - disagreements} of {len(filenames)} recorded recipe pages')
+    return disagreements
+
+
+def parseArguments(arguments: List[str]) -> argparse.Namespace:
+    """
+    Parse the command line arguments of the benchmark harness.
+
+    Args:
+        arguments (List[str]): The command line arguments, excluding the program name
+
+    Returns:
+        argparse.Namespace: The parsed arguments, including the subcommand chosen
+    """
+
+    parser = argparse.ArgumentParser(description='Benchmark the scraper offline against a local stand-in server.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    runParser = subparsers.add_parser('run', help='Run the benchmarks and write the results as JSON')
+    runParser.add_argument('--output', '-o', required=True, help='The JSON file to write the results to')
+    runParser.add_argument('--baseline', help='A results file to compare against, exiting with an error if any metric regressed')
+    runParser.add_argument('--threshold', type=float, default=0.1, help='The proportional change counted as a regression')
+    runParser.add_argument('--fixtures', help='A directory of recorded pages to serve in place of synthetic pages')
+    runParser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16], help='The concurrency levels to measure')
+    runParser.add_argument('--pages', type=int, default=20, help='The number of search pages to crawl')
+    runParser.add_argument('--recipes', type=int, default=100, help='The number of recipe pages to scrape')
+    runParser.add_argument('--processes', type=int, default=0, help='The number of processes to parse recipe pages in')
+    runParser.add_argument('--extraction-pages', type=int, default=20, help='The number of distinct pages parsed when timing extraction')
+    runParser.add_argument('--repeats', type=int, default=5, help='The number of times each page is parsed when timing extraction')
+    runParser.add_argument('--nlp-recipes', type=int, default=50, help='The number of recipes whose ingredients are parsed when timing the NLP')
+    runParser.add_argument('--skip-nlp', action='store_true', help='Do not time the NLP')
+    runParser.add_argument('--latency', type=float, default=0.05, help='The seconds each response is delayed by')
+    runParser.add_argument('--jitter', type=float, default=0.02, help='The maximum seconds randomly added to each delay')
+    runParser.add_argument('--error-rate', type=float, default=0.0, help='The proportion of requests answered with a 503 response')
+    runParser.add_argument('--rate-limit-rate', type=float, default=0.0, help='The proportion of requests answered with a 429 response')
+
+    compareParser = subparsers.add_parser('compare', help='Compare two results files')
+    compareParser.add_argument('baseline', help='The results file to compare against')
+    compareParser.add_argument('current', help='The results file to check')
+    compareParser.add_argument('--threshold', type=float, default=0.1, help='The proportional change counted as a regression')
+
+    recordParser = subparsers.add_parser('record', help='Record real search and recipe pages as fixtures')
+    recordParser.add_argument('--directory', required=True, help='The directory to record pages in')
+    recordParser.add_argument('--start', type=int, default=1, help='The first search page to record')
+    recordParser.add_argument('--end', type=int, default=2, help='The last search page to record')
+    recordParser.add_argument('--recipes-per-page', type=int, help='The maximum number of recipes to record from each search page')
+
+    checkParser = subparsers.add_parser('check', help='Check that the json-ld and markup extraction paths agree on recorded recipe pages')
+    checkParser.add_argument('--fixtures', required=True, help='A directory of recorded pages')
+    checkParser.add_argument('--precise', action='store_true', help='Use additional precision for obtaining ingredient names')
+
+    return parser.parse_args(arguments)
+
+
+def main(arguments: List[str]) -> int:
+    """
+    Run the subcommand chosen on the command line.
+
+    Args:
+        arguments (List[str]): The command line arguments, excluding the program name
+
+    Returns:
+        int: The exit status, which is 1 if a regression or a disagreement between extraction paths was found
+    """
+
+    arguments = parseArguments(arguments)
+
+    if arguments.command == 'record':
+        recorded = recordFixtures(arguments.directory, arguments.start, arguments.end, arguments.recipes_per_page)
+        print(f'Recorded {len(recorded)} pages to {arguments.directory}')
+        return 0
+
+    if arguments.command == 'check':
+        return 1 if checkExtractionPaths(arguments.fixtures, arguments.precise) else 0
+
+    if arguments.command == 'compare':
+        with open(arguments.baseline, mode='r', encoding='utf-8') as baselineFile, open(arguments.current, mode='r', encoding='utf-8') as currentFile:
+            regressions = compareResults(json.load(baselineFile), json.load(currentFile), arguments.threshold)
+
+        return 1 if regressions else 0
+
+    results = runBenchmarks(arguments)
+
+    with open(arguments.output, mode='w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2)
+
+    print(json.dumps(results['results'], indent=2))
+    print(f'Results written to {arguments.output}')
+
+    if arguments.baseline:
+        with open(arguments.baseline, mode='r', encoding='utf-8') as file:
+            return 1 if compareResults(json.load(file), results, arguments.threshold) else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,222 @@
+#import the necessary modules
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from benchmarks.fixture_functions import findRecipeIndex, generateRecipePage, generateRecipeSitemap, generateSearchPage, generateSitemapIndex, getFixturePath
+
+#set the number of recipes listed in each synthetic recipe sitemap
+recipesPerSitemap = 1000
+
+
+class StandInServer:
+    """
+    A local HTTP server standing in for the BBC Good Food site, so the scraper can be benchmarked and exercised without the network.
+
+    Pages recorded with recordFixtures are replayed from a fixture directory, and any other search page, recipe page or sitemap is generated synthetically.
+    Each response can be delayed, and a proportion of requests answered with server errors or 429 responses carrying a Retry-After header.
+    Pages are served with an ETag, and a conditional request for an unchanged page is answered with a 304 response.
+    """
+
+    def __init__(self, fixtureDirectory: str | None = None, latency: float = 0.0, jitter: float = 0.0, errorRate: float = 0.0, rateLimitRate: float = 0.0, retryAfter: float = 0.1, searchPages: int = 1000, seed: int = 0) -> None:
+        """
+        Creates the server, without starting it.
+
+        Args:
+            fixtureDirectory (str | None): The directory of recorded pages to replay, or None to only serve synthetic pages
+            latency (float): The number of seconds each response is delayed by
+            jitter (float): The maximum number of seconds randomly added to each delay
+            errorRate (float): The proportion of requests answered with a 503 response
+            rateLimitRate (float): The proportion of requests answered with a 429 response
+            retryAfter (float): The number of seconds sent in the Retry-After header of 429 and 503 responses
+            searchPages (int): The number of search pages with results, beyond which search pages are empty
+            seed (int): The seed of the random generator deciding delays and failures
+        """
+
+        self.fixtureDirectory = fixtureDirectory
+        self.latency = latency
+        self.jitter = jitter
+        self.errorRate = errorRate
+        self.rateLimitRate = rateLimitRate
+        self.retryAfter = retryAfter
+        self.searchPages = searchPages
+        self.random = random.Random(seed)
+        self.randomLock = threading.Lock()
+        self.statusCounts = Counter()
+        self.server = None
+        self.thread = None
+
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+
+    def start(self) -> 'StandInServer':
+        """
+        Starts serving on a free local port in a background thread.
+
+        Returns:
+            StandInServer: This server, so it can be started as it is created
+        """
+
+        standIn = self
+
+        class Handler(BaseHTTPRequestHandler):
+            #use keep-alive connections, as the site does
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self) -> None:
+                standIn.handle(self)
+
+            def log_message(self, *arguments: any) -> None:
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+        return self
+
+
+    def stop(self) -> None:
+        """
+        Stops serving and closes the server's socket.
+
+        Returns:
+            None
+        """
+
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+    def __enter__(self) -> 'StandInServer':
+        return self.start()
+
+
+    def __exit__(self, *exception: any) -> None:
+        self.stop()
+
+
+    def findPage(self, path: str) -> str | None:
+        """
+        Finds the html served at a path, preferring a recorded page.
+
+        Args:
+            path (str): The request path, including any query string
+
+        Returns:
+            str | None: The html of the page, or None if there is no page at the path
+        """
+
+        if self.fixtureDirectory:
+            filename = getFixturePath(self.fixtureDirectory, path)
+
+            if os.path.exists(filename):
+                with open(filename, mode='r', encoding='utf-8') as file:
+                    return file.read()
+
+        return generatePage(path, self.searchPages, self.url)
+
+
+    def handle(self, request: BaseHTTPRequestHandler) -> None:
+        """
+        Answers a request, after its delay, with the page at its path or an injected failure.
+
+        Args:
+            request (BaseHTTPRequestHandler): The request being handled
+
+        Returns:
+            None
+        """
+
+        #decide the delay and any failure for this request
+        with self.randomLock:
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            roll = self.random.random()
+
+        if delay > 0:
+            time.sleep(delay)
+
+        headers = {}
+
+        if roll < self.rateLimitRate:
+            status, body = 429, b'Too Many Requests'
+            headers['Retry-After'] = str(self.retryAfter)
+        elif roll < self.rateLimitRate + self.errorRate:
+            status, body = 503, b'Service Unavailable'
+            headers['Retry-After'] = str(self.retryAfter)
+        else:
+            html = self.findPage(request.path)
+            status, body = (200, html.encode('utf-8')) if html is not None else (404, b'Not Found')
+
+            #tag each page with the hash of its content, answering a conditional request for an unchanged page without its body
+            if status == 200:
+                headers['ETag'] = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+
+                if request.headers.get('If-None-Match') == headers['ETag']:
+                    status, body = 304, b''
+
+        with self.randomLock:
+            self.statusCounts[status] += 1
+
+        #send the response, with its length so the connection can be kept alive
+        request.send_response(status)
+        request.send_header('Content-Type', 'text/html; charset=utf-8')
+        request.send_header('Content-Length', str(len(body)))
+
+        for name, value in headers.items():
+            request.send_header(name, value)
+
+        request.end_headers()
+        request.wfile.write(body)
+
+
+@lru_cache(maxsize=4096)
+def generatePage(path: str, searchPages: int, siteUrl: str) -> str | None:
+    """
+    Generates the synthetic page served at a path, caching it so that generation is not measured as server latency.
+
+    The sitemaps list every recipe linked from the search pages with results.
+
+    Args:
+        path (str): The request path, such as '/search?page=2', '/recipes/lemon-chicken-12' or '/sitemap.xml'
+        searchPages (int): The number of search pages with results
+        siteUrl (str): The url the site is served at, as sitemaps list absolute urls
+
+    Returns:
+        str | None: The html or xml of the page, or None if there is no page at the path
+    """
+
+    parts = urlsplit(path)
+    recipeCount = searchPages * 24
+    sitemapCount = -(-recipeCount // recipesPerSitemap)
+
+    if parts.path == '/search':
+        page = int(parse_qs(parts.query).get('page', ['1'])[0])
+        return generateSearchPage(page, recipesPerPage=24 if page <= searchPages else 0)
+
+    if parts.path.startswith('/recipes/'):
+        index = findRecipeIndex(parts.path[len('/recipes/'):])
+        return generateRecipePage(index) if index is not None else None
+
+    if parts.path == '/sitemap.xml':
+        return generateSitemapIndex(siteUrl, sitemapCount)
+
+    sitemapMatch = re.fullmatch(r'/sitemaps/recipe-(\d+)\.xml', parts.path)
+
+    if sitemapMatch and 1 <= int(sitemapMatch.group(1)) <= sitemapCount:
+        return generateRecipeSitemap(siteUrl, int(sitemapMatch.group(1)), recipeCount, recipesPerSitemap)
+
+    return None
@@ -1,7 +1,48 @@
 #import the necessary modules
 import csv
-from typing import List
-from scraping_utils.scraping_functions import getRecipeDetails, getRecipeUrlsFromPages
+import logging
+import os
+from itertools import chain
+from typing import Iterable, Iterator, List, Tuple
+from scraping_utils.scraping_functions import getRecipeDetailsMany, iterArchivedRecipeDetails, iterRecipeUrlsFromPages
+from scraping_utils.sitemap_functions import iterRecipeUrlsFromSitemap
+from csv_utils.journal_functions import COMPLETED, FAILED, PENDING, CrawlJournal, getUnfinishedUrls, readJournal
+from csv_utils.output_functions import isResumableOutput, openRecipeSink
+from monitoring_utils.metrics_functions import getMetrics
+
+logger = logging.getLogger(__name__)
+
+
+def iterRecipeUrlsFromCsv(filename: str) -> Iterator[str]:
+    """
+    Reads the recipe urls from a given csv file one at a time, so that memory use does not grow with the file.
+
+    Args:
+        filename (str): The csv file to extract the urls from
+
+    Returns:
+        Iterator[str]: The urls stored in the file
+    """
+
+    with open(filename, mode='r', encoding='utf-8') as file:
+        for row in csv.DictReader(file):
+            yield str(row['Recipe URLs'])
+
+
+def iterRecipeUrlEntriesFromCsv(filename: str) -> Iterator[Tuple[str, str | None]]:
+    """
+    Reads the recipe urls from a given csv file one at a time, along with when each was last modified if the file records it.
+
+    Args:
+        filename (str): The csv file to extract the urls from, as written by writeRecipeUrlsToCsv or writeSitemapUrlsToCsv
+
+    Returns:
+        Iterator[Tuple[str, str | None]]: The urls stored in the file, with their lastmod, or None if not recorded
+    """
+
+    with open(filename, mode='r', encoding='utf-8') as file:
+        for row in csv.DictReader(file):
+            yield str(row['Recipe URLs']), row.get('Last Modified') or None
 
 
 def readRecipeUrlsFromCsv(filename: str) -> List[str]:
@@ -15,24 +56,16 @@ def readRecipeUrlsFromCsv(filename: str) -> List[str]:
         List[str]: The list of urls stored in the file
     """
 
-    #initialise an empty url list and attempt to open the file in read mode
+    #initialise an empty url list and add each url read from the file
     recipeUrls = []
 
     try:
-        with open(filename, mode='r', encoding='utf-8') as file:
-            #set a new dictionary reader and add each url to the list
-            reader = csv.DictReader(file)
-
-            for row in reader:
-                recipeUrls.append(str(row['Recipe URLs']))
+        for url in iterRecipeUrlsFromCsv(filename):
+            recipeUrls.append(url)
 
-    #if an error is thrown, print the error to stdout
+    #if an error is thrown, log the error
     except Exception as e:
-        print(e)
-
-    #close the file and return the url list
-    finally:
-        file.close()
+        logger.error(e)
 
     return recipeUrls
 
@@ -40,6 +73,8 @@ def readRecipeUrlsFromCsv(filename: str) -> List[str]:
 def readRecipeDetailsFromCsv(filename: str) -> List[dict]:
     """
     Reads the recipe details of recipes from a given csv file.
+
+    Every field is read as text. Use iterRecipeDetails in csv_utils.reader_functions to stream typed records instead, or readRecipeBatch to hold many recipes compactly.
     
     Args:
         filename (str): The csv file to extra the recipes' details from
@@ -59,35 +94,32 @@ def readRecipeDetailsFromCsv(filename: str) -> List[dict]:
             for row in reader:
                 recipeDetails.append(row)
 
-    #if an error is thrown, print the error to stdout
+    #if an error is thrown, log the error
     except Exception as e:
-        print(e)
-
-    #close the file and return the recipe details list
-    finally:
-        file.close()
+        logger.error(e)
 
     return recipeDetails
 
 
-def writeRecipeUrlsToCsv(startPage: int, endPage: int, filename: str) -> None:
+def writeRecipeUrlsToCsv(startPage: int, endPage: int, filename: str, concurrency: int = 1) -> None:
     """
     Writes the recipe urls from a range of pages to a specified csv file.
 
-    Find the urls from each page using the get_recipe_urls_from_pages function and writes each to the file.
+    Find the urls from each page using the iter_recipe_urls_from_pages function and writes each to the file as its page is parsed.
     
     Args:
         startPage (int): The page to begin url scraping on
         endPage (int): The page to end url scraping on
         filename (str): The csv file to write recipe urls to
+        concurrency (int): The maximum number of pages to request at once
 
     Returns:
         None
     """
 
-    #obtain the urls from the specified pages and output a message that file writing has begun
-    recipeUrls = getRecipeUrlsFromPages(startPage, endPage)
-    print(f'Writing URLs to file {filename}')
+    #lazily obtain the urls from the specified pages and output a message that file writing has begun
+    recipeUrls = iterRecipeUrlsFromPages(startPage, endPage, concurrency)
+    logger.info('Writing URLs to file %s', filename)
 
     #attempt to open the specified file in write mode and create a new csv writer
     try:
@@ -100,50 +132,202 @@ def writeRecipeUrlsToCsv(startPage: int, endPage: int, filename: str) -> None:
             for url in recipeUrls:
                 writer.writerow([url])
 
-    #if an error is thrown, print the error to stdout 
+    #if an error is thrown, log the error
     except Exception as e:
-        print(e)
-
-    #close the file being written to
-    finally:
-        file.close()
+        logger.error(e)
 
 
-def writeRecipeDetailsToCsv(recipeUrls: List[str], filename: str, precise: bool) -> None:
+def writeSitemapUrlsToCsv(filename: str, sitemapUrl: str | None = None) -> None:
     """
-    Writes the recipe details from a list of urls to a specified csv file.
+    Writes the recipe urls listed in the site's sitemaps to a specified csv file, along with when each was last modified.
+
+    The file can be read wherever one written by writeRecipeUrlsToCsv can, with its extra column giving each url's lastmod to an incremental refresh.
 
-    Find the details from each recipe page using the get_recipe_details function and writes each to the file.
-    
     Args:
-        recipeUrls (List[str]): The list of recipe page urls to scrape details from
-        filename (str): The csv file to write recipe details to
-        precise (bool): Determines whether additional precision should be used for obtaining ingredient names
+        filename (str): The csv file to write recipe urls to
+        sitemapUrl (str | None): The url of the sitemap index, or None to use the site's own
 
     Returns:
         None
     """
 
+    #lazily obtain the urls from the sitemaps and output a message that file writing has begun
+    recipeUrls = iterRecipeUrlsFromSitemap(sitemapUrl)
+    logger.info('Writing URLs to file %s', filename)
+
     #attempt to open the specified file in write mode and create a new csv writer
     try:
         with open(filename, mode='w', newline='', encoding='utf-8') as file:
             writer = csv.writer(file)
 
-            #write a header followed by all details found for each recipe
-            writer.writerow(['Title', 'Image Link', 'Raw Ingredients', 'Measured Ingredients', 'Method', 'Author', 'Prep Time', 'Cook Time', 'Difficulty Level', 'Rating', 'Ratings Count', 'Calories', 'Fat', 'Saturates', 'Carbs', 'Sugars', 'Fibre', 'Protein', 'Salt'])
+            #write a header followed by all the urls found, with their lastmod
+            writer.writerow(['Recipe URLs', 'Last Modified'])
 
-            for url in recipeUrls:
-                print(f"Obtaining details from URL {url}")
+            for url, lastmod in recipeUrls:
+                writer.writerow([url, lastmod or ''])
+
+    #if an error is thrown, log the error
+    except Exception as e:
+        logger.error(e)
+
+
+def writeRecipeDetailsToFile(recipeUrls: Iterable[str], filename: str, precise: bool, concurrency: int = 8, ordered: bool = False, resume: bool = False, retryPasses: int = 1, processes: int = 0, ingredientBatchSize: int = 0, outputFormat: str | None = None, compression: str | None = None) -> None:
+    """
+    Writes the recipe details from a list of urls to a specified file, in csv, JSON Lines or Parquet format.
+
+    Find the details from each recipe page using the get_recipe_details_many function and writes each to the file's sink as it completes.
+    Progress is recorded in a journal alongside the file, so that an interrupted run can be resumed without losing or duplicating rows.
+    Only uncompressed csv and JSON Lines files can be appended to on resuming, while other files are written afresh with every url of the previous run scraped again.
+    
+    Args:
+        recipeUrls (Iterable[str]): The recipe page urls to scrape details from
+        filename (str): The file to write recipe details to
+        precise (bool): Determines whether additional precision should be used for obtaining ingredient names
+        concurrency (int): The maximum number of recipe pages to request at once
+        ordered (bool): Determines whether rows are written in the same order as the urls supplied
+        resume (bool): Determines whether a previous run recorded in the journal is resumed, skipping completed urls and retrying the rest
+        retryPasses (int): The number of additional passes made over urls that failed during this run
+        processes (int): The number of processes to parse recipe pages in, or zero to parse them on the fetching threads
+        ingredientBatchSize (int): The number of recipes whose raw ingredients are resolved by the NLP together, or zero to resolve each recipe's individually
+        outputFormat (str | None): The output format, either 'csv', 'jsonl', 'parquet' or 'sqlite', or None to infer it from the filename
+        compression (str | None): The compression codec, either 'gzip' or 'zstd', or None to infer it from the filename
 
-                details = getRecipeDetails(url, precise)
-                
-                if details:
-                    writer.writerow(details)
+    Returns:
+        None
+    """
 
-    #if an error is thrown, print the error to stdout 
+    #read the journal of the previous run if resuming, and determine whether any of its rows can be kept
+    states, validSize = readJournal(filename) if resume else ({}, None)
+    appending = validSize is not None
+    seenUrls = set()
+    metrics = getMetrics()
+
+    #attempt to open a sink for the specified file, discarding any rows written after the last journal record when appending
+    try:
+        if (appending and not isResumableOutput(filename, outputFormat, compression)):
+            raise ValueError(f'Only uncompressed csv and JSON Lines files can be resumed, so {filename} must be written afresh')
+
+        if (appending):
+            os.truncate(filename, validSize)
+
+        with openRecipeSink(filename, outputFormat, compression, appending) as sink:
+            journal = CrawlJournal(filename, sink, appending)
+
+            #define the urls to scrape, skipping urls already completed or seen and recording each as pending
+            def journalUrls(urls: Iterable[str]) -> Iterator[str]:
+                for url in urls:
+                    if (states.get(url) == COMPLETED or url in seenUrls):
+                        continue
+
+                    seenUrls.add(url)
+                    journal.record(PENDING, url)
+                    yield url
+
+            try:
+                #scrape the unfinished urls of the previous run followed by the urls supplied
+                pendingUrls = journalUrls(chain(getUnfinishedUrls(states), recipeUrls))
+
+                for currentPass in range(retryPasses + 1):
+                    failedUrls = []
+
+                    #write the details found for each recipe, timed as the write stage, recording each row's end offset once written if the sink can be resumed
+                    for url, details in getRecipeDetailsMany(pendingUrls, precise, concurrency, ordered, processes, ingredientBatchSize):
+                        if details and sink.resumable:
+                            with metrics.timeStage('write'):
+                                sink.write(url, details)
+                                sink.flush()
+                                journal.record(COMPLETED, url, sink.tell())
+
+                            metrics.increment('scraper_records_written_total')
+                        elif details:
+                            with metrics.timeStage('write'):
+                                sink.write(url, details)
+                                journal.record(COMPLETED, url)
+
+                            metrics.increment('scraper_records_written_total')
+                        else:
+                            failedUrls.append(url)
+                            journal.record(FAILED, url)
+
+                    #if any urls failed, retry them on the next pass
+                    if (not failedUrls):
+                        break
+
+                    logger.warning('%d recipes failed. %s', len(failedUrls), 'Retrying...' if currentPass < retryPasses else 'Resume the run to retry them.', extra={'failed': len(failedUrls), 'pass': currentPass})
+                    pendingUrls = failedUrls
+
+            finally:
+                journal.close()
+
+    #if an error is thrown, log the error
     except Exception as e:
-        print(e)
+        logger.error(e)
+
+
+def writeArchivedRecipeDetailsToFile(directory: str, filename: str, precise: bool, processes: int = 0, ingredientBatchSize: int = 0, outputFormat: str | None = None, compression: str | None = None) -> Tuple[int, int]:
+    """
+    Writes the recipe details of every page in an archive to a specified file afresh, without making any requests.
+
+    Find the details from each archived page using the iter_archived_recipe_details function and writes each to the file's sink as it completes.
+
+    Args:
+        directory (str): The directory holding the page archive
+        filename (str): The file to write recipe details to
+        precise (bool): Determines whether additional precision should be used for obtaining ingredient names
+        processes (int): The number of processes to parse recipe pages in, or zero to parse them in this process
+        ingredientBatchSize (int): The number of recipes whose raw ingredients are resolved by the NLP together, or zero to resolve each recipe's individually
+        outputFormat (str | None): The output format, either 'csv', 'jsonl', 'parquet' or 'sqlite', or None to infer it from the filename
+        compression (str | None): The compression codec, either 'gzip' or 'zstd', or None to infer it from the filename
+
+    Returns:
+        Tuple[int, int]: The number of recipes written and the number that failed
+    """
+
+    metrics = getMetrics()
+    written = failed = 0
+
+    #attempt to open a sink for the specified file, writing each recipe as it is extracted
+    try:
+        with openRecipeSink(filename, outputFormat, compression) as sink:
+            for url, details in iterArchivedRecipeDetails(directory, precise, processes, ingredientBatchSize=ingredientBatchSize):
+                if (details):
+                    with metrics.timeStage('write'):
+                        sink.write(url, details)
+
+                    metrics.increment('scraper_records_written_total')
+                    written += 1
+                else:
+                    failed += 1
+
+    #if an error is thrown, log the error
+    except Exception as e:
+        logger.error(e)
+
+    if (failed):
+        logger.warning('%d archived recipes failed.', failed, extra={'failed': failed})
+
+    return written, failed
+
+
+def writeRecipeDetailsToCsv(recipeUrls: Iterable[str], filename: str, precise: bool, concurrency: int = 8, ordered: bool = False, resume: bool = False, retryPasses: int = 1, processes: int = 0, ingredientBatchSize: int = 0) -> None:
+    """
+    Writes the recipe details from a list of urls to a specified csv file.
+
+    This is writeRecipeDetailsToFile with the output format fixed to csv, whatever the filename.
+    
+    Args:
+        recipeUrls (Iterable[str]): The recipe page urls to scrape details from
+        filename (str): The csv file to write recipe details to
+        precise (bool): Determines whether additional precision should be used for obtaining ingredient names
+        concurrency (int): The maximum number of recipe pages to request at once
+        ordered (bool): Determines whether rows are written in the same order as the urls supplied
+        resume (bool): Determines whether a previous run recorded in the journal is resumed, skipping completed urls and retrying the rest
+        retryPasses (int): The number of additional passes made over urls that failed during this run
+        processes (int): The number of processes to parse recipe pages in, or zero to parse them on the fetching threads
+        ingredientBatchSize (int): The number of recipes whose raw ingredients are resolved by the NLP together, or zero to resolve each recipe's individually
+
+    Returns:
+        None
+    """
 
-    #close the file being written to
-    finally:        
-        file.close()
\ No newline at end of file
+    writeRecipeDetailsToFile(recipeUrls, filename, precise, concurrency, ordered, resume, retryPasses, processes, ingredientBatchSize, outputFormat='csv')
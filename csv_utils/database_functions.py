@@ -0,0 +1,301 @@
+#import the necessary modules
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Tuple
+from csv_utils.output_functions import recipeDetailsHeader, recipeDetailsTypes, recipeUrlColumn, typeRecipeDetails
+
+#define the column of the recipes table holding each scalar field, along with its SQL type
+sqlTypes = {'text': 'TEXT', 'integer': 'INTEGER', 'number': 'REAL'}
+recipeColumns = {header: header.lower().replace(' ', '_') for header, columnType in zip(recipeDetailsHeader, recipeDetailsTypes) if columnType != 'list'}
+recipeColumns[recipeUrlColumn] = 'url'
+
+#define the child table holding each list field, along with the kind of entry it is stored as
+listTables = {
+    'Raw Ingredients': ('ingredients', 'raw'),
+    'Measured Ingredients': ('ingredients', 'measured'),
+    'Method': ('method_steps', None)
+}
+
+#define the numeric columns that are indexed for filtering and sorting
+indexedColumns = ['prep_time', 'cook_time', 'rating', 'ratings_count', 'calories', 'fat', 'saturates', 'carbs', 'sugars', 'fibre', 'protein', 'salt']
+
+#define the SQL operators each filter operator translates to
+sqlOperators = {'==': '=', '!=': '!=', '<': '<', '<=': '<=', '>': '>', '>=': '>='}
+
+
+class SourceState(NamedTuple):
+    """
+    What was known of a recipe's source page when its stored details were last checked, used to detect whether it has changed since.
+
+    Attributes:
+        lastmod (str | None): The sitemap lastmod of the page
+        etag (str | None): The ETag header the page was served with
+        lastModified (str | None): The Last-Modified header the page was served with
+        contentHash (str | None): The hash of the page's recipe sections, as found by getRecipeContentHash
+    """
+
+    lastmod: str | None
+    etag: str | None
+    lastModified: str | None
+    contentHash: str | None
+
+
+class RecipeDatabase:
+    """
+    A SQLite store of recipe details keyed by recipe url, updated incrementally rather than rewritten each run.
+
+    Writing a recipe that is already stored replaces its details. Writes are grouped into transactions of a bounded size.
+    Ingredients and method steps are held in child tables, and the times, rating and nutrient columns are indexed for filtering.
+    """
+
+    def __init__(self, path: str, batchSize: int = 500) -> None:
+        """
+        Opens the store, creating its tables and indexes if needed.
+
+        Args:
+            path (str): The SQLite file to store recipes in
+            batchSize (int): The maximum number of recipes written in each transaction
+        """
+
+        self.path = path
+        self.batchSize = max(1, batchSize)
+        self.pendingWrites = 0
+
+        #open the store in write-ahead logging mode, so that readers are not blocked by a run writing to it
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA foreign_keys=ON')
+
+        #create the recipes table with a column per scalar field, and the child tables for the list fields
+        scalarColumns = ', '.join(f'{recipeColumns[header]} {sqlTypes[columnType]}' for header, columnType in zip(recipeDetailsHeader, recipeDetailsTypes) if header in recipeColumns)
+        self.connection.execute(f'CREATE TABLE IF NOT EXISTS recipes (id INTEGER PRIMARY KEY, url TEXT NOT NULL UNIQUE, {scalarColumns}, updated_at REAL)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS ingredients (recipe_id INTEGER NOT NULL REFERENCES recipes(id) ON DELETE CASCADE, kind TEXT NOT NULL, position INTEGER NOT NULL, text TEXT NOT NULL, PRIMARY KEY (recipe_id, kind, position))')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS method_steps (recipe_id INTEGER NOT NULL REFERENCES recipes(id) ON DELETE CASCADE, position INTEGER NOT NULL, text TEXT NOT NULL, PRIMARY KEY (recipe_id, position))')
+
+        #create the table of what was known of each recipe's source page, kept apart from the recipes so that existing stores need no migration
+        self.connection.execute('CREATE TABLE IF NOT EXISTS recipe_sources (url TEXT PRIMARY KEY, lastmod TEXT, etag TEXT, last_modified TEXT, content_hash TEXT, checked_at REAL)')
+
+        #index the numeric columns, and the ingredient text for finding the recipes using an ingredient
+        for column in indexedColumns:
+            self.connection.execute(f'CREATE INDEX IF NOT EXISTS recipes_{column} ON recipes ({column})')
+
+        self.connection.execute('CREATE INDEX IF NOT EXISTS ingredients_text ON ingredients (kind, text)')
+        self.connection.commit()
+
+
+    def upsertRecipe(self, url: str, details: Tuple[any]) -> None:
+        """
+        Stores the details of a recipe, replacing any details already stored for its url.
+
+        The write is committed once a full batch of writes is pending, or when the store is flushed.
+
+        Args:
+            url (str): The url the recipe was scraped from
+            details (Tuple[any]): The recipe details, in the order of the recipe details header
+
+        Returns:
+            None
+        """
+
+        record = dict(zip(recipeDetailsHeader, typeRecipeDetails(details)))
+
+        #insert or update the recipe's scalar fields, obtaining its id
+        columns = [recipeColumns[header] for header in recipeDetailsHeader if header in recipeColumns]
+        values = [record[header] for header in recipeDetailsHeader if header in recipeColumns]
+        updates = ', '.join(f'{column} = excluded.{column}' for column in columns + ['updated_at'])
+
+        recipeId = self.connection.execute(
+            f'INSERT INTO recipes (url, {", ".join(columns)}, updated_at) VALUES ({", ".join("?" * (len(columns) + 2))}) '
+            f'ON CONFLICT (url) DO UPDATE SET {updates} RETURNING id',
+            [url] + values + [time.time()]
+        ).fetchone()[0]
+
+        #replace the recipe's ingredients and method steps
+        self.connection.execute('DELETE FROM ingredients WHERE recipe_id = ?', (recipeId,))
+        self.connection.execute('DELETE FROM method_steps WHERE recipe_id = ?', (recipeId,))
+
+        for header, (table, kind) in listTables.items():
+            entries = record[header] or []
+
+            if table == 'ingredients':
+                self.connection.executemany('INSERT INTO ingredients (recipe_id, kind, position, text) VALUES (?, ?, ?, ?)', [(recipeId, kind, position, text) for position, text in enumerate(entries)])
+            else:
+                self.connection.executemany('INSERT INTO method_steps (recipe_id, position, text) VALUES (?, ?, ?)', [(recipeId, position, text) for position, text in enumerate(entries)])
+
+        #commit once a full batch is pending
+        self.pendingWrites += 1
+
+        if self.pendingWrites >= self.batchSize:
+            self.commit()
+
+
+    def upsertRecipes(self, recipes: Iterable[Tuple[str, Tuple[any]]]) -> int:
+        """
+        Stores the details of many recipes, committing them in batches.
+
+        Args:
+            recipes (Iterable[Tuple[str, Tuple[any]]]): The pairs of each recipe url and its details, as yielded by getRecipeDetailsMany
+
+        Returns:
+            int: The number of recipes stored, skipping any without details
+        """
+
+        stored = 0
+
+        for url, details in recipes:
+            if details:
+                self.upsertRecipe(url, details)
+                stored += 1
+
+        self.commit()
+        return stored
+
+
+    def getSourceState(self, url: str) -> SourceState | None:
+        """
+        Finds what was known of a stored recipe's source page when it was last checked.
+
+        Args:
+            url (str): The url of the recipe
+
+        Returns:
+            SourceState | None: The state of the source page, or None if the recipe is not stored or was stored without one
+        """
+
+        row = self.connection.execute('SELECT lastmod, etag, last_modified, content_hash FROM recipe_sources WHERE url = ? AND EXISTS (SELECT 1 FROM recipes WHERE recipes.url = recipe_sources.url)', (url,)).fetchone()
+        return SourceState(*row) if row else None
+
+
+    def recordSourceState(self, url: str, state: SourceState) -> None:
+        """
+        Records the state of a recipe's source page as just checked, committed along with the batch of writes it belongs to.
+
+        Args:
+            url (str): The url of the recipe
+            state (SourceState): The state of the source page
+
+        Returns:
+            None
+        """
+
+        self.connection.execute('INSERT OR REPLACE INTO recipe_sources (url, lastmod, etag, last_modified, content_hash, checked_at) VALUES (?, ?, ?, ?, ?, ?)', (url, *state, time.time()))
+        self.pendingWrites += 1
+
+        if self.pendingWrites >= self.batchSize:
+            self.commit()
+
+
+    def commit(self) -> None:
+        """
+        Commits any pending writes.
+
+        Returns:
+            None
+        """
+
+        self.connection.commit()
+        self.pendingWrites = 0
+
+
+    def queryRecipes(self, filters: List[Tuple[str, str, any]] | None = None, columns: Iterable[str] | None = None, orderBy: str | None = None, descending: bool = False, limit: int | None = None) -> Iterator[Dict[str, any]]:
+        """
+        Finds the stored recipes satisfying every filter, as typed records.
+
+        Filters take the same form as for iterRecipeDetails, such as ('Prep Time', '<', 30) or ('Raw Ingredients', 'contains', 'lemon').
+        Comparisons on the numeric columns use their indexes, and 'contains' on an ingredient list uses the ingredient index.
+
+        Args:
+            filters (List[Tuple[str, str, any]] | None): The filters each recipe must satisfy, or None to find every recipe
+            columns (Iterable[str] | None): The columns to return, or None to return every column
+            orderBy (str | None): The column to sort the recipes by, or None to leave them unsorted
+            descending (bool): Determines whether the recipes are sorted in descending order
+            limit (int | None): The maximum number of recipes to return, or None for no limit
+
+        Returns:
+            Iterator[Dict[str, any]]: The record of each recipe found, keyed by column name
+        """
+
+        columns = list(columns) if columns is not None else [recipeUrlColumn] + recipeDetailsHeader
+
+        for column in columns + [column for column, _, _ in filters or []]:
+            if column not in recipeColumns and column not in listTables:
+                raise ValueError(f'Unknown column {column}')
+
+        if orderBy is not None and orderBy not in recipeColumns:
+            raise ValueError(f'Cannot sort by column {orderBy}')
+
+        #select each scalar column directly, and gather each list column from its child table in order
+        selections = []
+
+        for column in columns:
+            if column in recipeColumns:
+                selections.append(recipeColumns[column])
+            else:
+                table, kind = listTables[column]
+                condition = 'recipe_id = recipes.id' + (f" AND kind = '{kind}'" if kind else '')
+                selections.append(f'(SELECT json_group_array(text) FROM (SELECT text FROM {table} WHERE {condition} ORDER BY position))')
+
+        #translate the filters into conditions with bound parameters
+        conditions = []
+        parameters = []
+
+        for column, operatorName, value in filters or []:
+            if column in listTables and operatorName == 'contains':
+                table, kind = listTables[column]
+                conditions.append(f'EXISTS (SELECT 1 FROM {table} WHERE recipe_id = recipes.id' + (f" AND kind = '{kind}'" if kind else '') + ' AND text = ?)')
+                parameters.append(value)
+            elif column in recipeColumns and operatorName == 'in':
+                options = list(value)
+                conditions.append(f'{recipeColumns[column]} IN ({", ".join("?" * len(options))})')
+                parameters.extend(options)
+            elif column in recipeColumns and operatorName in sqlOperators and value is None:
+                conditions.append(f'{recipeColumns[column]} IS ' + ('NOT NULL' if operatorName == '!=' else 'NULL'))
+            elif column in recipeColumns and operatorName in sqlOperators:
+                conditions.append(f'{recipeColumns[column]} {sqlOperators[operatorName]} ?')
+                parameters.append(value)
+            else:
+                raise ValueError(f'Unsupported filter {operatorName} on column {column}')
+
+        query = f'SELECT {", ".join(selections)} FROM recipes'
+
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+
+        if orderBy:
+            query += f' ORDER BY {recipeColumns[orderBy]}' + (' DESC' if descending else '')
+
+        if limit is not None:
+            query += ' LIMIT ?'
+            parameters.append(limit)
+
+        for row in self.connection.execute(query, parameters):
+            yield {column: json.loads(value) if column in listTables else value for column, value in zip(columns, row)}
+
+
+    def countRecipes(self) -> int:
+        """
+        Counts the recipes stored.
+
+        Returns:
+            int: The number of recipes
+        """
+
+        return self.connection.execute('SELECT COUNT(*) FROM recipes').fetchone()[0]
+
+
+    def close(self) -> None:
+        """
+        Commits any pending writes and closes the store, first updating the statistics used to choose between its indexes.
+
+        Returns:
+            None
+        """
+
+        if self.connection:
+            self.commit()
+            self.connection.execute('PRAGMA optimize')
+            self.connection.close()
+            self.connection = None
@@ -0,0 +1,162 @@
+#import the necessary modules
+import os
+import time
+from typing import Dict, List, Tuple
+
+#define the states a url can be recorded in
+PENDING = 'pending'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+
+def getJournalFilename(filename: str) -> str:
+    """
+    Finds the journal filename used to record progress on writing a given file.
+
+    Args:
+        filename (str): The file being written
+
+    Returns:
+        str: The filename of its journal
+    """
+
+    return f'{filename}.journal'
+
+
+def readJournal(filename: str) -> Tuple[Dict[str, str], int | None]:
+    """
+    Reads the recorded state of each url from the journal of a given file.
+
+    Each completed url is recorded with the size of the output file once its row was written.
+    A completed url whose row lies beyond the end of the output file (as it was not durably written) is treated as pending.
+
+    Args:
+        filename (str): The file whose journal is read
+
+    Returns:
+        Tuple[Dict[str, str], int | None]: The state of each url, and the size of the output file up to the last complete row (None if no row was recorded)
+    """
+
+    #initialise the url states and find the current size of the output file
+    states = {}
+    offsets = {}
+    outputSize = os.path.getsize(filename) if os.path.exists(filename) else 0
+
+    try:
+        with open(getJournalFilename(filename), mode='r', encoding='utf-8') as file:
+            for line in file:
+                #ignore a partially written final line
+                if not line.endswith('\n'):
+                    break
+
+                fields = line.rstrip('\n').split('\t')
+
+                if len(fields) < 2:
+                    continue
+
+                #record the latest state of each url, along with the offset of completed rows
+                state, url = fields[0], fields[1]
+
+                if state == COMPLETED and len(fields) > 2 and int(fields[2]) <= outputSize:
+                    states[url] = COMPLETED
+                    offsets[url] = int(fields[2])
+                elif state == COMPLETED:
+                    states[url] = PENDING
+                else:
+                    states[url] = state
+
+    #if no journal exists, nothing has been recorded
+    except(FileNotFoundError):
+        return {}, None
+
+    #the output is valid up to the furthest row still recorded as completed
+    completedOffsets = [offsets[url] for url, state in states.items() if state == COMPLETED]
+    validSize = max(completedOffsets) if completedOffsets else None
+
+    return states, validSize
+
+
+class CrawlJournal:
+    """
+    An append-only journal recording the progress of writing recipe details to a file.
+
+    Each url is recorded as pending when it is handed out for scraping, and as completed or failed once scraped.
+    The journal and the output file are flushed after every record and synced to disk at a bounded interval.
+    """
+
+    def __init__(self, filename: str, outputSink: any, resume: bool, syncInterval: float = 2.0) -> None:
+        """
+        Opens the journal for a given output file.
+
+        Args:
+            filename (str): The file being written
+            outputSink (any): The open sink writing the output file, synced alongside the journal
+            resume (bool): Determines whether an existing journal is appended to rather than replaced
+            syncInterval (float): The maximum number of seconds between syncs to disk
+        """
+
+        self.outputSink = outputSink
+        self.syncInterval = syncInterval
+        self.lastSync = time.monotonic()
+        self.file = open(getJournalFilename(filename), mode='a' if resume else 'w', encoding='utf-8')
+
+
+    def record(self, state: str, url: str, offset: int | None = None) -> None:
+        """
+        Records the state of a url, syncing to disk if the sync interval has elapsed.
+
+        Args:
+            state (str): The state of the url
+            url (str): The url being recorded
+            offset (int | None): The size of the output file once a completed url's row was written
+
+        Returns:
+            None
+        """
+
+        self.file.write(f'{state}\t{url}\t{offset}\n' if offset is not None else f'{state}\t{url}\n')
+        self.file.flush()
+
+        if time.monotonic() - self.lastSync >= self.syncInterval:
+            self.sync()
+
+
+    def sync(self) -> None:
+        """
+        Syncs the output file and then the journal to disk, so the journal never records rows that were not written.
+
+        Returns:
+            None
+        """
+
+        self.outputSink.sync()
+        os.fsync(self.file.fileno())
+        self.lastSync = time.monotonic()
+
+
+    def close(self) -> None:
+        """
+        Syncs and closes the journal.
+
+        Returns:
+            None
+        """
+
+        if not self.file.closed:
+            if not self.outputSink.closed:
+                self.sync()
+            self.file.close()
+
+
+def getUnfinishedUrls(states: Dict[str, str]) -> List[str]:
+    """
+    Finds the urls recorded in a journal that have not been completed.
+
+    Args:
+        states (Dict[str, str]): The state of each url, as read by readJournal
+
+    Returns:
+        List[str]: The pending and failed urls
+    """
+
+    return [url for url, state in states.items() if state != COMPLETED]
@@ -0,0 +1,439 @@
+#import the necessary modules
+import csv
+import gzip
+import io
+import json
+import os
+from abc import ABC, abstractmethod
+from importlib.util import find_spec
+from typing import List, Tuple
+
+#define the header of the recipe details csv file, along with the type of each column for typed output formats
+recipeDetailsHeader = ['Title', 'Image Link', 'Raw Ingredients', 'Measured Ingredients', 'Method', 'Author', 'Prep Time', 'Cook Time', 'Difficulty Level', 'Rating', 'Ratings Count', 'Calories', 'Fat', 'Saturates', 'Carbs', 'Sugars', 'Fibre', 'Protein', 'Salt']
+recipeDetailsTypes = ['text', 'text', 'list', 'list', 'list', 'text', 'integer', 'integer', 'text', 'number', 'integer', 'number', 'number', 'number', 'number', 'number', 'number', 'number', 'number']
+
+#define the column identifying each recipe in typed output formats, which unlike csv rows carry the url they were scraped from
+recipeUrlColumn = 'Recipe URL'
+
+#define the supported output formats and compression codecs
+outputFormats = ('csv', 'jsonl', 'parquet', 'sqlite')
+compressionCodecs = ('gzip', 'zstd')
+
+#define the filename suffixes identifying each format and codec
+formatSuffixes = {'.parquet': 'parquet', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.sqlite': 'sqlite', '.db': 'sqlite', '.csv': 'csv'}
+compressionSuffixes = {'.gz': 'gzip', '.zst': 'zstd'}
+
+
+def inferOutputFormat(filename: str) -> Tuple[str, str | None]:
+    """
+    Infers the output format and compression of a file from its filename, such as 'recipes.jsonl.gz'.
+
+    Args:
+        filename (str): The file to write to
+
+    Returns:
+        Tuple[str, str | None]: The output format, defaulting to 'csv', and the compression codec, or None if uncompressed
+    """
+
+    name = filename.lower()
+    compression = None
+
+    #strip any compression suffix before finding the format suffix
+    for suffix, codec in compressionSuffixes.items():
+        if name.endswith(suffix):
+            compression = codec
+            name = name[:-len(suffix)]
+
+    for suffix, outputFormat in formatSuffixes.items():
+        if name.endswith(suffix):
+            return outputFormat, compression
+
+    return 'csv', compression
+
+
+def typeRecipeDetails(details: Tuple[any]) -> List[any]:
+    """
+    Converts the fields of a recipe details tuple to the type of their column, so typed formats need no parsing when loaded.
+
+    Args:
+        details (Tuple[any]): The recipe details, in the order of the header
+
+    Returns:
+        List[any]: The typed values, with missing values left as None
+    """
+
+    values = []
+
+    for value, columnType in zip(details, recipeDetailsTypes):
+        if value is None:
+            values.append(None)
+        elif columnType == 'list':
+            values.append([str(item) for item in value])
+        elif columnType == 'integer':
+            values.append(int(value))
+        elif columnType == 'number':
+            values.append(float(value))
+        else:
+            values.append(str(value))
+
+    return values
+
+
+class RecipeSink(ABC):
+    """
+    A destination that recipe details are streamed to as they are scraped.
+
+    Sinks expose flush, sync and closed, so that a CrawlJournal can sync them alongside its records.
+    Only resumable sinks can have rows appended to an existing file, with tell giving the offset recorded after each row.
+    A sink is resumable if its format can be appended to and its file is uncompressed, so it can be truncated to its last journalled row.
+    Each format subclasses it, implementing write.
+    """
+
+    appendable = False
+
+    def __init__(self, filename: str, compression: str | None = None, append: bool = False) -> None:
+        """
+        Opens the sink's file.
+
+        Args:
+            filename (str): The file to write to
+            compression (str | None): The compression codec to use, either 'gzip' or 'zstd', or None to write uncompressed
+            append (bool): Determines whether rows are appended to an existing file rather than replacing it
+        """
+
+        if compression is not None and compression not in compressionCodecs:
+            raise ValueError(f'Unknown compression {compression}, expected one of {", ".join(compressionCodecs)}')
+
+        self.resumable = self.appendable and compression is None
+
+        if append and not self.resumable:
+            raise ValueError(f'{type(self).__name__} cannot append to an existing file, so the run cannot be resumed')
+
+        self.filename = filename
+        self.compression = compression
+        self.file = None
+
+
+    @abstractmethod
+    def write(self, url: str, details: Tuple[any]) -> None:
+        """
+        Writes the details of a recipe.
+
+        Args:
+            url (str): The url the recipe was scraped from
+            details (Tuple[any]): The recipe details, in the order of the header
+
+        Returns:
+            None
+        """
+
+
+    def flush(self) -> None:
+        """
+        Flushes any rows written to the file.
+
+        Returns:
+            None
+        """
+
+        self.file.flush()
+
+
+    def sync(self) -> None:
+        """
+        Flushes any rows written and syncs the file to disk.
+
+        Returns:
+            None
+        """
+
+        self.flush()
+        os.fsync(self.file.fileno())
+
+
+    def tell(self) -> int:
+        """
+        Finds the current offset into the sink's file.
+
+        Returns:
+            int: The offset
+        """
+
+        return self.file.tell()
+
+
+    @property
+    def closed(self) -> bool:
+        return self.file is None or self.file.closed
+
+
+    def close(self) -> None:
+        """
+        Closes the sink's file.
+
+        Returns:
+            None
+        """
+
+        if not self.closed:
+            self.file.close()
+
+
+    def __enter__(self) -> 'RecipeSink':
+        return self
+
+
+    def __exit__(self, *exception: any) -> None:
+        self.close()
+
+
+def openTextFile(filename: str, compression: str | None, mode: str = 'w') -> io.TextIOBase:
+    """
+    Opens a text file, compressing or decompressing its contents if requested.
+
+    Args:
+        filename (str): The file to open
+        compression (str | None): The compression codec to use, either 'gzip' or 'zstd', or None if uncompressed
+        mode (str): The mode to open the file in, either 'r', 'w' or 'a'
+
+    Returns:
+        io.TextIOBase: The open file
+    """
+
+    if compression == 'gzip':
+        return gzip.open(filename, mode=f'{mode}t', encoding='utf-8', newline='')
+
+    if compression == 'zstd':
+        #zstd support relies on the optional zstandard package
+        if not find_spec('zstandard'):
+            raise ValueError('zstd compression requires the zstandard package to be installed')
+
+        import zstandard
+        rawFile = open(filename, mode=f'{mode}b')
+        stream = zstandard.ZstdDecompressor().stream_reader(rawFile) if mode == 'r' else zstandard.ZstdCompressor().stream_writer(rawFile)
+        return io.TextIOWrapper(stream, encoding='utf-8', newline='')
+
+    return open(filename, mode=mode, newline='', encoding='utf-8')
+
+
+class CsvSink(RecipeSink):
+    """
+    Writes recipe details as rows of a csv file, with list fields written as their representation.
+    """
+
+    appendable = True
+
+    def __init__(self, filename: str, compression: str | None = None, append: bool = False) -> None:
+        super().__init__(filename, compression, append)
+        self.file = openTextFile(filename, compression, 'a' if append else 'w')
+        self.writer = csv.writer(self.file)
+
+        #write a header for a new file
+        if (not append):
+            self.writer.writerow(recipeDetailsHeader)
+            self.file.flush()
+
+
+    def write(self, url: str, details: Tuple[any]) -> None:
+        #write the tuples of a Recipe's list fields as lists, so that rows read the same whichever tuple they were written from
+        self.writer.writerow([list(value) if type(value) is tuple else value for value in details])
+
+
+class JsonLinesSink(RecipeSink):
+    """
+    Writes recipe details as a JSON object per line, with list fields as arrays and numeric fields as numbers.
+    """
+
+    appendable = True
+
+    def __init__(self, filename: str, compression: str | None = None, append: bool = False) -> None:
+        super().__init__(filename, compression, append)
+        self.file = openTextFile(filename, compression, 'a' if append else 'w')
+
+
+    def write(self, url: str, details: Tuple[any]) -> None:
+        record = dict(zip([recipeUrlColumn] + recipeDetailsHeader, [url] + typeRecipeDetails(details)))
+        self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+class ParquetSink(RecipeSink):
+    """
+    Writes recipe details to a Parquet file with list and numeric column types, buffering rows into row groups as they stream in.
+
+    Parquet support relies on the optional pyarrow package. As the file footer is only written on closing, the run cannot be resumed.
+    """
+
+    def __init__(self, filename: str, compression: str | None = None, append: bool = False, rowGroupSize: int = 1000) -> None:
+        """
+        Opens the sink's file.
+
+        Args:
+            filename (str): The file to write to
+            compression (str | None): The compression codec applied to each column chunk, either 'gzip' or 'zstd', or None to write uncompressed
+            append (bool): Must be False, as Parquet files cannot be appended to
+            rowGroupSize (int): The number of rows buffered before being written as a row group
+        """
+
+        super().__init__(filename, compression, append)
+
+        if not find_spec('pyarrow'):
+            raise ValueError('Parquet output requires the pyarrow package to be installed')
+
+        import pyarrow
+        import pyarrow.parquet
+
+        #define the schema from the type of each column
+        arrowTypes = {'text': pyarrow.string(), 'list': pyarrow.list_(pyarrow.string()), 'integer': pyarrow.int32(), 'number': pyarrow.float64()}
+        self.pyarrow = pyarrow
+        self.schema = pyarrow.schema([(recipeUrlColumn, pyarrow.string())] + [(name, arrowTypes[columnType]) for name, columnType in zip(recipeDetailsHeader, recipeDetailsTypes)])
+
+        self.rowGroupSize = max(1, rowGroupSize)
+        self.rows = []
+        self.file = open(filename, mode='wb')
+        self.writer = pyarrow.parquet.ParquetWriter(self.file, self.schema, compression=compression or 'none')
+
+
+    def write(self, url: str, details: Tuple[any]) -> None:
+        self.rows.append([url] + typeRecipeDetails(details))
+
+        if len(self.rows) >= self.rowGroupSize:
+            self.writeRowGroup()
+
+
+    def writeRowGroup(self) -> None:
+        """
+        Writes the buffered rows as a row group.
+
+        Returns:
+            None
+        """
+
+        if not self.rows:
+            return
+
+        #transpose the buffered rows into columns
+        columns = [self.pyarrow.array(list(values), type=field.type) for values, field in zip(zip(*self.rows), self.schema)]
+        self.writer.write_table(self.pyarrow.Table.from_arrays(columns, schema=self.schema), row_group_size=self.rowGroupSize)
+        self.rows = []
+
+
+    def close(self) -> None:
+        #write any remaining rows and the file footer before closing
+        if not self.closed:
+            self.writeRowGroup()
+            self.writer.close()
+            self.file.close()
+
+
+class SqliteSink(RecipeSink):
+    """
+    Writes recipe details into a RecipeDatabase, upserting each recipe by url so that an existing store is updated rather than replaced.
+
+    As rows are upserted rather than appended, re-running over the same urls is safe, but the journal does not record offsets to resume from.
+    """
+
+    def __init__(self, filename: str, compression: str | None = None, append: bool = False, batchSize: int = 500) -> None:
+        """
+        Opens the sink's store.
+
+        Args:
+            filename (str): The SQLite file to write to
+            compression (str | None): Must be None, as SQLite files are not compressed
+            append (bool): Must be False, as the store is updated in place rather than appended to
+            batchSize (int): The maximum number of recipes written in each transaction
+        """
+
+        super().__init__(filename, compression, append)
+
+        if compression is not None:
+            raise ValueError('SQLite output cannot be compressed')
+
+        from csv_utils.database_functions import RecipeDatabase
+        self.database = RecipeDatabase(filename, batchSize)
+
+
+    def write(self, url: str, details: Tuple[any]) -> None:
+        self.database.upsertRecipe(url, details)
+
+
+    def flush(self) -> None:
+        self.database.commit()
+
+
+    def sync(self) -> None:
+        #a commit is durable once it returns
+        self.database.commit()
+
+
+    def tell(self) -> int:
+        return self.database.countRecipes()
+
+
+    @property
+    def closed(self) -> bool:
+        return self.database.connection is None
+
+
+    def close(self) -> None:
+        self.database.close()
+
+
+#define the sink writing each output format
+outputSinks = {'csv': CsvSink, 'jsonl': JsonLinesSink, 'parquet': ParquetSink, 'sqlite': SqliteSink}
+
+
+def resolveOutputFormat(filename: str, outputFormat: str | None = None, compression: str | None = None) -> Tuple[str, str | None]:
+    """
+    Resolves the output format and compression used for a file, inferring any not given from its filename.
+
+    Args:
+        filename (str): The file to write to
+        outputFormat (str | None): The output format, either 'csv', 'jsonl', 'parquet' or 'sqlite', or None to infer it from the filename
+        compression (str | None): The compression codec to use, or None to infer it from the filename
+
+    Returns:
+        Tuple[str, str | None]: The output format and compression codec
+    """
+
+    inferredFormat, inferredCompression = inferOutputFormat(filename)
+    outputFormat = outputFormat or inferredFormat
+
+    if outputFormat not in outputSinks:
+        raise ValueError(f'Unknown output format {outputFormat}, expected one of {", ".join(outputFormats)}')
+
+    return outputFormat, compression or inferredCompression
+
+
+def isResumableOutput(filename: str, outputFormat: str | None = None, compression: str | None = None) -> bool:
+    """
+    Determines whether an interrupted run writing to a file can be resumed by appending to it.
+
+    Args:
+        filename (str): The file being written
+        outputFormat (str | None): The output format, or None to infer it from the filename
+        compression (str | None): The compression codec, or None to infer it from the filename
+
+    Returns:
+        bool: Whether the file's sink is resumable
+    """
+
+    outputFormat, compression = resolveOutputFormat(filename, outputFormat, compression)
+    return outputSinks[outputFormat].appendable and compression is None
+
+
+def openRecipeSink(filename: str, outputFormat: str | None = None, compression: str | None = None, append: bool = False) -> RecipeSink:
+    """
+    Opens a sink writing recipe details to a given file.
+
+    Args:
+        filename (str): The file to write to
+        outputFormat (str | None): The output format, either 'csv', 'jsonl', 'parquet' or 'sqlite', or None to infer it from the filename
+        compression (str | None): The compression codec to use, or None to infer it from the filename
+        append (bool): Determines whether rows are appended to an existing file rather than replacing it
+
+    Returns:
+        RecipeSink: The open sink
+    """
+
+    outputFormat, compression = resolveOutputFormat(filename, outputFormat, compression)
+    return outputSinks[outputFormat](filename, compression, append)
@@ -0,0 +1,309 @@
+#import the necessary modules
+import ast
+import csv
+import json
+import operator
+from importlib.util import find_spec
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Tuple
+from scraping_utils.recipe_functions import Recipe, RecipeBatch, createRecipe
+from csv_utils.output_functions import openTextFile, recipeDetailsHeader, recipeDetailsTypes, recipeUrlColumn, resolveOutputFormat
+
+#define the type of each column that can appear in a recipe details file
+columnTypes = dict(zip(recipeDetailsHeader, recipeDetailsTypes), **{recipeUrlColumn: 'text'})
+
+#define the operators that filters can compare a column's value with
+filterOperators = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda value, options: value in options,
+    'contains': lambda value, item: item in value
+}
+
+#define the operators that can be pushed into a Parquet scan, whose handling of missing values matches matchesFilters
+pushdownOperators = ('==', '<', '<=', '>', '>=')
+
+
+def parseCsvValue(text: str, columnType: str) -> any:
+    """
+    Parses a csv cell written by CsvSink into the type of its column.
+
+    Args:
+        text (str): The cell's text
+        columnType (str): The type of the column, either 'text', 'list', 'integer' or 'number'
+
+    Returns:
+        any: The typed value, or None if the cell is empty
+    """
+
+    if text == '':
+        return None
+    elif columnType == 'list':
+        return ast.literal_eval(text)
+    elif columnType == 'integer':
+        return int(float(text))
+    elif columnType == 'number':
+        return float(text)
+
+    return text
+
+
+def matchesFilters(record: Dict[str, any], filters: List[Tuple[str, str, any]]) -> bool:
+    """
+    Determines whether a record satisfies every filter.
+
+    A missing value only satisfies equality and inequality comparisons, as it cannot be ordered or searched.
+
+    Args:
+        record (Dict[str, any]): The record, holding at least the filtered columns
+        filters (List[Tuple[str, str, any]]): The filters, each a column, an operator and a value to compare with
+
+    Returns:
+        bool: Whether the record satisfies every filter
+    """
+
+    for column, operatorName, value in filters:
+        recordValue = record[column]
+
+        if recordValue is None and operatorName not in ('==', '!='):
+            return False
+
+        if not filterOperators[operatorName](recordValue, value):
+            return False
+
+    return True
+
+
+def validateQuery(columns: Iterable[str] | None, filters: List[Tuple[str, str, any]] | None) -> Tuple[List[str] | None, List[Tuple[str, str, any]]]:
+    """
+    Checks that the projected columns and filters of a read are known.
+
+    Args:
+        columns (Iterable[str] | None): The columns to read, or None to read every column
+        filters (List[Tuple[str, str, any]] | None): The filters to apply, or None to keep every record
+
+    Returns:
+        Tuple[List[str] | None, List[Tuple[str, str, any]]]: The columns and filters as lists
+    """
+
+    columns = list(columns) if columns is not None else None
+    filters = list(filters or [])
+
+    for column in (columns or []) + [column for column, _, _ in filters]:
+        if column not in columnTypes:
+            raise ValueError(f'Unknown column {column}')
+
+    for _, operatorName, _ in filters:
+        if operatorName not in filterOperators:
+            raise ValueError(f'Unknown filter operator {operatorName}, expected one of {", ".join(filterOperators)}')
+
+    return columns, filters
+
+
+def iterCsvRecords(filename: str, compression: str | None, columns: List[str] | None, filters: List[Tuple[str, str, any]]) -> Iterator[Dict[str, any]]:
+    """
+    Reads typed records from a csv file a row at a time.
+
+    The filtered columns of each row are parsed first, and the remaining projected columns only for rows that satisfy the filters.
+    A projected column the file does not have, such as the recipe url of a csv file, is read as None, as it is from the other formats.
+
+    Args:
+        filename (str): The csv file to read
+        compression (str | None): The compression codec of the file, or None if uncompressed
+        columns (List[str] | None): The columns to read, or None to read every column
+        filters (List[Tuple[str, str, any]]): The filters to apply
+
+    Returns:
+        Iterator[Dict[str, any]]: The typed records
+    """
+
+    with openTextFile(filename, compression, 'r') as file:
+        reader = csv.reader(file)
+        header = next(reader, [])
+
+        #find the position and type of the filtered and projected columns
+        positions = {column: index for index, column in enumerate(header)}
+        projected = columns if columns is not None else header
+        filtered = [column for column in dict.fromkeys(column for column, _, _ in filters) if column in positions]
+
+        for column, _, _ in filters:
+            if column not in positions:
+                raise ValueError(f'Column {column} is not present in {filename}')
+
+        for row in reader:
+            #evaluate the filters on their columns alone, skipping the rest of the row if any fails
+            record = {column: parseCsvValue(row[positions[column]], columnTypes.get(column, 'text')) for column in filtered}
+
+            if not matchesFilters(record, filters):
+                continue
+
+            yield {column: record[column] if column in record else parseCsvValue(row[positions[column]], columnTypes.get(column, 'text')) if column in positions else None for column in projected}
+
+
+def iterJsonLinesRecords(filename: str, compression: str | None, columns: List[str] | None, filters: List[Tuple[str, str, any]]) -> Iterator[Dict[str, any]]:
+    """
+    Reads records from a JSON Lines file a line at a time, its values already being typed.
+
+    Args:
+        filename (str): The JSON Lines file to read
+        compression (str | None): The compression codec of the file, or None if uncompressed
+        columns (List[str] | None): The columns to read, or None to read every column
+        filters (List[Tuple[str, str, any]]): The filters to apply
+
+    Returns:
+        Iterator[Dict[str, any]]: The typed records
+    """
+
+    with openTextFile(filename, compression, 'r') as file:
+        for line in file:
+            if not line.strip():
+                continue
+
+            record = json.loads(line)
+
+            if not matchesFilters(record, filters):
+                continue
+
+            yield record if columns is None else {column: record.get(column) for column in columns}
+
+
+def iterParquetRecords(filename: str, columns: List[str] | None, filters: List[Tuple[str, str, any]], batchSize: int = 1000) -> Iterator[Dict[str, any]]:
+    """
+    Reads records from a Parquet file a batch at a time, reading only the projected and filtered columns.
+
+    Comparisons that Parquet supports are pushed into the scan, so row groups whose statistics rule them out are skipped.
+    Parquet support relies on the optional pyarrow package.
+
+    Args:
+        filename (str): The Parquet file to read
+        columns (List[str] | None): The columns to read, or None to read every column
+        filters (List[Tuple[str, str, any]]): The filters to apply
+        batchSize (int): The maximum number of rows decoded at once
+
+    Returns:
+        Iterator[Dict[str, any]]: The typed records
+    """
+
+    if not find_spec('pyarrow'):
+        raise ValueError('Parquet input requires the pyarrow package to be installed')
+
+    import pyarrow.compute
+    import pyarrow.dataset
+
+    dataset = pyarrow.dataset.dataset(filename, format='parquet')
+
+    #read the projected columns along with those only needed for filtering
+    projected = columns if columns is not None else dataset.schema.names
+    scanned = list(dict.fromkeys(projected + [column for column, _, _ in filters]))
+
+    #push the supported comparisons into the scan
+    expression = None
+
+    for column, operatorName, value in filters:
+        if operatorName in pushdownOperators and value is not None:
+            comparison = filterOperators[operatorName](pyarrow.compute.field(column), value)
+            expression = comparison if expression is None else expression & comparison
+
+    for batch in dataset.to_batches(columns=scanned, filter=expression, batch_size=batchSize):
+        for record in batch.to_pylist():
+            if matchesFilters(record, filters):
+                yield {column: record[column] for column in projected}
+
+
+def iterRecipeDetails(filename: str, columns: Iterable[str] | None = None, filters: List[Tuple[str, str, any]] | None = None, outputFormat: str | None = None, compression: str | None = None) -> Iterator[Dict[str, any]]:
+    """
+    Reads the details of recipes from a csv, JSON Lines, Parquet or SQLite file as typed records, one at a time.
+
+    Nutrients and ratings are read as floats, times and counts as integers and ingredients and method as lists, whatever the file's format.
+    Only the projected columns are returned, and rows failing a filter are skipped while reading, so memory use does not grow with the file.
+    Filters are tuples of a column, an operator ('==', '!=', '<', '<=', '>', '>=', 'in' or 'contains') and a value, such as ('Calories', '<', 500).
+
+    Args:
+        filename (str): The file to read recipe details from
+        columns (Iterable[str] | None): The columns to read, or None to read every column
+        filters (List[Tuple[str, str, any]] | None): The filters each record must satisfy, or None to keep every record
+        outputFormat (str | None): The format of the file, either 'csv', 'jsonl', 'parquet' or 'sqlite', or None to infer it from the filename
+        compression (str | None): The compression codec of the file, or None to infer it from the filename
+
+    Returns:
+        Iterator[Dict[str, any]]: The typed record of each recipe, keyed by column name
+    """
+
+    columns, filters = validateQuery(columns, filters)
+    outputFormat, compression = resolveOutputFormat(filename, outputFormat, compression)
+
+    if outputFormat == 'sqlite':
+        from csv_utils.database_functions import RecipeDatabase
+        return RecipeDatabase(filename).queryRecipes(filters, columns)
+    elif outputFormat == 'parquet':
+        return iterParquetRecords(filename, columns, filters)
+    elif outputFormat == 'jsonl':
+        return iterJsonLinesRecords(filename, compression, columns, filters)
+
+    return iterCsvRecords(filename, compression, columns, filters)
+
+
+def iterRecipeDetailBatches(filename: str, batchSize: int = 1000, columns: Iterable[str] | None = None, filters: List[Tuple[str, str, any]] | None = None, outputFormat: str | None = None, compression: str | None = None) -> Iterator[List[Dict[str, any]]]:
+    """
+    Reads the details of recipes from a file as lists of typed records, for consumers that process records in bulk.
+
+    Args:
+        filename (str): The file to read recipe details from
+        batchSize (int): The maximum number of records in each batch
+        columns (Iterable[str] | None): The columns to read, or None to read every column
+        filters (List[Tuple[str, str, any]] | None): The filters each record must satisfy, or None to keep every record
+        outputFormat (str | None): The format of the file, or None to infer it from the filename
+        compression (str | None): The compression codec of the file, or None to infer it from the filename
+
+    Returns:
+        Iterator[List[Dict[str, any]]]: The batches of records, each holding at most batchSize records
+    """
+
+    records = iterRecipeDetails(filename, columns, filters, outputFormat, compression)
+
+    while True:
+        batch = list(islice(records, max(1, batchSize)))
+
+        if not batch:
+            return
+
+        yield batch
+
+
+def iterRecipes(filename: str, filters: List[Tuple[str, str, any]] | None = None, outputFormat: str | None = None, compression: str | None = None) -> Iterator[Tuple[str | None, Recipe]]:
+    """
+    Reads the details of recipes from a file as Recipe tuples, the same type getRecipeDetails returns, one at a time.
+
+    Args:
+        filename (str): The file to read recipe details from
+        filters (List[Tuple[str, str, any]] | None): The filters each record must satisfy, or None to keep every record
+        outputFormat (str | None): The format of the file, or None to infer it from the filename
+        compression (str | None): The compression codec of the file, or None to infer it from the filename
+
+    Returns:
+        Iterator[Tuple[str | None, Recipe]]: The pairs of each recipe url, or None if the file does not record it, and its details
+    """
+
+    for record in iterRecipeDetails(filename, None, filters, outputFormat, compression):
+        yield record.get(recipeUrlColumn), createRecipe(record.get(column) for column in recipeDetailsHeader)
+
+
+def readRecipeBatch(filename: str, filters: List[Tuple[str, str, any]] | None = None, outputFormat: str | None = None, compression: str | None = None) -> RecipeBatch:
+    """
+    Reads the details of recipes from a file into a RecipeBatch, for holding a large dataset in memory for analysis.
+
+    Args:
+        filename (str): The file to read recipe details from
+        filters (List[Tuple[str, str, any]] | None): The filters each record must satisfy, or None to keep every record
+        outputFormat (str | None): The format of the file, or None to infer it from the filename
+        compression (str | None): The compression codec of the file, or None to infer it from the filename
+
+    Returns:
+        RecipeBatch: The recipes read, with numeric fields held in typed arrays
+    """
+
+    return RecipeBatch(iterRecipes(filename, filters, outputFormat, compression))
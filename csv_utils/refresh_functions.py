@@ -0,0 +1,143 @@
+#import the necessary modules
+import logging
+from collections import Counter
+from typing import Dict, Iterable, Iterator, Tuple
+from scraping_utils.concurrency_functions import boundedMap
+from scraping_utils.http_functions import fetchPageIfModified
+from scraping_utils.scraping_functions import getRecipeContentHash, getRecipeDetailsMany
+from csv_utils.database_functions import RecipeDatabase, SourceState
+from monitoring_utils.metrics_functions import getMetrics
+
+logger = logging.getLogger(__name__)
+
+#define the outcomes of refreshing a recipe, from the cheapest to detect to the most expensive
+LASTMOD = 'lastmod'
+NOT_MODIFIED = 'not_modified'
+SAME_CONTENT = 'same_content'
+CHANGED = 'changed'
+NEW = 'new'
+FAILED = 'failed'
+
+
+def checkRecipePage(url: str, lastmod: str | None, state: SourceState | None) -> Tuple[str, SourceState | None, str | None]:
+    """
+    Determines whether a recipe's page has changed since its details were stored, requesting it only if it has.
+
+    The page is requested with the validators it was last served with, and a page the host reports as modified is compared by the hash of its recipe content.
+
+    Args:
+        url (str): The url of the recipe
+        lastmod (str | None): The sitemap lastmod of the page, or None if not known
+        state (SourceState | None): The state of the page when its details were stored, or None if the recipe is new
+
+    Returns:
+        Tuple[str, SourceState | None, str | None]: The outcome, the page's new state, or None if it could not be reached, and its html content if it needs extracting
+    """
+
+    page = fetchPageIfModified(url, state.etag if state else None, state.lastModified if state else None)
+
+    if page is None:
+        return FAILED, None, None
+
+    if page.html is None:
+        return NOT_MODIFIED, SourceState(lastmod, page.etag, page.lastModified, state.contentHash), None
+
+    #compare the recipe content, as a page is often re-served for changes that do not touch the recipe
+    contentHash = getRecipeContentHash(page.html)
+    newState = SourceState(lastmod, page.etag, page.lastModified, contentHash)
+
+    if state and state.contentHash == contentHash:
+        return SAME_CONTENT, newState, None
+
+    return (CHANGED if state else NEW), newState, page.html
+
+
+def refreshRecipeDetails(recipeUrls: Iterable[Tuple[str, str | None]], filename: str, precise: bool, concurrency: int = 8, processes: int = 0, ingredientBatchSize: int = 0) -> Dict[str, int]:
+    """
+    Brings a SQLite store of recipe details up to date, extracting only the recipes that are new or whose page has changed since the last run.
+
+    A recipe whose sitemap lastmod matches the one stored is skipped without a request.
+    Any other stored recipe is requested conditionally with the validators its page was last served with, and a page reported as modified is compared by the hash of its recipe content.
+    Only new and changed recipes are extracted, and they are rewritten in place, while unchanged recipes are left as they are.
+    Each outcome is counted in the shared metrics.
+
+    Args:
+        recipeUrls (Iterable[Tuple[str, str | None]]): The pairs of each recipe url and its sitemap lastmod, or None if not known
+        filename (str): The SQLite file holding the store
+        precise (bool): Determines whether additional precision should be used for obtaining ingredient names
+        concurrency (int): The maximum number of recipe pages to request at once
+        processes (int): The number of processes to parse recipe pages in, or zero to parse them on the fetching threads
+        ingredientBatchSize (int): The number of recipes whose raw ingredients are resolved by the NLP together, or zero to resolve each recipe's individually
+
+    Returns:
+        Dict[str, int]: The number of recipes with each outcome, either 'lastmod', 'not_modified', 'same_content', 'changed', 'new' or 'failed'
+    """
+
+    metrics = getMetrics()
+    database = RecipeDatabase(filename)
+    counts = Counter()
+
+    #hold the html and new state of each changed page until its extraction
+    pages = {}
+    states = {}
+
+    #define the counting of each recipe's outcome
+    def record(outcome: str) -> None:
+        counts[outcome] += 1
+        metrics.increment('scraper_refresh_total', {'result': outcome})
+
+    #define the urls to check, skipping duplicates and any url whose lastmod is unchanged
+    def candidateUrls() -> Iterator[Tuple[str, str | None, SourceState | None]]:
+        seenUrls = set()
+
+        for url, lastmod in recipeUrls:
+            if (url in seenUrls):
+                continue
+
+            seenUrls.add(url)
+            state = database.getSourceState(url)
+
+            if (state and lastmod and state.lastmod == lastmod):
+                record(LASTMOD)
+                continue
+
+            yield url, lastmod, state
+
+    #define the urls whose pages changed, recording the new state of each page found unchanged
+    #the store is only used from the consuming thread, which draws these urls
+    def changedUrls() -> Iterator[str]:
+        for (url, lastmod, state), result in boundedMap(lambda candidate: checkRecipePage(*candidate), candidateUrls(), concurrency):
+            outcome, newState, html = result or (FAILED, None, None)
+
+            if (html is None):
+                record(outcome)
+
+                if (newState):
+                    database.recordSourceState(url, newState)
+
+                continue
+
+            pages[url] = html
+            states[url] = (outcome, newState)
+            yield url
+
+    try:
+        #extract each changed page from the html already fetched, rewriting its recipe along with its new state
+        for url, details in getRecipeDetailsMany(changedUrls(), precise, concurrency, processes=processes, ingredientBatchSize=ingredientBatchSize, fetch=pages.pop):
+            outcome, state = states.pop(url)
+
+            if (details):
+                with metrics.timeStage('write'):
+                    database.upsertRecipe(url, details)
+                    database.recordSourceState(url, state)
+
+                metrics.increment('scraper_records_written_total')
+                record(outcome)
+            else:
+                record(FAILED)
+
+    finally:
+        database.close()
+
+    logger.info('Refreshed %s: %d new, %d changed, %d unchanged, %d failed', filename, counts[NEW], counts[CHANGED], counts[LASTMOD] + counts[NOT_MODIFIED] + counts[SAME_CONTENT], counts[FAILED], extra={'counts': dict(counts)})
+    return dict(counts)
@@ -0,0 +1,450 @@
+#import the necessary modules
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import re
+import socket
+import threading
+import time
+from typing import Dict, Iterable, Iterator, Tuple
+from scraping_utils.archive_functions import configureArchive, getArchiveSettings
+from scraping_utils.cache_functions import configureCache, getCacheSettings
+from scraping_utils.concurrency_functions import boundedMap
+from scraping_utils.http_functions import configureHttpClient, getHttpClientSettings
+from scraping_utils.parser_functions import configureParser, getParserSettings
+from scraping_utils.queue_functions import PAGES, RECIPES, Lease, WorkQueue
+from scraping_utils.throttle_functions import configureRateLimiter, getRateLimiterSettings
+from scraping_utils.scraping_functions import configureBaseUrl, getBaseUrl, getRecipeDetailsMany, getRecipeUrlsFromPage
+from csv_utils.output_functions import JsonLinesSink, openRecipeSink, recipeDetailsHeader, recipeUrlColumn
+from text_utils.ingredient_cache import configureIngredientCache, getIngredientCacheSettings
+from monitoring_utils.logging_functions import configureLogging, getLoggingSettings
+from monitoring_utils.metrics_functions import getMetrics
+
+logger = logging.getLogger(__name__)
+
+
+def getWorkerId() -> str:
+    """
+    Generates an id for a worker that is unique across the hosts sharing a queue.
+
+    Returns:
+        str: The host name and process id of the worker
+    """
+
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+def getShardFilename(shardDirectory: str, workerId: str) -> str:
+    """
+    Finds the output shard written by a worker.
+
+    Args:
+        shardDirectory (str): The directory holding every worker's shard
+        workerId (str): The id of the worker
+
+    Returns:
+        str: The JSON Lines file the worker writes recipe details to
+    """
+
+    return os.path.join(shardDirectory, f'{re.sub(r"[^A-Za-z0-9_.-]", "_", workerId)}.jsonl')
+
+
+def openShard(filename: str) -> JsonLinesSink:
+    """
+    Opens a worker's output shard for appending, discarding any partially written final line left by a worker that was killed.
+
+    Args:
+        filename (str): The shard to open
+
+    Returns:
+        JsonLinesSink: The sink appending to the shard
+    """
+
+    if os.path.exists(filename):
+        with open(filename, mode='rb+') as file:
+            content = file.read()
+            file.truncate(content.rfind(b'\n') + 1)
+
+    return JsonLinesSink(filename, append=os.path.exists(filename))
+
+
+def heartbeatLease(queue: WorkQueue, lease: Lease, workerId: str, stopEvent: threading.Event) -> None:
+    """
+    Extends a lease at a third of its duration until stopped, so that it only expires if the worker dies.
+
+    Args:
+        queue (WorkQueue): The queue the lease was claimed from
+        lease (Lease): The lease to extend
+        workerId (str): The id of the worker holding the lease
+        stopEvent (threading.Event): The event set once the lease is completed
+
+    Returns:
+        None
+    """
+
+    while not stopEvent.wait(queue.leaseSeconds / 3):
+        if not queue.heartbeat(lease, workerId):
+            logger.warning('Lease %d expired before it was completed and may be processed twice', lease.taskId, extra={'task': lease.taskId})
+            return
+
+
+def processPageLease(lease: Lease, concurrency: int) -> Tuple[list, list]:
+    """
+    Finds the recipe urls on each search page of a lease.
+
+    Args:
+        lease (Lease): The lease of search page numbers
+        concurrency (int): The maximum number of pages to request at once
+
+    Returns:
+        Tuple[list, list]: The recipe urls found, and the pages that could not be reached
+    """
+
+    recipeUrls = []
+    failedPages = []
+
+    for page, pageUrls in boundedMap(getRecipeUrlsFromPage, lease.items, concurrency):
+        if pageUrls is None:
+            failedPages.append(page)
+        else:
+            recipeUrls.extend(pageUrls)
+
+    return recipeUrls, failedPages
+
+
+def processRecipeLease(lease: Lease, sink: JsonLinesSink, precise: bool, concurrency: int, processes: int, ingredientBatchSize: int) -> list:
+    """
+    Writes the details of each recipe of a lease to a worker's shard, syncing the shard before the lease is completed.
+
+    Args:
+        lease (Lease): The lease of recipe urls
+        sink (JsonLinesSink): The worker's shard
+        precise (bool): Determines whether additional precision should be used for obtaining ingredient names
+        concurrency (int): The maximum number of recipe pages to request at once
+        processes (int): The number of processes to parse recipe pages in, or zero to parse them on the fetching threads
+        ingredientBatchSize (int): The number of recipes whose raw ingredients are resolved together, or zero to resolve each individually
+
+    Returns:
+        list: The recipe urls that could not be scraped
+    """
+
+    failedUrls = []
+
+    for url, details in getRecipeDetailsMany(lease.items, precise, concurrency, processes=processes, ingredientBatchSize=ingredientBatchSize):
+        if details:
+            sink.write(url, details)
+            sink.flush()
+            getMetrics().increment('scraper_records_written_total')
+        else:
+            failedUrls.append(url)
+
+    sink.sync()
+    return failedUrls
+
+
+def runWorker(queuePath: str, shardDirectory: str, workerId: str | None = None, precise: bool = False, concurrency: int = 8, processes: int = 0, ingredientBatchSize: int = 0, urlsPerTask: int = 50, leaseSeconds: float = 120.0, pollInterval: float = 1.0) -> int:
+    """
+    Processes leases from a shared queue until the crawl is finished, writing recipe details to the worker's own shard.
+
+    Search page leases queue the recipe urls they discover, and recipe leases write the details of their recipes.
+    While other workers hold leases that may still add work or expire, the worker waits for new tasks rather than exiting.
+
+    Args:
+        queuePath (str): The SQLite file holding the queue
+        shardDirectory (str): The directory to write the worker's shard to
+        workerId (str | None): The id of the worker, or None to derive one from the host and process
+        precise (bool): Determines whether additional precision should be used for obtaining ingredient names
+        concurrency (int): The maximum number of pages to request at once
+        processes (int): The number of processes to parse recipe pages in, or zero to parse them on the fetching threads
+        ingredientBatchSize (int): The number of recipes whose raw ingredients are resolved together, or zero to resolve each individually
+        urlsPerTask (int): The maximum number of recipe urls in each task queued from discovered urls
+        leaseSeconds (float): The number of seconds a lease lasts without a heartbeat
+        pollInterval (float): The number of seconds to wait before checking for new tasks when none are pending
+
+    Returns:
+        int: The number of leases the worker completed
+    """
+
+    workerId = workerId or getWorkerId()
+    os.makedirs(shardDirectory, exist_ok=True)
+    queue = WorkQueue(queuePath, leaseSeconds)
+    completed = 0
+
+    logger.info('Worker %s started', workerId, extra={'worker': workerId})
+
+    try:
+        with openShard(getShardFilename(shardDirectory, workerId)) as sink:
+            while True:
+                lease = queue.claim(workerId)
+
+                #if nothing is pending, finish once no other worker holds a lease, and otherwise wait for new work
+                if lease is None:
+                    if queue.isFinished():
+                        break
+
+                    time.sleep(pollInterval)
+                    continue
+
+                logger.info('Worker %s leased %d %s', workerId, len(lease.items), lease.kind, extra={'worker': workerId, 'task': lease.taskId})
+                stopEvent = threading.Event()
+                heartbeat = threading.Thread(target=heartbeatLease, args=(queue, lease, workerId, stopEvent), daemon=True)
+                heartbeat.start()
+
+                try:
+                    if lease.kind == PAGES:
+                        recipeUrls, failedItems = processPageLease(lease, concurrency)
+                    else:
+                        recipeUrls, failedItems = [], processRecipeLease(lease, sink, precise, concurrency, processes, ingredientBatchSize)
+
+                #return the lease if the worker is stopped or fails, so another worker can take it
+                except(BaseException):
+                    queue.release(lease, workerId)
+                    raise
+
+                finally:
+                    stopEvent.set()
+                    heartbeat.join()
+
+                #a lease lost after expiring is left to the worker that holds it now
+                if not queue.complete(lease, workerId, recipeUrls, failedItems, urlsPerTask):
+                    logger.warning('Lease %d was lost before it was completed', lease.taskId, extra={'worker': workerId, 'task': lease.taskId})
+                    continue
+
+                getMetrics().increment('scraper_leases_total', {'kind': lease.kind})
+                completed += 1
+
+    finally:
+        queue.close()
+
+    logger.info('Worker %s finished after %d leases', workerId, completed, extra={'worker': workerId})
+    return completed
+
+
+def getWorkerSettings() -> Dict[str, Dict[str, any]]:
+    """
+    Obtains the settings of this process that a worker process must share, such as the page cache and http client.
+
+    Returns:
+        Dict[str, Dict[str, any]]: The settings, keyed by what they configure
+    """
+
+    return {
+        'logging': getLoggingSettings(),
+        'http': getHttpClientSettings(),
+        'rateLimiter': getRateLimiterSettings(),
+        'cache': getCacheSettings(),
+        'archive': getArchiveSettings(),
+        'ingredientCache': getIngredientCacheSettings(),
+        'parser': getParserSettings(),
+        'site': {'url': getBaseUrl()}
+    }
+
+
+def runWorkerProcess(settings: Dict[str, Dict[str, any]], workerArguments: Dict[str, any]) -> None:
+    """
+    Configures a newly spawned worker process with its parent's settings and runs a worker.
+
+    Args:
+        settings (Dict[str, Dict[str, any]]): The parent's settings, as returned by getWorkerSettings
+        workerArguments (Dict[str, any]): The keyword arguments of runWorker
+
+    Returns:
+        None
+    """
+
+    configureLogging(**settings['logging'])
+    configureHttpClient(**settings['http'])
+    configureRateLimiter(**settings['rateLimiter'])
+    configureCache(**settings['cache'])
+    configureArchive(**settings['archive'])
+    configureIngredientCache(**settings['ingredientCache'])
+    configureParser(**settings['parser'])
+    configureBaseUrl(**settings['site'])
+
+    runWorker(**workerArguments)
+
+
+def planCrawl(queue: WorkQueue, startPage: int | None = None, endPage: int | None = None, recipeUrls: Iterable[str] | None = None, pagesPerTask: int = 5, urlsPerTask: int = 50) -> bool:
+    """
+    Partitions a crawl into tasks in an empty queue, leaving a queue that already holds a crawl to be resumed.
+
+    Args:
+        queue (WorkQueue): The queue to add tasks to
+        startPage (int | None): The search page to begin on, or None if only recipe urls are given
+        endPage (int | None): The search page to end on, or None if only recipe urls are given
+        recipeUrls (Iterable[str] | None): Recipe urls to scrape in addition to those discovered, such as those read from a file
+        pagesPerTask (int): The maximum number of search pages in each task
+        urlsPerTask (int): The maximum number of recipe urls in each task
+
+    Returns:
+        bool: Whether a new crawl was planned, rather than an existing one resumed
+    """
+
+    if not queue.isEmpty():
+        logger.info('Resuming the crawl held in %s: %s', queue.path, queue.getCounts())
+        return False
+
+    if startPage is not None and endPage is not None:
+        queue.addTasks(PAGES, range(startPage, endPage + 1), pagesPerTask)
+
+    if recipeUrls is not None:
+        queue.addTasks(RECIPES, recipeUrls, urlsPerTask)
+
+    logger.info('Planned a crawl in %s: %s', queue.path, queue.getCounts())
+    return True
+
+
+def runLocalWorkers(queuePath: str, shardDirectory: str, workers: int, workerArguments: Dict[str, any] | None = None) -> None:
+    """
+    Runs workers in separate local processes until the crawl held in a queue is finished.
+
+    Args:
+        queuePath (str): The SQLite file holding the queue
+        shardDirectory (str): The directory to write the workers' shards to
+        workers (int): The number of worker processes to run
+        workerArguments (Dict[str, any] | None): Any further keyword arguments of runWorker, shared by every worker
+
+    Returns:
+        None
+    """
+
+    #spawn rather than fork, as the parent may be running threads
+    context = multiprocessing.get_context('spawn')
+    settings = getWorkerSettings()
+    processes = []
+
+    for index in range(max(1, workers)):
+        arguments = dict(workerArguments or {}, queuePath=queuePath, shardDirectory=shardDirectory, workerId=f'{getWorkerId()}-{index}')
+        process = context.Process(target=runWorkerProcess, args=(settings, arguments))
+        process.start()
+        processes.append(process)
+
+    try:
+        for process in processes:
+            process.join()
+
+    #stop the workers if the parent is interrupted, their leases expiring for a later run
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+                process.join()
+
+    failed = [process.exitcode for process in processes if process.exitcode]
+
+    if failed:
+        logger.error('%d workers exited with an error', len(failed))
+
+
+def iterShardRecords(shardDirectory: str) -> Iterator[Dict[str, any]]:
+    """
+    Reads the recipe records of every worker's shard, skipping any line left incomplete by a worker that was killed.
+
+    Args:
+        shardDirectory (str): The directory holding every worker's shard
+
+    Returns:
+        Iterator[Dict[str, any]]: The records of each shard in turn, which may repeat a recipe processed by more than one worker
+    """
+
+    for filename in sorted(glob.glob(os.path.join(shardDirectory, '*.jsonl'))):
+        with open(filename, mode='r', encoding='utf-8') as file:
+            for line in file:
+                if not line.endswith('\n'):
+                    break
+
+                try:
+                    yield json.loads(line)
+                except(ValueError):
+                    logger.warning('Skipping an unreadable line in %s', filename)
+
+
+def mergeShards(shardDirectory: str, filename: str, outputFormat: str | None = None, compression: str | None = None) -> Tuple[int, int]:
+    """
+    Merges every worker's shard into one dataset, keeping the first record of each recipe url.
+
+    Args:
+        shardDirectory (str): The directory holding every worker's shard
+        filename (str): The file to write the merged dataset to
+        outputFormat (str | None): The output format, or None to infer it from the filename
+        compression (str | None): The compression codec, or None to infer it from the filename
+
+    Returns:
+        Tuple[int, int]: The number of recipes written and the number of duplicates discarded
+    """
+
+    seenUrls = set()
+    duplicates = 0
+
+    with openRecipeSink(filename, outputFormat, compression) as sink:
+        for record in iterShardRecords(shardDirectory):
+            url = record[recipeUrlColumn]
+
+            if url in seenUrls:
+                duplicates += 1
+                continue
+
+            seenUrls.add(url)
+            sink.write(url, tuple(record.get(column) for column in recipeDetailsHeader))
+
+    logger.info('Merged %d recipes into %s, discarding %d duplicates', len(seenUrls), filename, duplicates)
+    return len(seenUrls), duplicates
+
+
+def runShardedCrawl(queuePath: str, shardDirectory: str, filename: str, workers: int, startPage: int | None = None, endPage: int | None = None, recipeUrls: Iterable[str] | None = None, pagesPerTask: int = 5, urlsPerTask: int = 50, outputFormat: str | None = None, compression: str | None = None, workerArguments: Dict[str, any] | None = None) -> bool:
+    """
+    Crawls across several local worker processes sharing a queue, merging their shards into one dataset once the crawl is finished.
+
+    The crawl is planned if the queue is new and resumed otherwise, so an interrupted crawl continues where it stopped.
+    Workers on other hosts sharing the filesystem can join the crawl by running runWorker on the same queue.
+
+    Args:
+        queuePath (str): The SQLite file holding the queue
+        shardDirectory (str): The directory to write the workers' shards to
+        filename (str): The file to write the merged dataset to
+        workers (int): The number of local worker processes, or zero to only plan the crawl for workers started elsewhere
+        startPage (int | None): The search page to begin on, or None if only recipe urls are given
+        endPage (int | None): The search page to end on, or None if only recipe urls are given
+        recipeUrls (Iterable[str] | None): Recipe urls to scrape in addition to those discovered
+        pagesPerTask (int): The maximum number of search pages in each task
+        urlsPerTask (int): The maximum number of recipe urls in each task
+        outputFormat (str | None): The format of the merged dataset, or None to infer it from the filename
+        compression (str | None): The compression codec of the merged dataset, or None to infer it from the filename
+        workerArguments (Dict[str, any] | None): Any further keyword arguments of runWorker, such as the concurrency of each worker
+
+    Returns:
+        bool: Whether the crawl finished and was merged
+    """
+
+    queue = WorkQueue(queuePath, (workerArguments or {}).get('leaseSeconds', 120.0))
+
+    try:
+        planCrawl(queue, startPage, endPage, recipeUrls, pagesPerTask, urlsPerTask)
+    finally:
+        queue.close()
+
+    if workers <= 0:
+        return False
+
+    runLocalWorkers(queuePath, shardDirectory, workers, dict(workerArguments or {}, urlsPerTask=urlsPerTask))
+
+    #merge only once every lease is complete, as otherwise recipes would be missing
+    queue = WorkQueue(queuePath)
+
+    try:
+        finished = queue.isFinished()
+        failedItems = queue.getFailedItems()
+    finally:
+        queue.close()
+
+    if not finished:
+        logger.warning('The crawl in %s is unfinished. Run it again to resume it.', queuePath)
+        return False
+
+    if failedItems:
+        logger.warning('%d pages or recipes failed on every attempt', len(failedItems), extra={'failed': len(failedItems)})
+
+    mergeShards(shardDirectory, filename, outputFormat, compression)
+    return True
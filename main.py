@@ -1,7 +1,33 @@
+import argparse
+import logging
 import os
-from typing import Tuple
-from scraping_utils.scraping_functions import getRecipeUrlsFromPages
-from csv_utils.csv_functions import writeRecipeUrlsToCsv, writeRecipeDetailsToCsv
+import sys
+from contextlib import ExitStack
+from typing import Iterable, List, Tuple
+from scraping_utils.scraping_functions import iterRecipeUrlsFromPages, getAvailableCores
+from scraping_utils.frontier_functions import UrlFrontier, iterThroughFrontier
+from scraping_utils.sitemap_functions import iterRecipeUrlsFromSitemap
+from csv_utils.csv_functions import iterRecipeUrlEntriesFromCsv, iterRecipeUrlsFromCsv, writeArchivedRecipeDetailsToFile, writeRecipeUrlsToCsv, writeRecipeDetailsToFile, writeSitemapUrlsToCsv
+from csv_utils.output_functions import compressionCodecs, outputFormats, resolveOutputFormat
+from scraping_utils.http_functions import configureHttpClient
+from scraping_utils.throttle_functions import configureRateLimiter, getRateLimiterState
+from scraping_utils.cache_functions import configureCache
+from scraping_utils.archive_functions import configureArchive
+from csv_utils.journal_functions import getJournalFilename
+from csv_utils.shard_functions import mergeShards, runShardedCrawl, runWorker
+from csv_utils.refresh_functions import refreshRecipeDetails
+from text_utils.ingredient_cache import configureIngredientCache, getIngredientCacheStatistics
+from monitoring_utils.logging_functions import configureLogging, logFormats, logLevels
+from monitoring_utils.metrics_functions import MetricsServer, MetricsSnapshotWriter, getMetrics
+
+logger = logging.getLogger(__name__)
+
+#set the number of bytes of discovered urls held in memory ahead of detail scraping, beyond which they are spilled to disk
+frontierMemoryBudget = 8 * 1024 * 1024
+
+#set the directory fetched pages are cached in between runs, and the file raw ingredient names are cached in
+cacheDirectory = '.page_cache'
+ingredientCacheFilename = '.ingredient_cache.sqlite'
 
 
 def printMenuOptions() -> None:
@@ -70,6 +96,36 @@ def getFilename() -> str:
     return filename
 
 
+def getDetailsFilename() -> Tuple[str, bool]:
+    """
+    Obtain a filename for the program to write recipe details to, and whether an interrupted run writing to it is to be resumed.
+
+    Returns:
+        Tuple[str, bool]: The filename inputted and the resume decision
+    """
+
+    #obtain a filename, offering to resume if a journal of a previous run exists for it
+    while True:
+        print('Enter a filename:')
+        filename = input()
+
+        if (os.path.exists(filename) and os.path.exists(getJournalFilename(filename))):
+            print('A previous run writing to this file was recorded. Do you wish to resume it (y/n)')
+
+            if (getUserDecision()):
+                return filename, True
+
+        #otherwise confirm overwriting an existing file as normal
+        if (os.path.exists(filename)):
+            print('Warning, file already exists and will be overwritten. Do you wish to proceed (y/n)')
+
+            if (getUserDecision()):
+                return filename, False
+
+        else:
+            return filename, False
+
+
 def getPageNumber() -> int:
     """
     Obtain a valid page number for data scraping range.
@@ -123,6 +179,81 @@ def getPageNumbers() -> Tuple[int]:
     return startPage, endPage
 
 
+def getConcurrency() -> int:
+    """
+    Obtain a valid number of pages to request at once.
+
+    Returns:
+        int: The valid concurrency level inputted
+    """
+
+    #obtain the number of pages to request at once
+    print('Enter the number of pages to request at once:')
+    return getPageNumber()
+
+
+def configurePageCache() -> None:
+    """
+    Obtain a decision as to whether fetched pages are cached on disk, and configure the cache accordingly.
+
+    Returns:
+        None
+    """
+
+    #determine if pages are to be cached, and if so whether only cached pages are to be used
+    print(f'Cache fetched pages in {cacheDirectory} for later runs? (y/n)')
+
+    if (getUserDecision()):
+        print('Use only cached pages, without making any requests? (y/n)')
+        configureCache(cacheDirectory, offline=getUserDecision())
+
+
+def writeRecipeDetails(recipeUrls: Iterable[str], filename: str, precise: bool, concurrency: int, resume: bool, processes: int, ingredientBatchSize: int = 0, outputFormat: str | None = None, compression: str | None = None) -> None:
+    """
+    Write the details of the recipes given to a file, caching raw ingredient names and outputting the cache's effectiveness.
+
+    Args:
+        recipeUrls (Iterable[str]): The recipe page urls to scrape details from
+        filename (str): The file to write recipe details to
+        precise (bool): Determines whether additional precision should be used for obtaining ingredient names
+        concurrency (int): The maximum number of recipe pages to request at once
+        resume (bool): Determines whether a previous run writing to the file is resumed
+        processes (int): The number of processes to parse recipe pages in
+        ingredientBatchSize (int): The number of recipes whose raw ingredients are resolved together, or zero to resolve each individually
+        outputFormat (str | None): The output format, or None to infer it from the filename
+        compression (str | None): The compression codec, or None to infer it from the filename
+
+    Returns:
+        None
+    """
+
+    #cache raw ingredient names across runs and worker processes
+    configureIngredientCache(ingredientCacheFilename)
+
+    writeRecipeDetailsToFile(recipeUrls, filename, precise, max(concurrency, processes), resume=resume, processes=processes, ingredientBatchSize=ingredientBatchSize, outputFormat=outputFormat, compression=compression)
+    logger.info('Recipe details successfully written to %s', filename)
+
+    #output how often raw ingredient names were served from the cache, and where the time was spent
+    statistics = getIngredientCacheStatistics()
+    logger.info('Ingredient cache: %d memory hits, %d disk hits, %d misses (%.0f%% hit rate)', statistics['memoryHits'], statistics['diskHits'], statistics['misses'], statistics['hitRate'] * 100)
+    logStageTimings()
+
+
+def logStageTimings() -> None:
+    """
+    Log the total and mean time spent in each stage of scraping so far, and the rate each host was last allowed.
+
+    Returns:
+        None
+    """
+
+    for entry in getMetrics().snapshot()['histograms'].get('scraper_stage_seconds', []):
+        logger.info('Stage %s: %.1fs over %d calls (%.1fms mean)', entry['labels']['stage'], entry['sum'], entry['count'], entry['mean'] * 1000)
+
+    for host, state in getRateLimiterState().items():
+        logger.info('Rate limit for %s: %.1f requests per second, %d in flight', host, state['rate'], state['concurrency'])
+
+
 def main() -> None:
     """
     Define the main program to execute data scraping.
@@ -134,7 +265,8 @@ def main() -> None:
         None
     """
 
-    #output the options and set a flag to determine a valid choice
+    #log progress at the default level, then output the options and set a flag to determine a valid choice
+    configureLogging()
     printMenuOptions()
     validChoice = False
 
@@ -146,26 +278,260 @@ def main() -> None:
         if choice == '1':
             validChoice = True
             startPage, endPage = getPageNumbers()
+            concurrency = getConcurrency()
+            configureHttpClient(poolSize=concurrency)
+            configureRateLimiter(initialConcurrency=max(1, concurrency // 2), maxConcurrency=concurrency)
+            configurePageCache()
             filename = getFilename()
-            writeRecipeUrlsToCsv(startPage, endPage, filename)
-            print(f'Recipe URLs successfully written to {filename}')
+            writeRecipeUrlsToCsv(startPage, endPage, filename, concurrency)
+            logger.info('Recipe URLs successfully written to %s', filename)
         elif choice == '2':
             validChoice = True
             startPage, endPage = getPageNumbers()
-            filename = getFilename()
+            concurrency = getConcurrency()
+            configureHttpClient(poolSize=concurrency)
+            configureRateLimiter(initialConcurrency=max(1, concurrency // 2), maxConcurrency=concurrency)
+            configurePageCache()
+            filename, resume = getDetailsFilename()
 
             #determine if additional precision is to be used for ingredient names
             print('Use additonal precision? This uses NLP more excessively to determine raw ingredient names at the cost of efficiency. (y/n)')
             precise = getUserDecision()
 
-            recipeUrls = getRecipeUrlsFromPages(startPage, endPage)
-            writeRecipeDetailsToCsv(recipeUrls, filename, precise)
-            print(f'Recipe details successfully written to {filename}')
+            #discover urls on a background thread, handing each to the detail scraping as soon as its page is parsed
+            with UrlFrontier(memoryBudget=frontierMemoryBudget) as frontier:
+                recipeUrls = (url for url, _ in iterThroughFrontier(((url, None) for url in iterRecipeUrlsFromPages(startPage, endPage, concurrency)), frontier))
+
+                #parse recipe pages in a process per available core
+                writeRecipeDetails(recipeUrls, filename, precise, concurrency, resume, getAvailableCores())
 
         #otherwise, output an error and re-output the choice selection
         else:
             print(f'Invalid input, received: {choice}')
             printMenuOptions()      
 
-#run the main program
-main()
\ No newline at end of file
+
+def parseArguments(arguments: List[str]) -> argparse.Namespace:
+    """
+    Parse the command line arguments for running the program non-interactively.
+
+    Args:
+        arguments (List[str]): The command line arguments, excluding the program name
+
+    Returns:
+        argparse.Namespace: The parsed arguments, including the subcommand chosen
+    """
+
+    parser = argparse.ArgumentParser(description='Scrape recipe URLs and details from the BBC Good Food website.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    #define the options shared by every subcommand that requests pages
+    client = argparse.ArgumentParser(add_help=False)
+    client.add_argument('--concurrency', type=int, default=8, help='The number of pages to request at once')
+    client.add_argument('--cache', metavar='DIRECTORY', help='Cache fetched pages in the given directory')
+    client.add_argument('--offline', action='store_true', help='Only use pages from the cache, without making any requests')
+    client.add_argument('--archive', metavar='DIRECTORY', help='Append each fetched recipe page to a compressed archive in the given directory, or for reprocess, re-extract every page archived there')
+    client.add_argument('--initial-rate', type=float, default=4.0, help='The number of requests per second sent to a host at first, adapted to how it responds')
+    client.add_argument('--max-rate', type=float, default=20.0, help='The most requests per second sent to a host, shared between the workers of a crawl')
+    client.add_argument('--no-rate-limit', action='store_true', help='Send requests as fast as the concurrency allows, without adapting to the host')
+    client.add_argument('--log-level', choices=logLevels, default='INFO', help='The least severe level of progress and error messages to log')
+    client.add_argument('--log-format', choices=logFormats, default='text', help='Log readable lines, or JSON objects with structured fields')
+    client.add_argument('--metrics-port', type=int, help='Serve metrics on this local port, in the Prometheus format at /metrics and as JSON at /metrics.json')
+    client.add_argument('--metrics-file', help='Periodically write a JSON snapshot of the metrics to this file')
+    client.add_argument('--metrics-interval', type=float, default=30.0, help='The number of seconds between metrics snapshots')
+
+    #define the options shared by every subcommand that writes a file
+    common = argparse.ArgumentParser(add_help=False, parents=[client])
+    common.add_argument('--output', '-o', required=True, help='The file to write to')
+
+    #define the options for discovering recipes, from a range of search pages or the sitemaps
+    pages = argparse.ArgumentParser(add_help=False)
+    pages.add_argument('--source', choices=('search', 'sitemap'), default='search', help='Discover recipes from a range of search pages, or from the recipe sitemaps along with when each was last modified')
+    pages.add_argument('--sitemap', metavar='URL', help='The url of the sitemap index, if not the site\'s own')
+    pages.add_argument('--frontier', metavar='DIRECTORY', help='The directory discovered URLs are spilled to once they exceed the memory budget, a temporary directory by default')
+    pages.add_argument('--frontier-memory', type=float, default=frontierMemoryBudget / 1024 / 1024, metavar='MB', help='The megabytes of discovered URLs held in memory ahead of detail scraping')
+    pages.add_argument('--start', type=int, default=1, help='The search page to begin on')
+    pages.add_argument('--end', type=int, help='The search page to end on')
+
+    #define the options for scraping recipe details
+    extraction = argparse.ArgumentParser(add_help=False)
+    extraction.add_argument('--precise', action='store_true', help='Use the NLP to determine every raw ingredient name')
+    extraction.add_argument('--ingredient-batch-size', type=int, default=0, help='Resolve raw ingredients for this many recipes together')
+
+    #define the options for the format of a recipe details file
+    formats = argparse.ArgumentParser(add_help=False)
+    formats.add_argument('--format', choices=outputFormats, help='The format to write recipe details in, inferred from the output filename if not given')
+    formats.add_argument('--compression', choices=compressionCodecs, help='Compress the output, inferred from the output filename if not given')
+
+    details = argparse.ArgumentParser(add_help=False, parents=[extraction, formats])
+    details.add_argument('--processes', type=int, default=getAvailableCores(), help='The number of processes to parse recipe pages in')
+    details.add_argument('--resume', action='store_true', help='Resume a previous run writing to the output file')
+
+    #define the options for the queue and output shards of a sharded crawl
+    shards = argparse.ArgumentParser(add_help=False)
+    shards.add_argument('--queue', required=True, help='The SQLite file holding the work queue shared by the workers')
+    shards.add_argument('--shards', required=True, metavar='DIRECTORY', help='The directory each worker writes its output shard to')
+    shards.add_argument('--worker-processes', type=int, default=0, help='The number of processes each worker parses recipe pages in')
+    shards.add_argument('--lease-seconds', type=float, default=120.0, help='The number of seconds a lease lasts without a heartbeat before it is returned to the queue')
+
+    subparsers.add_parser('urls', parents=[common, pages], help='Write the recipe URLs from a range of search pages to a CSV file')
+
+    detailsParser = subparsers.add_parser('details', parents=[common, pages, details], help='Write the details of recipes to a CSV, JSON Lines or Parquet file')
+    detailsParser.add_argument('--urls-file', help='Read recipe URLs from a CSV file written by the urls command, rather than a range of search pages')
+
+    reprocessParser = subparsers.add_parser('reprocess', parents=[common, details], help='Re-extract recipe details from cached or archived pages, without making any requests')
+    reprocessParser.add_argument('--urls-file', help='The CSV file of recipe URLs to re-extract from the page cache, as written by the urls command')
+
+    refreshParser = subparsers.add_parser('refresh', parents=[common, pages, extraction], help='Update a SQLite store of recipe details, only extracting recipes that are new or whose page has changed')
+    refreshParser.add_argument('--processes', type=int, default=getAvailableCores(), help='The number of processes to parse recipe pages in')
+    refreshParser.add_argument('--urls-file', help='Read recipe URLs from a CSV file written by the urls command, rather than a range of search pages')
+
+    crawlParser = subparsers.add_parser('crawl', parents=[common, pages, extraction, formats, shards], help='Crawl across several worker processes sharing a queue, merging their output once finished')
+    crawlParser.add_argument('--urls-file', help='Queue the recipe URLs of a CSV file written by the urls command, rather than a range of search pages')
+    crawlParser.add_argument('--workers', type=int, default=getAvailableCores(), help='The number of local worker processes, or zero to only plan the crawl for workers started elsewhere')
+    crawlParser.add_argument('--pages-per-lease', type=int, default=5, help='The number of search pages in each lease')
+    crawlParser.add_argument('--urls-per-lease', type=int, default=50, help='The number of recipe URLs in each lease')
+
+    subparsers.add_parser('worker', parents=[client, extraction, shards], help='Join a crawl planned by the crawl command, such as from another host sharing the filesystem')
+
+    mergeParser = subparsers.add_parser('merge', parents=[formats], help='Merge the output shards of a crawl into one file, removing duplicate recipes')
+    mergeParser.add_argument('--shards', required=True, metavar='DIRECTORY', help='The directory holding the output shards')
+    mergeParser.add_argument('--output', '-o', required=True, help='The file to write to')
+
+    parsed = parser.parse_args(arguments)
+
+    #a page range is needed unless urls are read from a file or the sitemaps
+    if (parsed.command in ('urls', 'details', 'refresh', 'crawl') and not getattr(parsed, 'urls_file', None) and parsed.source == 'search' and parsed.end is None):
+        parser.error('--end is required unless --urls-file or --source sitemap is given')
+
+    #re-extraction reads either the cached pages of a list of urls or a whole archive, which is always written afresh
+    if (parsed.command == 'reprocess' and bool(parsed.urls_file) == bool(parsed.archive)):
+        parser.error('reprocess requires one of --urls-file or --archive')
+
+    if (parsed.command == 'reprocess' and parsed.archive and parsed.resume):
+        parser.error('--resume is not supported when reprocessing an archive')
+
+    if (parsed.command == 'reprocess' and parsed.archive and not os.path.isdir(parsed.archive)):
+        parser.error(f'no archive found at {parsed.archive}')
+
+    #a refresh updates recipes in place, which only the SQLite store supports
+    if (parsed.command == 'refresh' and resolveOutputFormat(parsed.output)[0] != 'sqlite'):
+        parser.error('refresh requires a SQLite output file, such as recipes.sqlite')
+
+    return parsed
+
+
+def runCommand(arguments: argparse.Namespace) -> None:
+    """
+    Run the subcommand chosen on the command line.
+
+    Args:
+        arguments (argparse.Namespace): The parsed command line arguments
+
+    Returns:
+        None
+    """
+
+    #merging makes no requests, so needs none of the client's configuration
+    if (arguments.command == 'merge'):
+        configureLogging()
+        mergeShards(arguments.shards, arguments.output, arguments.format, arguments.compression)
+        return
+
+    #configure logging, the shared client and the page cache
+    configureLogging(arguments.log_level, arguments.log_format)
+    configureHttpClient(poolSize=arguments.concurrency)
+
+    #limit the rate to each host, sharing it between the local workers of a crawl
+    share = max(1, arguments.workers) if arguments.command == 'crawl' else 1
+    configureRateLimiter(not arguments.no_rate_limit, initialRate=arguments.initial_rate / share, maxRate=arguments.max_rate / share, initialConcurrency=max(1, arguments.concurrency // 2), maxConcurrency=arguments.concurrency)
+
+    if (arguments.command == 'reprocess' and arguments.urls_file):
+        #re-extraction must only read cached pages
+        configureCache(arguments.cache or cacheDirectory, offline=True)
+    elif (arguments.cache or arguments.offline):
+        configureCache(arguments.cache or cacheDirectory, offline=arguments.offline)
+
+    #archive every fetched recipe page, unless the archive is the one being re-extracted
+    if (arguments.archive and arguments.command != 'reprocess'):
+        configureArchive(arguments.archive)
+
+    #expose the metrics for the duration of the run, if requested
+    with ExitStack() as stack:
+        if (arguments.metrics_port is not None):
+            server = stack.enter_context(MetricsServer(arguments.metrics_port))
+            logger.info('Serving metrics at %s', server.url)
+
+        if (arguments.metrics_file):
+            stack.enter_context(MetricsSnapshotWriter(arguments.metrics_file, arguments.metrics_interval))
+
+        #re-extract every archived page across the extraction processes, without making any requests
+        if (arguments.command == 'reprocess' and arguments.archive):
+            configureIngredientCache(ingredientCacheFilename)
+            written, failed = writeArchivedRecipeDetailsToFile(arguments.archive, arguments.output, arguments.precise, arguments.processes, arguments.ingredient_batch_size, arguments.format, arguments.compression)
+            logger.info('%d archived recipes written to %s, %d failed', written, arguments.output, failed)
+            logStageTimings()
+            return
+
+        if (arguments.command == 'urls' and arguments.source == 'sitemap'):
+            writeSitemapUrlsToCsv(arguments.output, arguments.sitemap)
+            logger.info('Recipe URLs successfully written to %s', arguments.output)
+            return
+
+        if (arguments.command == 'urls'):
+            writeRecipeUrlsToCsv(arguments.start, arguments.end, arguments.output, arguments.concurrency)
+            logger.info('Recipe URLs successfully written to %s', arguments.output)
+            return
+
+        #run a sharded crawl, or join one as a worker, with the settings shared by each worker
+        if (arguments.command in ('crawl', 'worker')):
+            configureIngredientCache(ingredientCacheFilename)
+            workerArguments = {'precise': arguments.precise, 'concurrency': arguments.concurrency, 'processes': arguments.worker_processes, 'ingredientBatchSize': arguments.ingredient_batch_size, 'leaseSeconds': arguments.lease_seconds}
+
+        if (arguments.command == 'worker'):
+            runWorker(arguments.queue, arguments.shards, **workerArguments)
+            return
+
+        if (arguments.command == 'crawl'):
+            if (arguments.urls_file):
+                recipeUrls = iterRecipeUrlsFromCsv(arguments.urls_file)
+            elif (arguments.source == 'sitemap'):
+                recipeUrls = (url for url, _ in iterRecipeUrlsFromSitemap(arguments.sitemap))
+            else:
+                recipeUrls = None
+
+            startPage, endPage = (arguments.start, arguments.end) if recipeUrls is None else (None, None)
+
+            if (runShardedCrawl(arguments.queue, arguments.shards, arguments.output, arguments.workers, startPage, endPage, recipeUrls, arguments.pages_per_lease, arguments.urls_per_lease, arguments.format, arguments.compression, workerArguments)):
+                logger.info('Recipe details successfully written to %s', arguments.output)
+
+            return
+
+        #read the recipe urls from a file, or discover them from the sitemaps or a range of search pages, along with the lastmod of each if known
+        #discovered urls are held in a frontier, spilling to disk if discovery runs far ahead of detail scraping
+        if (arguments.urls_file):
+            recipeEntries = iterRecipeUrlEntriesFromCsv(arguments.urls_file)
+        else:
+            frontier = stack.enter_context(UrlFrontier(arguments.frontier, int(arguments.frontier_memory * 1024 * 1024)))
+
+            if (arguments.source == 'sitemap'):
+                recipeEntries = iterThroughFrontier(iterRecipeUrlsFromSitemap(arguments.sitemap), frontier)
+            else:
+                recipeEntries = iterThroughFrontier(((url, None) for url in iterRecipeUrlsFromPages(arguments.start, arguments.end, arguments.concurrency)), frontier)
+
+        #refresh the store from the urls, skipping those whose lastmod is unchanged
+        if (arguments.command == 'refresh'):
+            configureIngredientCache(ingredientCacheFilename)
+            refreshRecipeDetails(recipeEntries, arguments.output, arguments.precise, arguments.concurrency, arguments.processes, arguments.ingredient_batch_size)
+            logStageTimings()
+            return
+
+        writeRecipeDetails((url for url, _ in recipeEntries), arguments.output, arguments.precise, arguments.concurrency, arguments.resume, arguments.processes, arguments.ingredient_batch_size, arguments.format, arguments.compression)
+
+
+#run the program from the command line if arguments are given, or the interactive menu otherwise, unless imported by a worker process
+if __name__ == '__main__':
+    if (len(sys.argv) > 1):
+        runCommand(parseArguments(sys.argv[1:]))
+    else:
+        main()
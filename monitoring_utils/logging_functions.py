@@ -0,0 +1,108 @@
+#import the necessary modules
+import json
+import logging
+import sys
+from typing import Dict
+
+#define the log levels that can be chosen, from the most to the least verbose
+logLevels = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
+
+#define the log formats that can be chosen
+logFormats = ('text', 'json')
+
+#find the attributes every log record has, so that the structured fields passed through extra can be told apart
+standardAttributes = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+#hold the settings logging was configured with, so they can be passed to worker processes
+loggingSettings = {'level': 'INFO', 'logFormat': 'text'}
+
+
+def getRecordFields(record: logging.LogRecord) -> Dict[str, any]:
+    """
+    Finds the structured fields attached to a log record through the extra argument, such as a url or status code.
+
+    Args:
+        record (logging.LogRecord): The log record
+
+    Returns:
+        Dict[str, any]: The structured fields, keyed by name
+    """
+
+    return {key: value for key, value in vars(record).items() if key not in standardAttributes}
+
+
+class TextFormatter(logging.Formatter):
+    """
+    Formats log records as readable lines, followed by any structured fields as key=value pairs.
+    """
+
+    def __init__(self) -> None:
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = getRecordFields(record)
+        line = super().format(record)
+
+        return f'{line} ' + ' '.join(f'{key}={value}' for key, value in fields.items()) if fields else line
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats log records as single line JSON objects, with any structured fields as top level keys, for ingestion by a log pipeline.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {'time': self.formatTime(record), 'level': record.levelname, 'logger': record.name, 'message': record.getMessage()}
+        entry.update(getRecordFields(record))
+
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+
+        return json.dumps(entry, default=str)
+
+
+def configureLogging(level: str = 'INFO', logFormat: str = 'text') -> None:
+    """
+    Configures how the scraper's progress and errors are logged, replacing any previous configuration.
+
+    Logs are written to stdout, where the scraper's progress has always been output.
+
+    Args:
+        level (str): The least severe level logged, either 'DEBUG', 'INFO', 'WARNING' or 'ERROR'
+        logFormat (str): The format of each line, either 'text' or 'json'
+
+    Returns:
+        None
+    """
+
+    if level.upper() not in logLevels:
+        raise ValueError(f'Unknown log level {level}, expected one of {", ".join(logLevels)}')
+
+    if logFormat not in logFormats:
+        raise ValueError(f'Unknown log format {logFormat}, expected one of {", ".join(logFormats)}')
+
+    loggingSettings.update(level=level.upper(), logFormat=logFormat)
+
+    #replace the root logger's handlers with a single handler in the chosen format
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if logFormat == 'json' else TextFormatter())
+
+    root = logging.getLogger()
+
+    for existingHandler in list(root.handlers):
+        root.removeHandler(existingHandler)
+
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+
+
+def getLoggingSettings() -> Dict[str, str]:
+    """
+    Obtains a copy of the settings logging was configured with, so that they can be passed to worker processes.
+
+    Returns:
+        Dict[str, str]: The current logging settings
+    """
+
+    return dict(loggingSettings)
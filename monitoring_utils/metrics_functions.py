@@ -0,0 +1,536 @@
+#import the necessary modules
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Tuple
+
+#define the upper bounds of the histogram buckets in seconds, spanning a fast json-ld extraction to a slow retried fetch
+defaultBuckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+#define the help text of each metric recorded by the scraper, shown by the Prometheus endpoint
+metricDescriptions = {
+    'scraper_stage_seconds': 'The seconds spent in each stage of scraping a page (fetch, parse, nlp and write)',
+    'scraper_http_responses_total': 'The http responses received, by status code',
+    'scraper_http_retries_total': 'The requests retried, by the status code or connection error that caused the retry',
+    'scraper_page_cache_requests_total': 'The pages looked up in the page cache, by whether they were served, revalidated or missed',
+    'scraper_ingredient_cache_requests_total': 'The raw ingredient names looked up in the ingredient cache, by tier hit or miss',
+    'scraper_search_pages_total': 'The search pages scraped, by whether they succeeded',
+    'scraper_sitemaps_total': 'The sitemaps read, by whether they succeeded',
+    'scraper_recipes_total': 'The recipe pages scraped, by extraction path or the stage they failed in',
+    'scraper_extraction_failures_total': 'The fields that could not be extracted from a recipe page',
+    'scraper_records_written_total': 'The recipe records written to the output',
+    'scraper_task_errors_total': 'The unexpected errors raised by a concurrent task',
+    'scraper_leases_total': 'The leases of a sharded crawl completed by this worker, by kind of work',
+    'scraper_throttle_events_total': 'The times the rate limiter backed off a host, by host and reason',
+    'scraper_refresh_total': 'The recipes checked by an incremental refresh, by whether they were unchanged, changed, new or failed',
+    'scraper_requests_in_flight': 'The http requests currently awaiting a response',
+    'scraper_host_rate': 'The number of requests per second the rate limiter currently allows to each host',
+    'scraper_host_concurrency': 'The number of requests the rate limiter currently allows in flight to each host',
+    'scraper_recipes_in_flight': 'The recipe pages currently being fetched or extracted',
+    'scraper_extractions_in_flight': 'The recipe pages currently queued for or being extracted in worker processes'
+}
+
+
+def getLabelKey(labels: Dict[str, any] | None) -> Tuple[Tuple[str, str], ...]:
+    """
+    Converts the labels of a metric into a hashable key, independent of their order.
+
+    Args:
+        labels (Dict[str, any] | None): The label names and values, or None for an unlabelled metric
+
+    Returns:
+        Tuple[Tuple[str, str], ...]: The sorted label name and value pairs
+    """
+
+    return tuple(sorted((name, str(value)) for name, value in labels.items())) if labels else ()
+
+
+def formatLabels(labelKey: Tuple[Tuple[str, str], ...], extra: Tuple[str, str] | None = None) -> str:
+    """
+    Formats the labels of a metric as they appear in the Prometheus text format, such as {stage="fetch"}.
+
+    Args:
+        labelKey (Tuple[Tuple[str, str], ...]): The label name and value pairs
+        extra (Tuple[str, str] | None): An additional label to append, such as a histogram bucket's bound
+
+    Returns:
+        str: The formatted labels, or an empty string if there are none
+    """
+
+    pairs = list(labelKey) + ([extra] if extra else [])
+
+    if not pairs:
+        return ''
+
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class MetricsRegistry:
+    """
+    A thread safe store of counters, gauges and histograms, each identified by a name and a set of labels.
+
+    Counters only increase, gauges hold a current value such as the number of requests in flight, and histograms count observations such as stage timings into buckets.
+    Worker processes record into their own registry, whose counters and histograms are drained and merged into the parent's.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = defaultBuckets) -> None:
+        """
+        Creates an empty registry.
+
+        Args:
+            buckets (Tuple[float, ...]): The ascending upper bounds of the histogram buckets
+        """
+
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.startTime = time.time()
+
+
+    def increment(self, name: str, labels: Dict[str, any] | None = None, amount: float = 1) -> None:
+        """
+        Increases a counter.
+
+        Args:
+            name (str): The name of the counter
+            labels (Dict[str, any] | None): The labels of the counter, or None if unlabelled
+            amount (float): The amount to increase the counter by
+
+        Returns:
+            None
+        """
+
+        key = (name, getLabelKey(labels))
+
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+
+    def setGauge(self, name: str, value: float, labels: Dict[str, any] | None = None) -> None:
+        """
+        Sets a gauge to a value.
+
+        Args:
+            name (str): The name of the gauge
+            value (float): The gauge's new value
+            labels (Dict[str, any] | None): The labels of the gauge, or None if unlabelled
+
+        Returns:
+            None
+        """
+
+        with self.lock:
+            self.gauges[(name, getLabelKey(labels))] = value
+
+
+    def adjustGauge(self, name: str, amount: float, labels: Dict[str, any] | None = None) -> None:
+        """
+        Increases or decreases a gauge by an amount.
+
+        Args:
+            name (str): The name of the gauge
+            amount (float): The amount to add, which is negative to decrease the gauge
+            labels (Dict[str, any] | None): The labels of the gauge, or None if unlabelled
+
+        Returns:
+            None
+        """
+
+        key = (name, getLabelKey(labels))
+
+        with self.lock:
+            self.gauges[key] = self.gauges.get(key, 0) + amount
+
+
+    def observe(self, name: str, value: float, labels: Dict[str, any] | None = None) -> None:
+        """
+        Records an observation in a histogram.
+
+        Args:
+            name (str): The name of the histogram
+            value (float): The value observed, such as a duration in seconds
+            labels (Dict[str, any] | None): The labels of the histogram, or None if unlabelled
+
+        Returns:
+            None
+        """
+
+        key = (name, getLabelKey(labels))
+        bucket = bisect.bisect_left(self.buckets, value)
+
+        with self.lock:
+            #hold a count per bucket, with a final bucket for values above every bound, along with the sum and count
+            histogram = self.histograms.get(key)
+
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+
+            histogram[0][bucket] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+
+    @contextmanager
+    def timeStage(self, stage: str) -> Iterator[None]:
+        """
+        Times the enclosed block, recording its duration in the stage timing histogram, even if it raises.
+
+        Args:
+            stage (str): The stage being timed, such as 'fetch', 'parse', 'nlp' or 'write'
+
+        Returns:
+            Iterator[None]: A context manager timing the block
+        """
+
+        startTime = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe('scraper_stage_seconds', time.perf_counter() - startTime, {'stage': stage})
+
+
+    @contextmanager
+    def trackInFlight(self, name: str, labels: Dict[str, any] | None = None) -> Iterator[None]:
+        """
+        Counts the enclosed block in a gauge while it runs.
+
+        Args:
+            name (str): The name of the gauge
+            labels (Dict[str, any] | None): The labels of the gauge, or None if unlabelled
+
+        Returns:
+            Iterator[None]: A context manager tracking the block
+        """
+
+        self.adjustGauge(name, 1, labels)
+
+        try:
+            yield
+        finally:
+            self.adjustGauge(name, -1, labels)
+
+
+    def drain(self) -> Dict[str, List]:
+        """
+        Removes and returns the counters and histograms recorded since the last drain, so that a worker process can pass them to its parent.
+
+        Gauges are left in place, as they describe the worker's current state rather than accumulating.
+
+        Returns:
+            Dict[str, List]: The counters and histograms, in a form that can be pickled and passed to merge
+        """
+
+        with self.lock:
+            state = {'counters': list(self.counters.items()), 'histograms': list(self.histograms.items())}
+            self.counters = {}
+            self.histograms = {}
+
+        return state
+
+
+    def merge(self, state: Dict[str, List]) -> None:
+        """
+        Adds counters and histograms drained from another registry, such as a worker process's, into this one.
+
+        Args:
+            state (Dict[str, List]): The counters and histograms, as returned by drain
+
+        Returns:
+            None
+        """
+
+        with self.lock:
+            for key, value in state['counters']:
+                self.counters[key] = self.counters.get(key, 0) + value
+
+            for key, (bucketCounts, total, count) in state['histograms']:
+                histogram = self.histograms.get(key)
+
+                if histogram is None:
+                    histogram = self.histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+
+                histogram[0] = [current + added for current, added in zip(histogram[0], bucketCounts)]
+                histogram[1] += total
+                histogram[2] += count
+
+
+    def reset(self) -> None:
+        """
+        Discards every metric recorded.
+
+        Returns:
+            None
+        """
+
+        with self.lock:
+            self.counters = {}
+            self.gauges = {}
+            self.histograms = {}
+            self.startTime = time.time()
+
+
+    def snapshot(self) -> Dict[str, any]:
+        """
+        Obtains the current value of every metric as a JSON serialisable dictionary.
+
+        Each histogram is summarised by its count, sum and mean along with its cumulative bucket counts.
+
+        Returns:
+            Dict[str, any]: The timestamp, uptime, counters, gauges and histograms, each metric listing its labelled values
+        """
+
+        with self.lock:
+            counters = list(self.counters.items())
+            gauges = list(self.gauges.items())
+            histograms = [(key, (list(bucketCounts), total, count)) for key, (bucketCounts, total, count) in self.histograms.items()]
+
+        snapshot = {'timestamp': time.time(), 'uptimeSeconds': time.time() - self.startTime, 'counters': {}, 'gauges': {}, 'histograms': {}}
+
+        for kind, entries in (('counters', counters), ('gauges', gauges)):
+            for (name, labelKey), value in sorted(entries):
+                snapshot[kind].setdefault(name, []).append({'labels': dict(labelKey), 'value': value})
+
+        for (name, labelKey), (bucketCounts, total, count) in sorted(histograms):
+            cumulative = [sum(bucketCounts[:index + 1]) for index in range(len(self.buckets))]
+            snapshot['histograms'].setdefault(name, []).append({'labels': dict(labelKey), 'count': count, 'sum': total, 'mean': total / count if count else 0.0, 'buckets': dict(zip(map(str, self.buckets), cumulative))})
+
+        return snapshot
+
+
+    def renderPrometheus(self) -> str:
+        """
+        Formats every metric in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics, one sample per line
+        """
+
+        with self.lock:
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+            histograms = sorted((key, (list(bucketCounts), total, count)) for key, (bucketCounts, total, count) in self.histograms.items())
+
+        lines = []
+        described = set()
+
+        #write the help and type of each metric before its first sample
+        def describe(name: str, kind: str) -> None:
+            if name not in described:
+                described.add(name)
+                lines.append(f'# HELP {name} {metricDescriptions.get(name, name)}')
+                lines.append(f'# TYPE {name} {kind}')
+
+        for (name, labelKey), value in counters:
+            describe(name, 'counter')
+            lines.append(f'{name}{formatLabels(labelKey)} {value}')
+
+        for (name, labelKey), value in gauges:
+            describe(name, 'gauge')
+            lines.append(f'{name}{formatLabels(labelKey)} {value}')
+
+        for (name, labelKey), (bucketCounts, total, count) in histograms:
+            describe(name, 'histogram')
+            cumulative = 0
+
+            for bound, bucketCount in zip(self.buckets, bucketCounts):
+                cumulative += bucketCount
+                lines.append(f'{name}_bucket{formatLabels(labelKey, ("le", str(bound)))} {cumulative}')
+
+            lines.append(f'{name}_bucket{formatLabels(labelKey, ("le", "+Inf"))} {count}')
+            lines.append(f'{name}_sum{formatLabels(labelKey)} {total}')
+            lines.append(f'{name}_count{formatLabels(labelKey)} {count}')
+
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """
+    A http endpoint exposing a registry's metrics, in the Prometheus text format at /metrics and as JSON at /metrics.json.
+    """
+
+    def __init__(self, port: int, host: str = '127.0.0.1', registry: MetricsRegistry | None = None) -> None:
+        """
+        Creates the endpoint, without starting it.
+
+        Args:
+            port (int): The port to serve on, or zero to use any free port
+            host (str): The address to serve on, which is local only by default
+            registry (MetricsRegistry | None): The registry to expose, or None for the scraper's shared registry
+        """
+
+        self.port = port
+        self.host = host
+        self.registry = registry
+        self.server = None
+        self.thread = None
+
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/metrics'
+
+
+    def start(self) -> 'MetricsServer':
+        """
+        Starts serving in a background thread.
+
+        Returns:
+            MetricsServer: This endpoint, so it can be started as it is created
+        """
+
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                currentRegistry = registry or getMetrics()
+
+                if self.path.split('?')[0] == '/metrics':
+                    body, contentType = currentRegistry.renderPrometheus().encode('utf-8'), 'text/plain; version=0.0.4; charset=utf-8'
+                elif self.path.split('?')[0] == '/metrics.json':
+                    body, contentType = json.dumps(currentRegistry.snapshot()).encode('utf-8'), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', contentType)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *arguments: any) -> None:
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+        return self
+
+
+    def stop(self) -> None:
+        """
+        Stops serving and closes the endpoint's socket.
+
+        Returns:
+            None
+        """
+
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+    def __enter__(self) -> 'MetricsServer':
+        return self.start()
+
+
+    def __exit__(self, *exception: any) -> None:
+        self.stop()
+
+
+class MetricsSnapshotWriter:
+    """
+    A background thread periodically writing a JSON snapshot of a registry's metrics to a file, for runs without a metrics scraper.
+
+    Each snapshot atomically replaces the last, and a final snapshot is written when the writer is stopped.
+    """
+
+    def __init__(self, filename: str, interval: float = 30.0, registry: MetricsRegistry | None = None) -> None:
+        """
+        Creates the writer, without starting it.
+
+        Args:
+            filename (str): The file to write snapshots to
+            interval (float): The number of seconds between snapshots
+            registry (MetricsRegistry | None): The registry to snapshot, or None for the scraper's shared registry
+        """
+
+        self.filename = filename
+        self.interval = interval
+        self.registry = registry
+        self.stopEvent = threading.Event()
+        self.thread = None
+
+
+    def write(self) -> None:
+        """
+        Writes a snapshot now, replacing the previous one.
+
+        Returns:
+            None
+        """
+
+        snapshot = (self.registry or getMetrics()).snapshot()
+
+        with open(f'{self.filename}.tmp', mode='w', encoding='utf-8') as file:
+            json.dump(snapshot, file, indent=2)
+
+        os.replace(f'{self.filename}.tmp', self.filename)
+
+
+    def start(self) -> 'MetricsSnapshotWriter':
+        """
+        Starts writing snapshots in a background thread.
+
+        Returns:
+            MetricsSnapshotWriter: This writer, so it can be started as it is created
+        """
+
+        def run() -> None:
+            while not self.stopEvent.wait(self.interval):
+                self.write()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+
+        return self
+
+
+    def stop(self) -> None:
+        """
+        Stops writing snapshots, writing a final one.
+
+        Returns:
+            None
+        """
+
+        if self.thread:
+            self.stopEvent.set()
+            self.thread.join()
+            self.thread = None
+            self.write()
+
+
+    def __enter__(self) -> 'MetricsSnapshotWriter':
+        return self.start()
+
+
+    def __exit__(self, *exception: any) -> None:
+        self.stop()
+
+
+#hold the registry shared by every part of the scraper in this process
+metrics = MetricsRegistry()
+
+
+def getMetrics() -> MetricsRegistry:
+    """
+    Obtains the registry shared by every part of the scraper in this process.
+
+    Returns:
+        MetricsRegistry: The shared registry
+    """
+
+    return metrics
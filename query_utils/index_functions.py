@@ -0,0 +1,477 @@
+#import the necessary modules
+import base64
+import json
+import logging
+import os
+import re
+import zlib
+from typing import Iterable, List, Set, Tuple
+from csv_utils.output_functions import resolveOutputFormat
+from csv_utils.reader_functions import iterRecipeDetails
+from text_utils.ingredient_cache import normaliseIngredientText
+
+logger = logging.getLogger(__name__)
+
+#define the version of the saved index format
+indexFormatVersion = 1
+
+
+def normaliseIngredientName(name: str) -> str:
+    """
+    Normalises a raw ingredient name so that differently cased or spaced names share an entry in the index.
+
+    Args:
+        name (str): The raw ingredient name
+
+    Returns:
+        str: The normalised name
+    """
+
+    return normaliseIngredientText(name).lower()
+
+
+def iterSetBits(bitset: int) -> Iterable[int]:
+    """
+    Finds the positions of the set bits of a bitset, in ascending order.
+
+    Args:
+        bitset (int): The bitset
+
+    Returns:
+        Iterable[int]: The position of each set bit
+    """
+
+    #read the binary digits from least to most significant, locating each set bit with a string search
+    digits = bin(bitset)[:1:-1]
+    position = digits.find('1')
+
+    while position != -1:
+        yield position
+        position = digits.find('1', position + 1)
+
+
+def setBit(bits: bytearray, position: int, value: bool) -> None:
+    """
+    Sets or clears a bit of a mutable bitset, growing it if needed.
+
+    Args:
+        bits (bytearray): The bitset, in little endian byte order
+        position (int): The position of the bit
+        value (bool): Determines whether the bit is set rather than cleared
+
+    Returns:
+        None
+    """
+
+    byte, offset = divmod(position, 8)
+
+    if byte >= len(bits):
+        if not value:
+            return
+        bits.extend(bytes(byte - len(bits) + 1))
+
+    if value:
+        bits[byte] |= 1 << offset
+    else:
+        bits[byte] &= ~(1 << offset) & 0xFF
+
+
+class IngredientIndex:
+    """
+    An inverted index from raw ingredient names to the recipes using them, for answering "what can I cook" queries.
+
+    Ingredient names are interned to integer ids, and each recipe is given a document id.
+    The recipes using each ingredient are held as a bitset with bit n set for document n, so queries combine with bitwise operations.
+    Bitsets are stored as mutable bytearrays so that adding a recipe costs the same however many are indexed, and converted to Python ints (cached until next changed) when queried.
+    """
+
+    def __init__(self) -> None:
+        """
+        Creates an empty index.
+        """
+
+        #hold the url of each document and the document id of each url, along with the documents currently indexed
+        self.urls = []
+        self.documentIds = {}
+        self.alive = bytearray()
+
+        #hold each interned ingredient name, the id of each name, and the bitset of the documents using each ingredient
+        self.names = []
+        self.ingredientIds = {}
+        self.postings = []
+        self.bitsets = {}
+
+        #hold the ingredient ids of each document, so that a re-scraped recipe's old entries can be cleared
+        self.documentIngredients = []
+
+        #hold the ids of the ingredients whose names contain each word, for matching broader query terms
+        self.wordIngredients = {}
+
+
+    def __len__(self) -> int:
+        return self.aliveBitset().bit_count()
+
+
+    def aliveBitset(self) -> int:
+        """
+        Finds the bitset of the recipes currently indexed.
+
+        Returns:
+            int: The bitset of the indexed recipes
+        """
+
+        return int.from_bytes(self.alive, 'little')
+
+
+    def ingredientBitset(self, ingredientId: int) -> int:
+        """
+        Finds the bitset of the recipes using an ingredient, converting it from its stored form only if it has changed.
+
+        Args:
+            ingredientId (int): The ingredient's id
+
+        Returns:
+            int: The bitset of the recipes using the ingredient
+        """
+
+        if ingredientId not in self.bitsets:
+            self.bitsets[ingredientId] = int.from_bytes(self.postings[ingredientId], 'little')
+
+        return self.bitsets[ingredientId]
+
+
+    def internIngredient(self, name: str) -> int:
+        """
+        Finds the id of an ingredient name, assigning a new id if it has not been seen.
+
+        Args:
+            name (str): The normalised ingredient name
+
+        Returns:
+            int: The ingredient's id
+        """
+
+        if name not in self.ingredientIds:
+            ingredientId = len(self.names)
+            self.ingredientIds[name] = ingredientId
+            self.names.append(name)
+            self.postings.append(bytearray())
+
+            for word in re.findall(r'\w+', name):
+                self.wordIngredients.setdefault(word, set()).add(ingredientId)
+
+        return self.ingredientIds[name]
+
+
+    def addRecipe(self, url: str, rawIngredients: Iterable[str] | None) -> None:
+        """
+        Indexes the raw ingredients of a recipe, replacing any ingredients indexed for it previously.
+
+        Args:
+            url (str): The url identifying the recipe
+            rawIngredients (Iterable[str] | None): The raw ingredient names of the recipe, as found by obtainIngredients
+
+        Returns:
+            None
+        """
+
+        #reuse the recipe's document id, clearing its bit from each ingredient it previously used
+        if url in self.documentIds:
+            documentId = self.documentIds[url]
+
+            for ingredientId in self.documentIngredients[documentId]:
+                setBit(self.postings[ingredientId], documentId, False)
+                self.bitsets.pop(ingredientId, None)
+        else:
+            documentId = len(self.urls)
+            self.documentIds[url] = documentId
+            self.urls.append(url)
+            self.documentIngredients.append(())
+
+        #set the recipe's bit in the bitset of each of its ingredients
+        ingredientIds = tuple(sorted(set(self.internIngredient(normaliseIngredientName(name)) for name in rawIngredients or [] if name and name.strip())))
+
+        for ingredientId in ingredientIds:
+            setBit(self.postings[ingredientId], documentId, True)
+            self.bitsets.pop(ingredientId, None)
+
+        self.documentIngredients[documentId] = ingredientIds
+        setBit(self.alive, documentId, True)
+
+
+    def addRecipeDetails(self, recipes: Iterable[Tuple[str, Tuple[any] | None]]) -> int:
+        """
+        Indexes the raw ingredients of many recipes, such as those yielded by getRecipeDetailsMany.
+
+        Args:
+            recipes (Iterable[Tuple[str, Tuple[any] | None]]): The pairs of each recipe url and its details, skipping any without details
+
+        Returns:
+            int: The number of recipes indexed
+        """
+
+        indexed = 0
+
+        for url, details in recipes:
+            if details:
+                self.addRecipe(url, details[2])
+                indexed += 1
+
+        return indexed
+
+
+    def addRecipesFromFile(self, filename: str) -> int:
+        """
+        Indexes the raw ingredients of the recipes in a recipe details file.
+
+        Recipes in csv files written by writeRecipeDetailsToCsv are identified by title, as these files have no url column, and so are removed by title with removeRecipe.
+        As a recipe replaces any indexed with the same title, each title repeated within a csv file is logged as a collision, only the last recipe with that title remaining indexed.
+
+        Args:
+            filename (str): The csv, JSON Lines, Parquet or SQLite file of recipe details
+
+        Returns:
+            int: The number of recipes indexed, not counting those replaced by a later recipe with the same title
+        """
+
+        keyColumn = 'Title' if resolveOutputFormat(filename)[0] == 'csv' else 'Recipe URL'
+        keys = set()
+        indexed = 0
+        collisions = 0
+
+        for record in iterRecipeDetails(filename, columns=[keyColumn, 'Raw Ingredients']):
+            key = record[keyColumn]
+
+            #warn of recipes sharing a title, as only the last of them remains indexed
+            if keyColumn == 'Title' and key in keys:
+                collisions += 1
+                logger.warning('Recipe title %r appears more than once in %s, replacing the recipe indexed before it', key, filename, extra={'title': key})
+
+            keys.add(key)
+            self.addRecipe(key, record['Raw Ingredients'])
+            indexed += 1
+
+        if (collisions):
+            logger.warning('%d recipes in %s replaced another with the same title, add a url column to index every recipe', collisions, filename, extra={'collisions': collisions})
+
+        return indexed - collisions
+
+
+    def removeRecipe(self, url: str) -> None:
+        """
+        Removes a recipe from the index, if it is indexed.
+
+        Args:
+            url (str): The url identifying the recipe
+
+        Returns:
+            None
+        """
+
+        if url in self.documentIds:
+            self.addRecipe(url, [])
+            setBit(self.alive, self.documentIds[url], False)
+
+
+    def matchIngredients(self, term: str, exact: bool = False) -> Set[int]:
+        """
+        Finds the ingredients matching a query term.
+
+        Unless matching exactly, a term matches every ingredient whose name contains all of its words, so 'chicken' matches 'chicken thighs'.
+
+        Args:
+            term (str): The ingredient name or words to match
+            exact (bool): Determines whether only the ingredient with exactly this name matches
+
+        Returns:
+            Set[int]: The ids of the matching ingredients
+        """
+
+        name = normaliseIngredientName(term)
+
+        if exact:
+            return {self.ingredientIds[name]} if name in self.ingredientIds else set()
+
+        #intersect the ingredients containing each word of the term
+        matches = None
+
+        for word in re.findall(r'\w+', name):
+            ingredientIds = self.wordIngredients.get(word, set())
+            matches = set(ingredientIds) if matches is None else matches & ingredientIds
+
+        return matches or set()
+
+
+    def termBitset(self, term: str, exact: bool = False) -> int:
+        """
+        Finds the bitset of the recipes using any ingredient matching a query term.
+
+        Args:
+            term (str): The ingredient name or words to match
+            exact (bool): Determines whether only the ingredient with exactly this name matches
+
+        Returns:
+            int: The bitset of the matching recipes
+        """
+
+        bitset = 0
+
+        for ingredientId in self.matchIngredients(term, exact):
+            bitset |= self.ingredientBitset(ingredientId)
+
+        return bitset
+
+
+    def queryBitset(self, allOf: Iterable[str] = (), anyOf: Iterable[str] = (), noneOf: Iterable[str] = (), exact: bool = False) -> int:
+        """
+        Finds the bitset of the recipes satisfying a boolean ingredient query.
+
+        Args:
+            allOf (Iterable[str]): The terms every recipe must use an ingredient matching (AND)
+            anyOf (Iterable[str]): The terms of which each recipe must use at least one, if any are given (OR)
+            noneOf (Iterable[str]): The terms no recipe may use an ingredient matching (NOT)
+            exact (bool): Determines whether terms only match ingredients with exactly their name
+
+        Returns:
+            int: The bitset of the matching recipes
+        """
+
+        bitset = self.aliveBitset()
+
+        for term in allOf:
+            bitset &= self.termBitset(term, exact)
+
+        anyOf = list(anyOf)
+
+        if anyOf:
+            anyBitset = 0
+
+            for term in anyOf:
+                anyBitset |= self.termBitset(term, exact)
+
+            bitset &= anyBitset
+
+        for term in noneOf:
+            bitset &= ~self.termBitset(term, exact)
+
+        return bitset
+
+
+    def query(self, allOf: Iterable[str] = (), anyOf: Iterable[str] = (), noneOf: Iterable[str] = (), exact: bool = False) -> List[str]:
+        """
+        Finds the recipes satisfying a boolean ingredient query, such as those using chicken and lemon but not cream.
+
+        Args:
+            allOf (Iterable[str]): The terms every recipe must use an ingredient matching (AND)
+            anyOf (Iterable[str]): The terms of which each recipe must use at least one, if any are given (OR)
+            noneOf (Iterable[str]): The terms no recipe may use an ingredient matching (NOT)
+            exact (bool): Determines whether terms only match ingredients with exactly their name
+
+        Returns:
+            List[str]: The urls of the matching recipes, in the order they were indexed
+        """
+
+        return [self.urls[documentId] for documentId in iterSetBits(self.queryBitset(allOf, anyOf, noneOf, exact))]
+
+
+    def makeableFrom(self, pantry: Iterable[str], exact: bool = False) -> List[str]:
+        """
+        Finds the recipes whose ingredients are all in a pantry.
+
+        A recipe is excluded if it uses any ingredient outside the pantry, so the union of the bitsets of those ingredients is removed from the indexed recipes.
+        Recipes with no indexed ingredients are not returned.
+
+        Args:
+            pantry (Iterable[str]): The ingredients available, each matching ingredients as for query terms
+            exact (bool): Determines whether pantry items only match ingredients with exactly their name
+
+        Returns:
+            List[str]: The urls of the recipes that can be made, in the order they were indexed
+        """
+
+        #find the ingredients covered by the pantry
+        available = set()
+
+        for item in pantry:
+            available |= self.matchIngredients(item, exact)
+
+        #remove every recipe using an ingredient that is not available, along with those using none that are
+        excluded = 0
+        used = 0
+
+        for ingredientId in range(len(self.names)):
+            if ingredientId in available:
+                used |= self.ingredientBitset(ingredientId)
+            else:
+                excluded |= self.ingredientBitset(ingredientId)
+
+        return [self.urls[documentId] for documentId in iterSetBits(self.aliveBitset() & used & ~excluded)]
+
+
+    def save(self, path: str) -> None:
+        """
+        Saves the index to a file, replacing the file atomically so a crash never leaves a partial index.
+
+        Args:
+            path (str): The file to save the index to
+
+        Returns:
+            None
+        """
+
+        #store each bitset as its bytes, relying on compression to shrink the sparse bitsets
+        encode = lambda bits: base64.b64encode(bytes(bits)).decode('ascii')
+        data = {
+            'version': indexFormatVersion,
+            'urls': self.urls,
+            'alive': encode(self.alive),
+            'names': self.names,
+            'postings': [encode(bits) for bits in self.postings]
+        }
+
+        temporaryPath = f'{path}.tmp'
+
+        with open(temporaryPath, mode='wb') as file:
+            file.write(zlib.compress(json.dumps(data).encode('utf-8')))
+
+        os.replace(temporaryPath, path)
+
+
+    @classmethod
+    def load(cls, path: str) -> 'IngredientIndex':
+        """
+        Loads an index saved by save, so that it can be queried or updated with newly scraped recipes.
+
+        Args:
+            path (str): The file the index was saved to
+
+        Returns:
+            IngredientIndex: The loaded index
+        """
+
+        with open(path, mode='rb') as file:
+            data = json.loads(zlib.decompress(file.read()).decode('utf-8'))
+
+        if data.get('version') != indexFormatVersion:
+            raise ValueError(f'Unsupported ingredient index version {data.get("version")}')
+
+        index = cls()
+        index.urls = data['urls']
+        index.documentIds = {url: documentId for documentId, url in enumerate(index.urls)}
+        index.alive = bytearray(base64.b64decode(data['alive']))
+
+        for name in data['names']:
+            index.internIngredient(name)
+
+        #restore each bitset, rebuilding the ingredients of each document from them
+        documentIngredients = [[] for _ in index.urls]
+
+        for ingredientId, encoded in enumerate(data['postings']):
+            index.postings[ingredientId] = bytearray(base64.b64decode(encoded))
+
+            for documentId in iterSetBits(index.ingredientBitset(ingredientId)):
+                documentIngredients[documentId].append(ingredientId)
+
+        index.documentIngredients = [tuple(ingredientIds) for ingredientIds in documentIngredients]
+
+        return index
@@ -0,0 +1,348 @@
+#import the necessary modules
+import operator
+from typing import Callable, Dict, Iterable, List, Tuple
+import numpy as np
+from csv_utils.output_functions import resolveOutputFormat
+from csv_utils.reader_functions import iterRecipeDetailBatches
+
+#define the numeric columns held as arrays, with missing values held as NaN
+numericColumns = ('Prep Time', 'Cook Time', 'Rating', 'Ratings Count', 'Calories', 'Fat', 'Saturates', 'Carbs', 'Sugars', 'Fibre', 'Protein', 'Salt')
+
+#define the columns dictionary encoded as integer codes into their distinct values, with missing values held as -1
+categoricalColumns = ('Author', 'Difficulty Level')
+
+#define the columns held as plain lists, only used to describe the recipes found
+labelColumns = ('Recipe URL', 'Title')
+
+#define the comparison operators that filters can use, each evaluated over a whole column at once
+comparisonOperators = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge
+}
+
+#define the aggregations available, each ignoring missing values
+aggregations = {
+    'count': lambda values: int(np.count_nonzero(~np.isnan(values))),
+    'sum': lambda values: float(np.nansum(values)),
+    'mean': lambda values: float(np.nanmean(values)) if np.any(~np.isnan(values)) else None,
+    'min': lambda values: float(np.nanmin(values)) if np.any(~np.isnan(values)) else None,
+    'max': lambda values: float(np.nanmax(values)) if np.any(~np.isnan(values)) else None,
+    'median': lambda values: float(np.nanmedian(values)) if np.any(~np.isnan(values)) else None
+}
+
+
+class RecipeTable:
+    """
+    An in-memory columnar table of recipes, with filters, sorts and aggregations evaluated over whole columns with NumPy.
+
+    The times, rating, ratings count and nutrients are held as float arrays, and the author and difficulty level as integer codes.
+    Tables are immutable, with filtering producing a new table over the selected rows.
+    """
+
+    def __init__(self, numeric: Dict[str, np.ndarray], codes: Dict[str, np.ndarray], categories: Dict[str, List[str]], labels: Dict[str, List[str]]) -> None:
+        """
+        Creates a table from its columns. Use fromRecords or fromFile to build a table from recipe details.
+
+        Args:
+            numeric (Dict[str, np.ndarray]): The array of each numeric column
+            codes (Dict[str, np.ndarray]): The array of codes of each categorical column
+            categories (Dict[str, List[str]]): The distinct values of each categorical column, indexed by code
+            labels (Dict[str, List[str]]): The values of each label column
+        """
+
+        self.numeric = numeric
+        self.codes = codes
+        self.categories = categories
+        self.labels = labels
+
+
+    @classmethod
+    def fromRecords(cls, batches: Iterable[List[Dict[str, any]]]) -> 'RecipeTable':
+        """
+        Builds a table from batches of typed recipe records, such as those from iterRecipeDetailBatches.
+
+        Args:
+            batches (Iterable[List[Dict[str, any]]]): The batches of records, each keyed by column name
+
+        Returns:
+            RecipeTable: The table of every record
+        """
+
+        #gather each column a batch at a time, converting numeric batches straight to arrays
+        numericChunks = {column: [] for column in numericColumns}
+        categoryIndexes = {column: {} for column in categoricalColumns}
+        codeChunks = {column: [] for column in categoricalColumns}
+        labels = {column: [] for column in labelColumns}
+
+        for batch in batches:
+            for column in numericColumns:
+                numericChunks[column].append(np.array([record.get(column) for record in batch], dtype=np.float64))
+
+            #encode each categorical value as the index of its first appearance
+            for column in categoricalColumns:
+                index = categoryIndexes[column]
+                codeChunks[column].append(np.array([-1 if record.get(column) is None else index.setdefault(record[column], len(index)) for record in batch], dtype=np.int32))
+
+            for column in labelColumns:
+                labels[column].extend(record.get(column) for record in batch)
+
+        numeric = {column: np.concatenate(chunks) if chunks else np.empty(0, dtype=np.float64) for column, chunks in numericChunks.items()}
+        codes = {column: np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int32) for column, chunks in codeChunks.items()}
+        categories = {column: list(index) for column, index in categoryIndexes.items()}
+
+        return cls(numeric, codes, categories, labels)
+
+
+    @classmethod
+    def fromFile(cls, filename: str, batchSize: int = 10000) -> 'RecipeTable':
+        """
+        Builds a table from a recipe details file, such as the csv output of writeRecipeDetailsToCsv, reading only the columns held.
+
+        Args:
+            filename (str): The csv, JSON Lines or Parquet file of recipe details
+            batchSize (int): The number of records converted to arrays at once
+
+        Returns:
+            RecipeTable: The table of every recipe in the file
+        """
+
+        #csv files written by writeRecipeDetailsToCsv have no url column, so only project the columns the file has
+        columns = list(numericColumns + categoricalColumns) + ['Title']
+
+        if resolveOutputFormat(filename)[0] != 'csv':
+            columns.append('Recipe URL')
+
+        return cls.fromRecords(iterRecipeDetailBatches(filename, batchSize, columns=columns))
+
+
+    def __len__(self) -> int:
+        return len(self.labels['Title'])
+
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        """
+        Obtains the array of a numeric column, or the decoded values of a categorical column.
+
+        Args:
+            column (str): The column name
+
+        Returns:
+            np.ndarray: The column's values
+        """
+
+        if column in self.numeric:
+            return self.numeric[column]
+
+        if column in self.codes:
+            values = np.array(self.categories[column] + [None], dtype=object)
+            return values[self.codes[column]]
+
+        raise KeyError(f'Unknown column {column}')
+
+
+    def mask(self, filters: List[Tuple[str, str, any]]) -> np.ndarray:
+        """
+        Finds the rows satisfying every filter as a boolean mask.
+
+        Filters take the same form as for iterRecipeDetails, such as ('Calories', '<', 500), and may also use 'between' with a pair of bounds.
+        Categorical columns support '==', '!=' and 'in'. A missing value satisfies no filter other than '!='.
+
+        Args:
+            filters (List[Tuple[str, str, any]]): The filters each row must satisfy
+
+        Returns:
+            np.ndarray: The mask of the rows satisfying every filter
+        """
+
+        mask = np.ones(len(self), dtype=bool)
+
+        for column, operatorName, value in filters:
+            if column in self.numeric:
+                values = self.numeric[column]
+
+                if operatorName in comparisonOperators:
+                    columnMask = comparisonOperators[operatorName](values, value)
+                elif operatorName == 'between':
+                    columnMask = (values >= value[0]) & (values <= value[1])
+                elif operatorName == 'in':
+                    columnMask = np.isin(values, list(value))
+                else:
+                    raise ValueError(f'Unsupported filter {operatorName} on column {column}')
+
+            elif column in self.codes:
+                #compare the codes of the matching categories rather than the values themselves
+                options = [value] if operatorName in ('==', '!=') else list(value)
+                index = {category: code for code, category in enumerate(self.categories[column])}
+                columnMask = np.isin(self.codes[column], [index[option] for option in options if option in index])
+
+                if operatorName == '!=':
+                    columnMask = ~columnMask
+                elif operatorName not in ('==', 'in'):
+                    raise ValueError(f'Unsupported filter {operatorName} on column {column}')
+
+            else:
+                raise ValueError(f'Unknown column {column}')
+
+            mask &= columnMask
+
+        return mask
+
+
+    def take(self, rows: np.ndarray) -> 'RecipeTable':
+        """
+        Creates a table of the given rows.
+
+        Args:
+            rows (np.ndarray): The boolean mask or indices of the rows to keep
+
+        Returns:
+            RecipeTable: The table of the selected rows, sharing this table's categories
+        """
+
+        indices = np.flatnonzero(rows) if rows.dtype == bool else rows
+        numeric = {column: values[indices] for column, values in self.numeric.items()}
+        codes = {column: values[indices] for column, values in self.codes.items()}
+        labels = {column: [values[index] for index in indices] if values else [] for column, values in self.labels.items()}
+
+        return RecipeTable(numeric, codes, self.categories, labels)
+
+
+    def filter(self, filters: List[Tuple[str, str, any]]) -> 'RecipeTable':
+        """
+        Creates a table of the rows satisfying every filter.
+
+        Args:
+            filters (List[Tuple[str, str, any]]): The filters each row must satisfy, as for mask
+
+        Returns:
+            RecipeTable: The table of the rows found
+        """
+
+        return self.take(self.mask(filters))
+
+
+    def records(self, indices: Iterable[int], columns: Iterable[str] | None = None) -> List[Dict[str, any]]:
+        """
+        Obtains the given rows as records.
+
+        Args:
+            indices (Iterable[int]): The indices of the rows
+            columns (Iterable[str] | None): The columns to include, or None to include every column
+
+        Returns:
+            List[Dict[str, any]]: The record of each row, keyed by column name, with missing values as None
+        """
+
+        columns = list(columns) if columns is not None else [column for column in labelColumns if self.labels[column]] + list(numericColumns + categoricalColumns)
+        records = []
+
+        for index in indices:
+            record = {}
+
+            for column in columns:
+                if column in self.numeric:
+                    value = self.numeric[column][index]
+                    record[column] = None if np.isnan(value) else float(value)
+                elif column in self.codes:
+                    code = self.codes[column][index]
+                    record[column] = self.categories[column][code] if code >= 0 else None
+                else:
+                    record[column] = self.labels[column][index] if self.labels[column] else None
+
+            records.append(record)
+
+        return records
+
+
+    def topK(self, key: str | Callable[['RecipeTable'], np.ndarray], k: int, filters: List[Tuple[str, str, any]] | None = None, descending: bool = True, columns: Iterable[str] | None = None) -> List[Dict[str, any]]:
+        """
+        Finds the k rows with the highest (or lowest) value of a column or derived score, skipping rows whose value is missing.
+
+        Scores derived from several columns are given as a function of the table, such as lambda table: table['Protein'] / table['Calories'].
+        Only the k best rows are sorted, so the cost grows with the table size rather than with its size times its logarithm.
+
+        Args:
+            key (str | Callable[[RecipeTable], np.ndarray]): The numeric column to rank by, or a function giving the score of each row
+            k (int): The number of rows to find
+            filters (List[Tuple[str, str, any]] | None): The filters each row must satisfy, or None to consider every row
+            descending (bool): Determines whether the highest values are found rather than the lowest
+            columns (Iterable[str] | None): The columns to include in each record, or None to include every column
+
+        Returns:
+            List[Dict[str, any]]: The record of each row found, in rank order, with its value under 'Score'
+        """
+
+        scores = np.asarray(self.numeric[key] if isinstance(key, str) else key(self), dtype=np.float64)
+
+        #exclude rows failing the filters or whose score is missing or infinite
+        mask = np.isfinite(scores)
+
+        if filters:
+            mask &= self.mask(filters)
+
+        candidates = np.flatnonzero(mask)
+        ranked = -scores[candidates] if descending else scores[candidates]
+
+        #partition out the k best candidates, then sort only those
+        if k < len(candidates):
+            best = np.argpartition(ranked, k)[:k]
+            candidates, ranked = candidates[best], ranked[best]
+
+        order = candidates[np.argsort(ranked, kind='stable')][:max(0, k)]
+        records = self.records(order, columns)
+
+        for record, index in zip(records, order):
+            record['Score'] = float(scores[index])
+
+        return records
+
+
+    def aggregate(self, columns: Iterable[str], functions: Iterable[str] = ('count', 'mean', 'min', 'max'), filters: List[Tuple[str, str, any]] | None = None, groupBy: str | None = None) -> Dict[any, Dict[str, Dict[str, any]]] | Dict[str, Dict[str, any]]:
+        """
+        Summarises numeric columns over the rows satisfying every filter, optionally grouped by a categorical column.
+
+        Args:
+            columns (Iterable[str]): The numeric columns to summarise
+            functions (Iterable[str]): The aggregations to apply, any of 'count', 'sum', 'mean', 'min', 'max' and 'median'
+            filters (List[Tuple[str, str, any]] | None): The filters each row must satisfy, or None to consider every row
+            groupBy (str | None): The categorical column to group the rows by, or None to summarise all rows together
+
+        Returns:
+            Dict[any, Dict[str, Dict[str, any]]] | Dict[str, Dict[str, any]]: The value of each aggregation of each column, keyed by group if grouped
+        """
+
+        columns, functions = list(columns), list(functions)
+
+        for function in functions:
+            if function not in aggregations:
+                raise ValueError(f'Unknown aggregation {function}, expected one of {", ".join(aggregations)}')
+
+        mask = self.mask(filters) if filters else np.ones(len(self), dtype=bool)
+
+        if groupBy is None:
+            return {column: {function: aggregations[function](self.numeric[column][mask]) for function in functions} for column in columns}
+
+        if groupBy not in self.codes:
+            raise ValueError(f'Can only group by a categorical column, one of {", ".join(categoricalColumns)}')
+
+        #sort the selected rows by group so each group's values are a contiguous slice
+        codes = self.codes[groupBy][mask]
+        order = np.argsort(codes, kind='stable')
+        sortedCodes = codes[order]
+        groupCodes, starts = np.unique(sortedCodes, return_index=True)
+        ends = np.append(starts[1:], len(sortedCodes))
+
+        results = {}
+
+        for column in columns:
+            values = self.numeric[column][mask][order]
+
+            for code, start, end in zip(groupCodes, starts, ends):
+                group = self.categories[groupBy][code] if code >= 0 else None
+                results.setdefault(group, {})[column] = {function: aggregations[function](values[start:end]) for function in functions}
+
+        return results
@@ -0,0 +1,363 @@
+#import the necessary modules
+import gzip
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Iterator, NamedTuple, Tuple
+from monitoring_utils.metrics_functions import getMetrics
+
+logger = logging.getLogger(__name__)
+
+#set the size a shard may grow to before a new one is started, and the compression level of each record
+defaultShardBytes = 256 * 1024 * 1024
+defaultCompressionLevel = 6
+
+
+class ArchiveRecord(NamedTuple):
+    """
+    The location of an archived page within its shard.
+
+    Attributes:
+        url (str): The url of the page
+        path (str): The path of the shard holding the record
+        offset (int): The byte offset of the record's gzip member within the shard
+        length (int): The compressed length of the record
+    """
+
+    url: str
+    path: str
+    offset: int
+    length: int
+
+
+def formatRecord(url: str, body: bytes, digest: str) -> bytes:
+    """
+    Formats a page as a WARC resource record.
+
+    Args:
+        url (str): The url of the page
+        body (bytes): The utf-8 encoded html content of the page
+        digest (str): The sha256 hash of the content
+
+    Returns:
+        bytes: The uncompressed record, headers followed by the content
+    """
+
+    headers = [
+        'WARC/1.1',
+        'WARC-Type: resource',
+        f'WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>',
+        f'WARC-Target-URI: {url}',
+        f'WARC-Date: {datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")}',
+        f'WARC-Block-Digest: sha256:{digest}',
+        'Content-Type: text/html; charset=utf-8',
+        f'Content-Length: {len(body)}'
+    ]
+
+    return '\r\n'.join(headers).encode('utf-8') + b'\r\n\r\n' + body + b'\r\n\r\n'
+
+
+def readArchivedPage(path: str, offset: int, length: int) -> Tuple[str, bytes]:
+    """
+    Reads a single page from an archive shard, decompressing only its own record.
+
+    Args:
+        path (str): The path of the shard
+        offset (int): The byte offset of the record within the shard
+        length (int): The compressed length of the record
+
+    Returns:
+        Tuple[str, bytes]: The url of the page and its utf-8 encoded html content
+    """
+
+    with open(path, mode='rb') as file:
+        file.seek(offset)
+        record = gzip.decompress(file.read(length))
+
+    #read the url and content length from the headers, as the content may itself contain blank lines
+    headerEnd = record.index(b'\r\n\r\n')
+    headers = dict(line.split(': ', 1) for line in record[:headerEnd].decode('utf-8').split('\r\n')[1:])
+    bodyStart = headerEnd + 4
+
+    return headers['WARC-Target-URI'], record[bodyStart:bodyStart + int(headers['Content-Length'])]
+
+
+class PageArchive:
+    """
+    An append-only archive of fetched pages, stored as compressed WARC-like shards alongside an index of where each record lies.
+
+    Each record is compressed as its own gzip member, so a shard can be read as a whole by standard WARC tools, and any record can be read on its own by seeking to its offset.
+    A page is only appended when its content differs from the latest record of its url, so re-fetching an unchanged page costs nothing.
+    Each process sharing the directory appends to a shard of its own, claimed through the index, while the threads of a process share its shard, appending in turn under the archive's lock.
+    A writer that is interrupted leaves at most a partial record at the end of its shard, which the index never refers to.
+    """
+
+    def __init__(self, directory: str, shardBytes: int = defaultShardBytes, level: int = defaultCompressionLevel) -> None:
+        """
+        Opens or creates an archive in the given directory.
+
+        Args:
+            directory (str): The directory to store the shards and index in
+            shardBytes (int): The size a shard may grow to before a new one is started
+            level (int): The gzip compression level of each record
+        """
+
+        self.directory = directory
+        self.shardBytes = shardBytes
+        self.level = level
+        self.lock = threading.Lock()
+        self.shard = None
+        self.shardFile = None
+
+        #open the index, waiting on other processes appending to the same archive
+        os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(directory, 'index.sqlite'), timeout=30.0, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS shards (id INTEGER PRIMARY KEY AUTOINCREMENT, created_at REAL NOT NULL)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS records (id INTEGER PRIMARY KEY, url TEXT NOT NULL, shard INTEGER NOT NULL, offset INTEGER NOT NULL, length INTEGER NOT NULL, digest TEXT NOT NULL, archived_at REAL NOT NULL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS records_url ON records (url)')
+        self.connection.commit()
+
+
+    def shardPath(self, shard: int) -> str:
+        """
+        Finds the path of a shard.
+
+        Args:
+            shard (int): The id of the shard
+
+        Returns:
+            str: The path to the shard's file
+        """
+
+        return os.path.join(self.directory, f'pages-{shard:05d}.warc.gz')
+
+
+    def claimShard(self) -> None:
+        """
+        Starts a new shard for this writer, closing any it was appending to.
+
+        The caller must hold the archive lock.
+
+        Returns:
+            None
+        """
+
+        if self.shardFile:
+            self.shardFile.close()
+
+        self.shard = self.connection.execute('INSERT INTO shards (created_at) VALUES (?)', (time.time(),)).lastrowid
+        self.connection.commit()
+        self.shardFile = open(self.shardPath(self.shard), mode='ab')
+
+
+    def isUnchanged(self, url: str, digest: str) -> bool:
+        """
+        Determines whether the latest record of a url holds the given content.
+
+        The caller must hold the archive lock.
+
+        Args:
+            url (str): The url of the page
+            digest (str): The sha256 hash of the content
+
+        Returns:
+            bool: Whether the content is unchanged since it was last archived
+        """
+
+        latest = self.connection.execute('SELECT digest FROM records WHERE url = ? ORDER BY id DESC LIMIT 1', (url,)).fetchone()
+        return latest is not None and latest[0] == digest
+
+
+    def append(self, url: str, html: str) -> bool:
+        """
+        Appends a page to the archive, unless its content is unchanged since it was last archived.
+
+        Args:
+            url (str): The url of the page
+            html (str): The html content of the page
+
+        Returns:
+            bool: Whether a new record was written
+        """
+
+        body = html.encode('utf-8')
+        digest = hashlib.sha256(body).hexdigest()
+
+        #skip an unchanged page before spending time compressing it
+        with self.lock:
+            unchanged = self.isUnchanged(url, digest)
+
+        if unchanged:
+            return False
+
+        #compress the record as a gzip member of its own without holding the lock, so that other threads can append meanwhile
+        record = gzip.compress(formatRecord(url, body, digest), self.level)
+
+        with self.lock:
+            #check again under the same lock as the append, so that two threads archiving the same page cannot both append it
+            if self.isUnchanged(url, digest):
+                return False
+
+            #start a new shard if this one is full
+            if self.shardFile is None or self.shardFile.tell() >= self.shardBytes:
+                self.claimShard()
+
+            #write the record before indexing it, so that the index never refers to a record not fully written
+            offset = self.shardFile.tell()
+            self.shardFile.write(record)
+            self.shardFile.flush()
+
+            self.connection.execute('INSERT INTO records (url, shard, offset, length, digest, archived_at) VALUES (?, ?, ?, ?, ?, ?)', (url, self.shard, offset, len(record), digest, time.time()))
+            self.connection.commit()
+
+        return True
+
+
+    def iterRecords(self) -> Iterator[ArchiveRecord]:
+        """
+        Lazily finds the latest record of each url in the archive.
+
+        Records are given in the order they lie in the shards, so that reading them in turn reads each shard sequentially.
+
+        Returns:
+            Iterator[ArchiveRecord]: The location of the latest record of each url
+        """
+
+        #read through a connection of its own, so that appending is not blocked while the records are consumed
+        connection = sqlite3.connect(os.path.join(self.directory, 'index.sqlite'), timeout=30.0)
+
+        try:
+            rows = connection.execute('SELECT url, shard, offset, length FROM records WHERE id IN (SELECT MAX(id) FROM records GROUP BY url) ORDER BY shard, offset')
+
+            for url, shard, offset, length in rows:
+                yield ArchiveRecord(url, self.shardPath(shard), offset, length)
+
+        finally:
+            connection.close()
+
+
+    def getStatistics(self) -> Dict[str, int]:
+        """
+        Obtains the size of the archive.
+
+        Returns:
+            Dict[str, int]: The number of distinct urls, records and shards, and the compressed bytes of every record
+        """
+
+        with self.lock:
+            urls, records, shards, compressedBytes = self.connection.execute('SELECT COUNT(DISTINCT url), COUNT(*), COUNT(DISTINCT shard), COALESCE(SUM(length), 0) FROM records').fetchone()
+
+        return {'urls': urls, 'records': records, 'shards': shards, 'compressedBytes': compressedBytes}
+
+
+    def close(self) -> None:
+        """
+        Closes the shard being appended to and the index.
+
+        Returns:
+            None
+        """
+
+        with self.lock:
+            if self.shardFile:
+                self.shardFile.close()
+                self.shardFile = None
+
+            self.connection.close()
+
+
+    def __enter__(self) -> 'PageArchive':
+        return self
+
+
+    def __exit__(self, *exception: any) -> None:
+        self.close()
+
+
+#hold the archive fetched recipe pages are appended to, if one is configured
+archive = None
+
+
+def configureArchive(directory: str | None, shardBytes: int = defaultShardBytes, level: int = defaultCompressionLevel) -> None:
+    """
+    Configures the archive every fetched recipe page is appended to.
+
+    Args:
+        directory (str | None): The directory to store the archive in, or None to disable archiving
+        shardBytes (int): The size a shard may grow to before a new one is started
+        level (int): The gzip compression level of each record
+
+    Returns:
+        None
+    """
+
+    global archive
+
+    #close any existing archive before replacing it
+    if archive:
+        archive.close()
+
+    archive = PageArchive(directory, shardBytes, level) if directory else None
+
+
+def getArchiveSettings() -> Dict[str, any]:
+    """
+    Obtains the settings of the archive, so that they can be passed to worker processes.
+
+    Returns:
+        Dict[str, any]: The keyword arguments of configureArchive that recreate the current archive
+    """
+
+    if archive is None:
+        return {'directory': None}
+
+    return {'directory': archive.directory, 'shardBytes': archive.shardBytes, 'level': archive.level}
+
+
+def getArchive() -> PageArchive | None:
+    """
+    Obtains the archive fetched recipe pages are appended to.
+
+    Returns:
+        PageArchive | None: The configured archive, or None if archiving is disabled
+    """
+
+    return archive
+
+
+def archivePage(url: str, html: str) -> None:
+    """
+    Appends a fetched recipe page to the configured archive, if any.
+
+    A page that cannot be archived is logged and counted without affecting its extraction.
+    The time taken is recorded as the archive stage.
+
+    Args:
+        url (str): The url of the page
+        html (str): The html content of the page
+
+    Returns:
+        None
+    """
+
+    if archive is None:
+        return
+
+    metrics = getMetrics()
+
+    try:
+        with metrics.timeStage('archive'):
+            written = archive.append(url, html)
+
+        metrics.increment('scraper_archived_pages_total', {'result': 'written' if written else 'unchanged'})
+
+    except(OSError, sqlite3.Error) as e:
+        metrics.increment('scraper_archived_pages_total', {'result': 'failed'})
+        logger.warning('Failed to archive page %s: %s', url, e, extra={'url': url, 'error': type(e).__name__})
@@ -0,0 +1,319 @@
+#import the necessary modules
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from typing import Dict, NamedTuple
+from monitoring_utils.metrics_functions import getMetrics
+
+logger = logging.getLogger(__name__)
+
+
+class CacheEntry(NamedTuple):
+    """
+    A cached page along with the validators needed to revalidate it.
+
+    Attributes:
+        html (str): The html content of the page
+        etag (str | None): The ETag header the page was served with
+        lastModified (str | None): The Last-Modified header the page was served with
+        fresh (bool): Whether the page is within the cache's time to live
+    """
+
+    html: str
+    etag: str | None
+    lastModified: str | None
+    fresh: bool
+
+
+class ResponseCache:
+    """
+    A persistent on-disk cache of fetched pages.
+
+    Page bodies are compressed and stored once per distinct content hash, so identical pages share storage.
+    An index maps each url to its content hash and validators, and tracks when each entry was fetched and last used.
+    Entries older than the time to live are revalidated with a conditional request, and the least recently used entries are evicted once the cache exceeds its size limit.
+    The cache can be shared by several processes, such as shard workers, each writing blobs through temporary files of its own and totalling the size of the cache from the index.
+    """
+
+    def __init__(self, directory: str, ttl: float = 86400.0, maxBytes: int = 1024 ** 3, offline: bool = False) -> None:
+        """
+        Opens or creates a cache in the given directory.
+
+        Args:
+            directory (str): The directory to store the cache in
+            ttl (float): The number of seconds a page is served without revalidation
+            maxBytes (int): The maximum compressed size of all pages held in the cache
+            offline (bool): Determines whether pages are only ever served from the cache, never requested
+        """
+
+        self.directory = directory
+        self.ttl = ttl
+        self.maxBytes = maxBytes
+        self.offline = offline
+        self.lock = threading.Lock()
+
+        #create the blob directory and open the index, shared between the fetching threads and waiting on other processes writing to it
+        os.makedirs(os.path.join(directory, 'blobs'), exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(directory, 'index.sqlite'), timeout=30.0, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS entries (url TEXT PRIMARY KEY, digest TEXT NOT NULL, etag TEXT, last_modified TEXT, fetched_at REAL NOT NULL, accessed_at REAL NOT NULL)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, size INTEGER NOT NULL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)')
+        self.connection.commit()
+
+
+    def blobPath(self, digest: str) -> str:
+        """
+        Finds the path of the blob holding the content with the given hash.
+
+        Args:
+            digest (str): The hash of the content
+
+        Returns:
+            str: The path to the compressed blob
+        """
+
+        return os.path.join(self.directory, 'blobs', digest[:2], f'{digest}.z')
+
+
+    def lookup(self, url: str) -> CacheEntry | None:
+        """
+        Finds the cached page for a url, marking it as recently used.
+
+        Args:
+            url (str): The url of the page
+
+        Returns:
+            CacheEntry | None: The cached page, or None if the url is not cached
+        """
+
+        with self.lock:
+            row = self.connection.execute('SELECT digest, etag, last_modified, fetched_at FROM entries WHERE url = ?', (url,)).fetchone()
+
+            if row is None:
+                return None
+
+            digest, etag, lastModified, fetchedAt = row
+
+            #read and decompress the blob, discarding the entry if the blob has gone missing
+            try:
+                with open(self.blobPath(digest), mode='rb') as file:
+                    html = zlib.decompress(file.read()).decode('utf-8')
+            except(OSError, zlib.error):
+                self.connection.execute('DELETE FROM entries WHERE url = ?', (url,))
+                self.connection.commit()
+                return None
+
+            self.connection.execute('UPDATE entries SET accessed_at = ? WHERE url = ?', (time.time(), url))
+            self.connection.commit()
+
+        return CacheEntry(html, etag, lastModified, time.time() - fetchedAt < self.ttl)
+
+
+    def store(self, url: str, html: str, etag: str | None, lastModified: str | None) -> None:
+        """
+        Stores a freshly fetched page in the cache, evicting old entries if the size limit is exceeded.
+
+        A page that cannot be stored is logged and counted without affecting the fetch.
+
+        Args:
+            url (str): The url of the page
+            html (str): The html content of the page
+            etag (str | None): The ETag header the page was served with
+            lastModified (str | None): The Last-Modified header the page was served with
+
+        Returns:
+            None
+        """
+
+        #address the content by its hash
+        body = html.encode('utf-8')
+        digest = hashlib.sha256(body).hexdigest()
+        now = time.time()
+
+        with self.lock:
+            try:
+                #index the content first, taking the index's write lock so that no other process releases the blob meanwhile
+                compressed = zlib.compress(body, 6)
+                path = self.blobPath(digest)
+                self.connection.execute('INSERT OR IGNORE INTO blobs (digest, size) VALUES (?, ?)', (digest, len(compressed)))
+
+                #write the compressed blob unless this content is already held
+                if (not os.path.exists(path)):
+                    self.writeBlob(path, compressed)
+
+                #point the url at the content, releasing any content it previously referred to
+                previous = self.connection.execute('SELECT digest FROM entries WHERE url = ?', (url,)).fetchone()
+                self.connection.execute('INSERT OR REPLACE INTO entries (url, digest, etag, last_modified, fetched_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)', (url, digest, etag, lastModified, now, now))
+
+                if previous and previous[0] != digest:
+                    self.releaseBlob(previous[0])
+
+                self.evict()
+                self.connection.commit()
+
+            except(OSError, sqlite3.Error) as e:
+                self.connection.rollback()
+                getMetrics().increment('scraper_page_cache_store_failures_total')
+                logger.warning('Failed to cache page %s: %s', url, e, extra={'url': url, 'error': type(e).__name__})
+
+
+    def writeBlob(self, path: str, compressed: bytes) -> None:
+        """
+        Writes a compressed blob, replacing any existing file atomically.
+
+        The blob is written to a temporary file unique to this writer, so that processes storing the same content at once never write to the same file.
+
+        Args:
+            path (str): The path to the blob
+            compressed (bytes): The compressed content
+
+        Returns:
+            None
+        """
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, temporaryPath = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+
+        try:
+            with os.fdopen(descriptor, mode='wb') as file:
+                file.write(compressed)
+            os.replace(temporaryPath, path)
+        except(OSError):
+            try:
+                os.remove(temporaryPath)
+            except(OSError):
+                pass
+            raise
+
+
+    def touch(self, url: str) -> None:
+        """
+        Marks a cached page as freshly fetched, after the server confirms it has not changed.
+
+        Args:
+            url (str): The url of the page
+
+        Returns:
+            None
+        """
+
+        now = time.time()
+
+        with self.lock:
+            self.connection.execute('UPDATE entries SET fetched_at = ?, accessed_at = ? WHERE url = ?', (now, now, url))
+            self.connection.commit()
+
+
+    def releaseBlob(self, digest: str) -> None:
+        """
+        Deletes the blob with the given hash if no entry refers to it any longer.
+
+        The caller must hold the cache lock.
+
+        Args:
+            digest (str): The hash of the content
+
+        Returns:
+            None
+        """
+
+        if self.connection.execute('SELECT 1 FROM entries WHERE digest = ? LIMIT 1', (digest,)).fetchone():
+            return
+
+        self.connection.execute('DELETE FROM blobs WHERE digest = ?', (digest,))
+
+        try:
+            os.remove(self.blobPath(digest))
+        except(OSError):
+            pass
+
+
+    def evict(self) -> None:
+        """
+        Removes the least recently used entries until the cache is within its size limit.
+
+        The size of the cache is totalled from the index, so that blobs stored by other processes sharing the cache are counted.
+        The caller must hold the cache lock.
+
+        Returns:
+            None
+        """
+
+        while self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM blobs').fetchone()[0] > self.maxBytes:
+            row = self.connection.execute('SELECT url, digest FROM entries ORDER BY accessed_at LIMIT 1').fetchone()
+
+            if row is None:
+                break
+
+            self.connection.execute('DELETE FROM entries WHERE url = ?', (row[0],))
+            self.releaseBlob(row[1])
+
+
+    def close(self) -> None:
+        """
+        Closes the cache index.
+
+        Returns:
+            None
+        """
+
+        with self.lock:
+            self.connection.close()
+
+
+#hold the cache used by the fetch path, if one is configured
+cache = None
+
+
+def configureCache(directory: str | None, ttl: float = 86400.0, maxBytes: int = 1024 ** 3, offline: bool = False) -> None:
+    """
+    Configures the on-disk cache used for every page fetched by the scraper.
+
+    Args:
+        directory (str | None): The directory to store the cache in, or None to disable caching
+        ttl (float): The number of seconds a page is served without revalidation
+        maxBytes (int): The maximum compressed size of all pages held in the cache
+        offline (bool): Determines whether pages are only ever served from the cache, never requested
+
+    Returns:
+        None
+    """
+
+    global cache
+
+    #close any existing cache before replacing it
+    if cache:
+        cache.close()
+
+    cache = ResponseCache(directory, ttl, maxBytes, offline) if directory else None
+
+
+def getCacheSettings() -> Dict[str, any]:
+    """
+    Obtains the settings of the cache used by the fetch path, so that they can be passed to worker processes.
+
+    Returns:
+        Dict[str, any]: The keyword arguments of configureCache that recreate the current cache
+    """
+
+    if cache is None:
+        return {'directory': None}
+
+    return {'directory': cache.directory, 'ttl': cache.ttl, 'maxBytes': cache.maxBytes, 'offline': cache.offline}
+
+
+def getCache() -> ResponseCache | None:
+    """
+    Obtains the cache used by the fetch path.
+
+    Returns:
+        ResponseCache | None: The configured cache, or None if caching is disabled
+    """
+
+    return cache
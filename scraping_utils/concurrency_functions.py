@@ -0,0 +1,149 @@
+#import the necessary modules
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Iterable, Iterator, Tuple
+from monitoring_utils.metrics_functions import getMetrics
+
+logger = logging.getLogger(__name__)
+
+
+def boundedMap(function: Callable[[Any], Any], items: Iterable[Any], concurrency: int, ordered: bool = False) -> Iterator[Tuple[Any, Any]]:
+    """
+    Applies a function to each item using a thread pool, keeping a bounded number of calls in flight.
+
+    Items are drawn lazily from the iterable only when a worker slot becomes free, and results are yielded as soon as they are available.
+    An exception raised for one item is logged, counted and reported as a None result, so a single failure does not halt the others.
+
+    Args:
+        function (Callable[[Any], Any]): The function to apply to each item
+        items (Iterable[Any]): The items to apply the function to
+        concurrency (int): The maximum number of calls to have in flight at once
+        ordered (bool): Determines whether results are yielded in the same order as the items supplied
+
+    Returns:
+        Iterator[Tuple[Any, Any]]: The pairs of each item and the result of the function applied to it
+    """
+
+    #ensure at least a single worker is used
+    concurrency = max(1, concurrency)
+
+    #initialise the item iterator, the in flight futures and the buffer of results held back for ordering
+    iterator = iter(items)
+    inFlight = {}
+    completed = {}
+    nextIndex = 0
+    nextYieldIndex = 0
+    exhausted = False
+
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    try:
+        while True:
+            #top up the in flight futures until the concurrency limit is reached or the items run out
+            #in ordered mode the results held back also count towards the limit to keep the buffer bounded
+            while (not exhausted and len(inFlight) + len(completed) < concurrency):
+                try:
+                    item = next(iterator)
+                except(StopIteration):
+                    exhausted = True
+                    break
+
+                inFlight[executor.submit(function, item)] = (nextIndex, item)
+                nextIndex += 1
+
+            #if nothing is left in flight, all items have been processed
+            if (not inFlight):
+                break
+
+            #wait for at least one future to complete
+            done, _ = wait(inFlight, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                index, item = inFlight.pop(future)
+
+                #isolate failures to the item that raised them
+                try:
+                    result = future.result()
+                except(Exception) as e:
+                    getMetrics().increment('scraper_task_errors_total', {'error': type(e).__name__})
+                    logger.error('Error occured processing %s: %s', item, e, extra={'item': item, 'error': type(e).__name__})
+                    result = None
+
+                #yield the result immediately if unordered, otherwise hold it until its turn
+                if (not ordered):
+                    yield item, result
+                else:
+                    completed[index] = (item, result)
+
+            #in ordered mode, yield every held result that is next in sequence
+            while (nextYieldIndex in completed):
+                yield completed.pop(nextYieldIndex)
+                nextYieldIndex += 1
+
+    #cancel any queued work if the consumer stops early, and wait for running calls to finish
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def prefetchIterable(items: Iterable[Any], bufferSize: int) -> Iterator[Any]:
+    """
+    Draws items from an iterable on a background thread, holding a bounded number ahead of the consumer.
+
+    This lets a slow producer, such as a crawl of search pages, run alongside its consumer.
+    When the buffer is full the producer waits, so memory use stays flat however many items are produced.
+    An exception raised by the producer is re-raised to the consumer.
+
+    Args:
+        items (Iterable[Any]): The items to draw
+        bufferSize (int): The maximum number of items held ahead of the consumer
+
+    Returns:
+        Iterator[Any]: The items, in the order produced
+    """
+
+    #initialise the bounded buffer and an event used to stop the producer if the consumer stops early
+    buffer = queue.Queue(maxsize=max(1, bufferSize))
+    stopEvent = threading.Event()
+
+    #define the placing of an entry in the buffer, giving up if the consumer has stopped
+    def put(entry: Tuple[str, Any]) -> bool:
+        while not stopEvent.is_set():
+            try:
+                buffer.put(entry, timeout=0.1)
+                return True
+            except(queue.Full):
+                continue
+
+        return False
+
+    #define the producer, passing each item or the error raised to the consumer followed by an end marker
+    def produce() -> None:
+        try:
+            for item in items:
+                if not put(('item', item)):
+                    return
+        except(Exception) as e:
+            put(('error', e))
+        finally:
+            put(('end', None))
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+
+    try:
+        while True:
+            kind, value = buffer.get()
+
+            if kind == 'end':
+                break
+            elif kind == 'error':
+                raise value
+
+            yield value
+
+    #stop the producer and wait for it to finish
+    finally:
+        stopEvent.set()
+        producer.join()
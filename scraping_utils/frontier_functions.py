@@ -0,0 +1,514 @@
+#import the necessary modules
+import hashlib
+import math
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+#define the pattern picking out recipe pages, which collections and categories do not match as they have a further path segment
+recipePathPattern = re.compile(r'^/recipes/[^/]+/?$')
+
+#define the query parameters added for tracking, which never change the page served, matched by name or for utm parameters by prefix
+trackingParameters = frozenset(('fbclid', 'gclid', 'mc_cid', 'mc_eid', 'ref'))
+trackingPrefixes = ('utm_',)
+
+#define the port each scheme uses unless another is given
+defaultPorts = {'http': 80, 'https': 443}
+
+#set the approximate number of bytes a pending url takes in memory beyond its characters
+entryOverhead = 120
+
+
+def isTrackingParameter(key: str) -> bool:
+    """
+    Determines whether a query parameter is only added for tracking.
+
+    Args:
+        key (str): The name of the parameter
+
+    Returns:
+        bool: Whether the parameter is a tracking parameter
+    """
+
+    key = key.lower()
+    return key in trackingParameters or key.startswith(trackingPrefixes)
+
+
+def canonicaliseUrl(url: str) -> str:
+    """
+    Converts a url to a canonical form, so that urls of the same page compare equal.
+
+    The scheme and host are lower cased, a default port is dropped, repeated and trailing slashes are removed, and the fragment is dropped.
+    Recipe pages ignore their query string, so it is dropped entirely, while other pages keep every parameter but tracking parameters, sorted.
+
+    Args:
+        url (str): The url to canonicalise
+
+    Returns:
+        str: The canonical url
+    """
+
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+
+    try:
+        port = parts.port
+    except(ValueError):
+        port = None
+
+    netloc = f'{host}:{port}' if port and port != defaultPorts.get(scheme) else host
+
+    #collapse repeated slashes and drop any trailing slash, other than that of the root path
+    path = re.sub(r'/{2,}', '/', parts.path) or '/'
+    path = path.rstrip('/') or '/'
+
+    if recipePathPattern.match(path):
+        query = ''
+    else:
+        query = urlencode(sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True) if not isTrackingParameter(key)))
+
+    return urlunsplit((scheme, netloc, path, query, ''))
+
+
+class BloomFilter:
+    """
+    A compact probabilistic set of strings, which may report a string as present when it is not, but never the reverse.
+    """
+
+    def __init__(self, capacity: int, errorRate: float) -> None:
+        """
+        Creates an empty filter sized for a number of strings.
+
+        Args:
+            capacity (int): The number of strings the filter holds at its error rate
+            errorRate (float): The probability of reporting an absent string as present once the filter is at capacity
+        """
+
+        self.capacity = max(1, capacity)
+        self.bitCount = max(8, int(-self.capacity * math.log(errorRate) / math.log(2) ** 2))
+        self.hashCount = max(1, round(self.bitCount / self.capacity * math.log(2)))
+        self.bits = bytearray((self.bitCount + 7) // 8)
+        self.count = 0
+
+
+    def getPositions(self, key: str) -> List[int]:
+        """
+        Finds the bits representing a string, derived from two halves of a single hash.
+
+        Args:
+            key (str): The string
+
+        Returns:
+            List[int]: The index of each bit
+        """
+
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+        return [(first + index * second) % self.bitCount for index in range(self.hashCount)]
+
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.getPositions(key))
+
+
+    def add(self, key: str) -> None:
+        """
+        Adds a string to the filter.
+
+        Args:
+            key (str): The string
+
+        Returns:
+            None
+        """
+
+        for position in self.getPositions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+        self.count += 1
+
+
+class UrlSet:
+    """
+    A set of canonical urls seen during a crawl, held in a fixed amount of memory however many urls it holds.
+
+    Membership is first checked against Bloom filters, so a url never seen before is recognised without touching the disk.
+    Only urls the filters report as possibly seen are confirmed against an exact SQLite store of every url, which new urls are written to in batches.
+    Once the filters reach their capacity a larger filter is added, so their error rate stays bounded as the crawl grows.
+    A set is used from a single thread.
+    """
+
+    def __init__(self, directory: str | None = None, expectedUrls: int = 1_000_000, errorRate: float = 0.001, batchSize: int = 1000) -> None:
+        """
+        Creates an empty set.
+
+        Args:
+            directory (str | None): The directory to hold the exact store in, or None to use a temporary directory removed on closing
+            expectedUrls (int): The number of urls the first filter is sized for
+            errorRate (float): The probability of a url never seen being confirmed against the exact store
+            batchSize (int): The number of new urls written to the exact store at once
+        """
+
+        self.temporary = directory is None
+        self.directory = tempfile.mkdtemp(prefix='url-set-') if directory is None else directory
+        self.errorRate = errorRate
+        self.batchSize = max(1, batchSize)
+        self.filters = [BloomFilter(expectedUrls, errorRate / 2)]
+        self.unwritten = set()
+        self.statistics = {'added': 0, 'duplicates': 0, 'falsePositives': 0}
+
+        #open the exact store, discarding any urls left from an earlier crawl in the same directory
+        os.makedirs(self.directory, exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(self.directory, 'urls.sqlite'), check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=OFF')
+        self.connection.execute('PRAGMA synchronous=OFF')
+        self.connection.execute('DROP TABLE IF EXISTS urls')
+        self.connection.execute('CREATE TABLE urls (url TEXT PRIMARY KEY) WITHOUT ROWID')
+
+
+    def add(self, url: str) -> bool:
+        """
+        Adds a canonical url to the set.
+
+        Args:
+            url (str): The canonical url, as returned by canonicaliseUrl
+
+        Returns:
+            bool: Whether the url was new to the set
+        """
+
+        if any(url in bloomFilter for bloomFilter in self.filters):
+            #confirm the url against the urls not yet written and then the exact store
+            if url in self.unwritten or self.connection.execute('SELECT 1 FROM urls WHERE url = ?', (url,)).fetchone():
+                self.statistics['duplicates'] += 1
+                return False
+
+            self.statistics['falsePositives'] += 1
+
+        #add a larger filter once the newest is full, halving the error rate of each so that their combined rate stays bounded
+        newest = self.filters[-1]
+
+        if newest.count >= newest.capacity:
+            newest = BloomFilter(newest.capacity * 2, self.errorRate / 2 ** (len(self.filters) + 1))
+            self.filters.append(newest)
+
+        newest.add(url)
+        self.unwritten.add(url)
+        self.statistics['added'] += 1
+
+        if len(self.unwritten) >= self.batchSize:
+            self.flush()
+
+        return True
+
+
+    def flush(self) -> None:
+        """
+        Writes the new urls held in memory to the exact store.
+
+        Returns:
+            None
+        """
+
+        self.connection.executemany('INSERT OR IGNORE INTO urls (url) VALUES (?)', ((url,) for url in self.unwritten))
+        self.connection.commit()
+        self.unwritten.clear()
+
+
+    def __len__(self) -> int:
+        return self.statistics['added']
+
+
+    def getStatistics(self) -> Dict[str, int]:
+        """
+        Obtains the number of urls added, duplicates rejected and urls needlessly confirmed against the exact store.
+
+        Returns:
+            Dict[str, int]: The counts, along with the bytes held by the filters
+        """
+
+        return dict(self.statistics, filterBytes=sum(len(bloomFilter.bits) for bloomFilter in self.filters))
+
+
+    def close(self) -> None:
+        """
+        Closes the exact store, removing its directory if it was temporary.
+
+        Returns:
+            None
+        """
+
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+
+            if self.temporary:
+                shutil.rmtree(self.directory, ignore_errors=True)
+
+
+    def __enter__(self) -> 'UrlSet':
+        return self
+
+
+    def __exit__(self, *exception: any) -> None:
+        self.close()
+
+
+class UrlFrontier:
+    """
+    A first in, first out queue of discovered urls awaiting scraping, held within a memory budget however far discovery runs ahead.
+
+    Urls are held in memory until the budget is reached, after which newly pushed urls are spilled to a SQLite file in order.
+    Once the urls in memory run out, the oldest spilled urls are loaded back in, so urls are always popped in the order pushed.
+    Urls can be pushed and popped from different threads, and a consumer can wait for urls until the producer finishes.
+    """
+
+    def __init__(self, directory: str | None = None, memoryBudget: int = 8 * 1024 * 1024, batchSize: int = 1000) -> None:
+        """
+        Creates an empty frontier.
+
+        Args:
+            directory (str | None): The directory to spill urls to, or None to use a temporary directory removed on closing
+            memoryBudget (int): The approximate number of bytes of pending urls held in memory
+            batchSize (int): The number of urls spilled to disk at once
+        """
+
+        self.temporary = directory is None
+        self.directory = tempfile.mkdtemp(prefix='url-frontier-') if directory is None else directory
+        self.memoryBudget = memoryBudget
+        self.batchSize = max(1, batchSize)
+        self.condition = threading.Condition()
+        self.memory = deque()
+        self.memoryBytes = 0
+        self.spillBuffer = []
+        self.spilled = 0
+        self.finished = False
+        self.statistics = {'pushed': 0, 'spilled': 0, 'peakMemoryBytes': 0}
+
+        #open the spill file, discarding any urls left from an earlier crawl in the same directory
+        os.makedirs(self.directory, exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(self.directory, 'frontier.sqlite'), check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=OFF')
+        self.connection.execute('PRAGMA synchronous=OFF')
+        self.connection.execute('DROP TABLE IF EXISTS pending')
+        self.connection.execute('CREATE TABLE pending (id INTEGER PRIMARY KEY, url TEXT NOT NULL, lastmod TEXT)')
+
+
+    def push(self, url: str, lastmod: str | None = None) -> None:
+        """
+        Adds a url to the back of the frontier, spilling it to disk if the memory budget is reached.
+
+        Args:
+            url (str): The url
+            lastmod (str | None): The lastmod of the url's page, or None if not known
+
+        Returns:
+            None
+        """
+
+        size = len(url) + len(lastmod or '') + entryOverhead
+
+        with self.condition:
+            self.statistics['pushed'] += 1
+
+            #once any url is spilled, every later url is spilled behind it so that order is kept
+            if self.spilled == 0 and self.memoryBytes + size <= self.memoryBudget:
+                self.memory.append((url, lastmod))
+                self.memoryBytes += size
+                self.statistics['peakMemoryBytes'] = max(self.statistics['peakMemoryBytes'], self.memoryBytes)
+            else:
+                self.spillBuffer.append((url, lastmod))
+                self.spilled += 1
+                self.statistics['spilled'] += 1
+
+                if len(self.spillBuffer) >= self.batchSize:
+                    self.flush()
+
+            self.condition.notify()
+
+
+    def flush(self) -> None:
+        """
+        Writes the urls waiting to be spilled to disk.
+
+        The caller must hold the frontier's lock.
+
+        Returns:
+            None
+        """
+
+        self.connection.executemany('INSERT INTO pending (url, lastmod) VALUES (?, ?)', self.spillBuffer)
+        self.connection.commit()
+        self.spillBuffer = []
+
+
+    def load(self) -> None:
+        """
+        Moves the oldest spilled urls back into memory, up to the memory budget.
+
+        The caller must hold the frontier's lock.
+
+        Returns:
+            None
+        """
+
+        self.flush()
+        lastId = None
+
+        for rowId, url, lastmod in self.connection.execute('SELECT id, url, lastmod FROM pending ORDER BY id'):
+            size = len(url) + len(lastmod or '') + entryOverhead
+
+            if self.memory and self.memoryBytes + size > self.memoryBudget:
+                break
+
+            self.memory.append((url, lastmod))
+            self.memoryBytes += size
+            self.spilled -= 1
+            lastId = rowId
+
+        if lastId is not None:
+            self.connection.execute('DELETE FROM pending WHERE id <= ?', (lastId,))
+            self.connection.commit()
+
+
+    def pop(self, wait: bool = False) -> Tuple[str, str | None] | None:
+        """
+        Removes the url at the front of the frontier.
+
+        Args:
+            wait (bool): Determines whether to wait for a url while the frontier is empty, until finish is called
+
+        Returns:
+            Tuple[str, str | None] | None: The url and its lastmod, or None if the frontier is empty
+        """
+
+        with self.condition:
+            while True:
+                if not self.memory and self.spilled:
+                    self.load()
+
+                if self.memory:
+                    url, lastmod = self.memory.popleft()
+                    self.memoryBytes -= len(url) + len(lastmod or '') + entryOverhead
+                    return url, lastmod
+
+                if not wait or self.finished:
+                    return None
+
+                self.condition.wait()
+
+
+    def finish(self) -> None:
+        """
+        Records that no more urls will be pushed, releasing any consumer waiting on an empty frontier.
+
+        Returns:
+            None
+        """
+
+        with self.condition:
+            self.finished = True
+            self.condition.notify_all()
+
+
+    def __len__(self) -> int:
+        with self.condition:
+            return len(self.memory) + self.spilled
+
+
+    def getStatistics(self) -> Dict[str, int]:
+        """
+        Obtains the number of urls pushed and spilled, and the most memory held by pending urls at once.
+
+        Returns:
+            Dict[str, int]: The counts
+        """
+
+        with self.condition:
+            return dict(self.statistics)
+
+
+    def close(self) -> None:
+        """
+        Closes the spill file, removing its directory if it was temporary.
+
+        Returns:
+            None
+        """
+
+        with self.condition:
+            if self.connection:
+                self.connection.close()
+                self.connection = None
+
+                if self.temporary:
+                    shutil.rmtree(self.directory, ignore_errors=True)
+
+
+    def __enter__(self) -> 'UrlFrontier':
+        return self
+
+
+    def __exit__(self, *exception: any) -> None:
+        self.close()
+
+
+def iterThroughFrontier(entries: Iterable[Tuple[str, str | None]], frontier: UrlFrontier) -> Iterator[Tuple[str, str | None]]:
+    """
+    Draws urls from a discovery source on a background thread into a frontier, yielding them in order as the consumer is ready.
+
+    Unlike prefetchIterable, discovery is never held back by a slow consumer, as urls beyond the frontier's memory budget are spilled to disk.
+    This keeps a streamed sitemap from being left open while detail scraping catches up.
+    An exception raised by the source is re-raised to the consumer once the urls discovered before it are consumed.
+
+    Args:
+        entries (Iterable[Tuple[str, str | None]]): The pairs of each url discovered and its lastmod, or None if not known
+        frontier (UrlFrontier): The frontier to hold the urls awaiting the consumer
+
+    Returns:
+        Iterator[Tuple[str, str | None]]: The pairs of each url and its lastmod, in the order discovered
+    """
+
+    stopEvent = threading.Event()
+    errors = []
+
+    #define the producer, pushing each url until the source is exhausted or the consumer stops
+    def produce() -> None:
+        try:
+            for url, lastmod in entries:
+                if stopEvent.is_set():
+                    return
+
+                frontier.push(url, lastmod)
+        except(Exception) as e:
+            errors.append(e)
+        finally:
+            frontier.finish()
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+
+    try:
+        while True:
+            entry = frontier.pop(wait=True)
+
+            if entry is None:
+                break
+
+            yield entry
+
+        if errors:
+            raise errors[0]
+
+    #stop the producer and wait for it to finish
+    finally:
+        stopEvent.set()
+        producer.join()
@@ -0,0 +1,388 @@
+#import the necessary modules
+import logging
+import math
+import random
+import threading
+import time
+import requests
+from email.utils import parsedate_to_datetime
+from importlib.util import find_spec
+from requests.adapters import HTTPAdapter
+from typing import Dict, NamedTuple
+from scraping_utils.cache_functions import CacheEntry, ResponseCache, getCache
+from scraping_utils.throttle_functions import getHostController
+from monitoring_utils.metrics_functions import getMetrics
+
+logger = logging.getLogger(__name__)
+
+#advertise brotli only if a decoder is available to the underlying connection pool
+acceptEncoding = 'gzip, deflate, br' if (find_spec('brotli') or find_spec('brotlicffi')) else 'gzip, deflate'
+
+headers = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept-Encoding': acceptEncoding,
+    'Connection': 'keep-alive'
+}
+
+#define the client settings, the status codes worth retrying and the errors that indicate a dropped connection
+settings = {
+    'timeout': 15.0,
+    'retries': 3,
+    'backoffFactor': 0.5,
+    'maxBackoff': 30.0,
+    'maxRetryAfter': 600.0,
+    'poolSize': 16
+}
+retryStatusCodes = {429, 500, 502, 503, 504}
+retryExceptions = (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.ChunkedEncodingError)
+
+
+class ConditionalPage(NamedTuple):
+    """
+    The outcome of requesting a page only if it has changed since it was last seen.
+
+    Attributes:
+        html (str | None): The html content of the page, or None if the host reported it as not modified
+        etag (str | None): The ETag header the page is now served with
+        lastModified (str | None): The Last-Modified header the page is now served with
+    """
+
+    html: str | None
+    etag: str | None
+    lastModified: str | None
+
+
+#hold the shared session and a lock guarding its creation
+session = None
+sessionLock = threading.Lock()
+
+
+def configureHttpClient(timeout: float | None = None, retries: int | None = None, backoffFactor: float | None = None, maxBackoff: float | None = None, maxRetryAfter: float | None = None, poolSize: int | None = None) -> None:
+    """
+    Configures the shared http client used for every request made by the scraper.
+
+    Any setting left as None keeps its current value. The shared session is rebuilt on its next use so the settings take effect.
+
+    Args:
+        timeout (float | None): The number of seconds to wait for a connection or response before giving up
+        retries (int | None): The number of times a failed request is retried
+        backoffFactor (float | None): The base number of seconds to wait before a retry, doubled on each subsequent attempt
+        maxBackoff (float | None): The maximum number of seconds of exponential backoff to wait before a single retry
+        maxRetryAfter (float | None): The maximum number of seconds a Retry-After header may pause a host for
+        poolSize (int | None): The number of keep-alive connections held open per host, which should be at least the concurrency used
+
+    Returns:
+        None
+    """
+
+    global session
+
+    #update each setting supplied
+    for key, value in (('timeout', timeout), ('retries', retries), ('backoffFactor', backoffFactor), ('maxBackoff', maxBackoff), ('maxRetryAfter', maxRetryAfter), ('poolSize', poolSize)):
+        if value is not None:
+            settings[key] = value
+
+    #discard the current session so that it is rebuilt with the new pool size
+    with sessionLock:
+        if session:
+            session.close()
+        session = None
+
+
+def getHttpClientSettings() -> Dict[str, any]:
+    """
+    Obtains a copy of the current client settings, so that they can be passed to worker processes.
+
+    Returns:
+        Dict[str, any]: The current client settings
+    """
+
+    return dict(settings)
+
+
+def getSession() -> requests.Session:
+    """
+    Obtains the shared session, creating it on first use.
+
+    The session holds a pool of keep-alive connections so that repeated requests to the same host avoid a new TCP and TLS handshake.
+
+    Returns:
+        requests.Session: The shared session
+    """
+
+    global session
+
+    with sessionLock:
+        if session is None:
+            #mount an adapter with a connection pool sized to the configured concurrency, leaving retries to fetchResponse
+            adapter = HTTPAdapter(pool_connections=settings['poolSize'], pool_maxsize=settings['poolSize'], max_retries=0)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update(headers)
+
+        return session
+
+
+def getRetryAfter(response: requests.Response | None) -> float | None:
+    """
+    Finds the number of seconds a response's Retry-After header asks requests to wait for.
+
+    Args:
+        response (requests.Response | None): The response received, or None if the connection failed
+
+    Returns:
+        float | None: The number of seconds to wait, capped by the maxRetryAfter setting, or None if no valid header was given
+    """
+
+    #read the header's value in either seconds or as a http date
+    retryAfter = response.headers.get('Retry-After') if response is not None else None
+
+    if (not retryAfter):
+        return None
+
+    try:
+        delay = float(retryAfter)
+    except(ValueError):
+        try:
+            delay = parsedate_to_datetime(retryAfter).timestamp() - time.time()
+        except(Exception):
+            return None
+
+    #ignore a value that is not a finite number, and never wait a negative time for a date already passed
+    if (not math.isfinite(delay)):
+        return None
+
+    return min(max(0.0, delay), settings['maxRetryAfter'])
+
+
+def getRetryDelay(attempt: int, response: requests.Response | None) -> float:
+    """
+    Finds the number of seconds to wait before retrying a request.
+
+    Honours a Retry-After header in full if one is present, and otherwise uses an exponential backoff with jitter capped by the maxBackoff setting.
+
+    Args:
+        attempt (int): The number of attempts already made
+        response (requests.Response | None): The response received, or None if the connection failed
+
+    Returns:
+        float: The number of seconds to wait
+    """
+
+    #if the server specified when to retry, use its value
+    retryAfter = getRetryAfter(response)
+
+    if retryAfter is not None:
+        return retryAfter
+
+    #otherwise double the wait on each attempt, adding jitter so that concurrent retries do not align
+    delay = settings['backoffFactor'] * (2 ** attempt)
+    return min(delay + random.uniform(0, delay), settings['maxBackoff'])
+
+
+def fetchResponse(url: str, extraHeaders: Dict[str, str] | None = None, stream: bool = False) -> requests.Response | None:
+    """
+    Requests a url through the shared session, retrying transient failures.
+
+    Server errors, rate limiting responses and dropped connections are retried with an exponential backoff.
+    If rate limiting is configured, each attempt waits on its host's controller, which adapts to the attempt's outcome, and a Retry-After header pauses every request to the host.
+    Each response's status code and each retry are counted in the shared metrics.
+
+    Args:
+        url (str): The url to request
+        extraHeaders (Dict[str, str] | None): Any headers to send in addition to the shared headers
+        stream (bool): Determines whether the body is left to be read from the response as it arrives, in which case the caller must close the response
+
+    Returns:
+        requests.Response | None: The final response received, or None if no response could be obtained
+    """
+
+    metrics = getMetrics()
+    controller = getHostController(url)
+    response = None
+
+    for attempt in range(settings['retries'] + 1):
+        #wait until the host's controller allows another request
+        if controller:
+            controller.acquire()
+
+        startTime = time.monotonic()
+        response = None
+
+        #request the url, treating a dropped connection as retryable
+        try:
+            with metrics.trackInFlight('scraper_requests_in_flight'):
+                response = getSession().get(url, headers=extraHeaders, timeout=settings['timeout'], stream=stream)
+
+            metrics.increment('scraper_http_responses_total', {'status': response.status_code})
+        except(retryExceptions) as e:
+            logger.warning('Connection error requesting %s: %s', url, e, extra={'url': url, 'error': type(e).__name__})
+        finally:
+            if controller:
+                controller.release(response.status_code if response is not None else None, time.monotonic() - startTime)
+
+        #return any response that is not worth retrying
+        if response is not None and response.status_code not in retryStatusCodes:
+            return response
+
+        #if attempts remain, wait before retrying
+        if attempt < settings['retries']:
+            delay = getRetryDelay(attempt, response)
+            retryAfter = getRetryAfter(response)
+
+            #if the host asked for requests to stop for a time, pause every request to it for the whole time rather than only this one
+            if controller and retryAfter is not None:
+                controller.pause(retryAfter)
+
+            metrics.increment('scraper_http_retries_total', {'reason': response.status_code if response is not None else 'connection'})
+
+            #release the connection of a discarded response, which is otherwise held until its body is read when streaming
+            if response is not None:
+                response.close()
+
+            logger.info('Retrying %s in %.1f seconds...', url, delay, extra={'url': url, 'attempt': attempt + 1})
+            time.sleep(delay)
+
+    return response
+
+
+def fetchPage(url: str) -> str | None:
+    """
+    Obtains the html content of a page.
+
+    If a cache is configured, a fresh cached copy is served directly and a stale one is revalidated with a conditional request.
+    In offline mode only cached copies are served.
+    The time spent, including any retries, is recorded as the fetch stage, and each cache lookup's outcome is counted.
+
+    Args:
+        url (str): The url of the page to request
+
+    Returns:
+        str | None: The html content of the page, or None if the page cannot be reached
+    """
+
+    metrics = getMetrics()
+
+    with metrics.timeStage('fetch'):
+        #look the page up in the cache, serving it directly if fresh or if requests are not permitted
+        cache = getCache()
+        entry = cache.lookup(url) if cache else None
+
+        if entry and (entry.fresh or cache.offline):
+            metrics.increment('scraper_page_cache_requests_total', {'result': 'hit'})
+            return entry.html
+
+        if cache and cache.offline:
+            metrics.increment('scraper_page_cache_requests_total', {'result': 'miss'})
+            logger.warning('Page %s is not cached and requests are disabled in offline mode.', url, extra={'url': url})
+            return None
+
+        return requestPage(url, cache, entry)
+
+
+def requestPage(url: str, cache: ResponseCache | None, entry: CacheEntry | None) -> str | None:
+    """
+    Requests a page that could not be served from the cache, revalidating any stale cached copy and storing the page received.
+
+    Args:
+        url (str): The url of the page to request
+        cache (ResponseCache | None): The configured cache, or None if caching is disabled
+        entry (CacheEntry | None): The stale cached copy of the page, or None if the page is not cached
+
+    Returns:
+        str | None: The html content of the page, or None if the page cannot be reached
+    """
+
+    metrics = getMetrics()
+
+    #send the validators of any stale copy so that an unchanged page is not transferred again
+    conditionalHeaders = {}
+
+    if entry and entry.etag:
+        conditionalHeaders['If-None-Match'] = entry.etag
+    if entry and entry.lastModified:
+        conditionalHeaders['If-Modified-Since'] = entry.lastModified
+
+    response = fetchResponse(url, conditionalHeaders or None)
+
+    #if the page has not changed since it was cached, serve the cached copy
+    if entry and response is not None and response.status_code == 304:
+        metrics.increment('scraper_page_cache_requests_total', {'result': 'revalidated'})
+        cache.touch(url)
+        return entry.html
+
+    if cache:
+        metrics.increment('scraper_page_cache_requests_total', {'result': 'miss'})
+
+    #if the page did not load correctly, log an error and return None
+    if response is None or response.status_code != 200:
+        status = response.status_code if response is not None else 'unavailable'
+        logger.warning('Failed to retrieve %s (status %s).', url, status, extra={'url': url, 'status': status})
+        return None
+
+    #store the page along with its validators for later runs
+    if cache:
+        cache.store(url, response.text, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+
+    return response.text
+
+
+def fetchPageIfModified(url: str, etag: str | None, lastModified: str | None) -> ConditionalPage | None:
+    """
+    Obtains the html content of a page only if it has changed since it was served with the given validators.
+
+    The validators are sent in a conditional request, so that a page the host reports as not modified is not transferred again.
+    If a cache is configured, a fresh cached copy is served without a request, and in offline mode only cached copies are served, leaving the caller to compare their content.
+    The time spent is recorded as the fetch stage.
+
+    Args:
+        url (str): The url of the page to request
+        etag (str | None): The ETag header the page was last served with
+        lastModified (str | None): The Last-Modified header the page was last served with
+
+    Returns:
+        ConditionalPage | None: The page and its current validators, or None if the page cannot be reached
+    """
+
+    metrics = getMetrics()
+
+    with metrics.timeStage('fetch'):
+        #serve a fresh cached copy directly, or any cached copy if requests are not permitted
+        cache = getCache()
+        entry = cache.lookup(url) if cache else None
+
+        if entry and (entry.fresh or cache.offline):
+            metrics.increment('scraper_page_cache_requests_total', {'result': 'hit'})
+            return ConditionalPage(entry.html, entry.etag, entry.lastModified)
+
+        if cache and cache.offline:
+            metrics.increment('scraper_page_cache_requests_total', {'result': 'miss'})
+            logger.warning('Page %s is not cached and requests are disabled in offline mode.', url, extra={'url': url})
+            return None
+
+        conditionalHeaders = {}
+
+        if etag:
+            conditionalHeaders['If-None-Match'] = etag
+        if lastModified:
+            conditionalHeaders['If-Modified-Since'] = lastModified
+
+        response = fetchResponse(url, conditionalHeaders or None)
+
+        #if the page has not changed, keep its validators unless the host sent new ones
+        if response is not None and response.status_code == 304:
+            return ConditionalPage(None, response.headers.get('ETag', etag), response.headers.get('Last-Modified', lastModified))
+
+        if cache:
+            metrics.increment('scraper_page_cache_requests_total', {'result': 'miss'})
+
+        if response is None or response.status_code != 200:
+            status = response.status_code if response is not None else 'unavailable'
+            logger.warning('Failed to retrieve %s (status %s).', url, status, extra={'url': url, 'status': status})
+            return None
+
+        if cache:
+            cache.store(url, response.text, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+
+        return ConditionalPage(response.text, response.headers.get('ETag'), response.headers.get('Last-Modified'))
@@ -0,0 +1,95 @@
+#import the necessary modules
+import logging
+from importlib.util import find_spec
+from typing import Dict, Iterable
+from bs4 import BeautifulSoup, SoupStrainer
+
+logger = logging.getLogger(__name__)
+
+#define the classes of the only sections read from recipe pages and search pages
+recipeSectionClasses = frozenset({
+    'post-header__title',
+    'image__container',
+    'recipe__ingredients',
+    'author-link',
+    'recipe__method-steps',
+    'post-header__cook-and-prep-time',
+    'post-header__skill-level',
+    'rating__values',
+    'key-value-blocks'
+})
+searchSectionClasses = frozenset({'layout-md-rail__primary'})
+
+#define the parser backends supported by BeautifulSoup along with the module each requires
+parserBackends = {'html.parser': None, 'lxml': 'lxml'}
+
+#define the parser settings, using lxml when it is installed
+parserSettings = {
+    'backend': 'lxml' if find_spec('lxml') else 'html.parser',
+    'restricted': True
+}
+
+
+def configureParser(backend: str | None = None, restricted: bool | None = None) -> None:
+    """
+    Configures how html content is parsed by the scraper.
+
+    Any setting left as None keeps its current value. A backend whose module is not installed falls back to html.parser.
+
+    Args:
+        backend (str | None): The BeautifulSoup parser backend to use, either 'html.parser' or 'lxml'
+        restricted (bool | None): Determines whether only the sections of a page read by the scraper are built into the document tree
+
+    Returns:
+        None
+    """
+
+    if backend is not None:
+        #reject unknown backends, and fall back to the built in parser if the backend's module is missing
+        if backend not in parserBackends:
+            raise ValueError(f'Unknown parser backend {backend}, expected one of {", ".join(parserBackends)}')
+
+        if parserBackends[backend] and not find_spec(parserBackends[backend]):
+            logger.warning('Parser backend %s is not installed, falling back to html.parser', backend)
+            backend = 'html.parser'
+
+        parserSettings['backend'] = backend
+
+    if restricted is not None:
+        parserSettings['restricted'] = restricted
+
+
+def getParserSettings() -> Dict[str, any]:
+    """
+    Obtains a copy of the current parser settings, so that they can be passed to worker processes.
+
+    Returns:
+        Dict[str, any]: The current parser settings
+    """
+
+    return dict(parserSettings)
+
+
+def makeSoup(html: str | bytes, sectionClasses: Iterable[str] | None = None) -> BeautifulSoup:
+    """
+    Parses html content into a document tree using the configured backend.
+
+    If restricted parsing is enabled and section classes are given, only elements carrying one of those classes (and their descendants) are built into the tree.
+    As the kept sections are otherwise unchanged and in document order, finding elements within them gives the same results as on the full tree.
+
+    Args:
+        html (str | bytes): The html content to parse
+        sectionClasses (Iterable[str] | None): The classes of the sections to keep, or None to keep the whole document
+
+    Returns:
+        BeautifulSoup: The parsed document tree
+    """
+
+    #restrict the tree to the given sections if enabled
+    parseOnly = None
+
+    if parserSettings['restricted'] and sectionClasses:
+        classes = frozenset(sectionClasses)
+        parseOnly = SoupStrainer(class_=lambda value: value in classes)
+
+    return BeautifulSoup(html, parserSettings['backend'], parse_only=parseOnly)
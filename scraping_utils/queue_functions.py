@@ -0,0 +1,343 @@
+#import the necessary modules
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, NamedTuple
+
+#define the kinds of work held in the queue
+PAGES = 'pages'
+RECIPES = 'recipes'
+
+#define the states a lease can be in
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class Lease(NamedTuple):
+    """
+    A unit of work claimed from the queue by a worker.
+
+    Attributes:
+        taskId (int): The id of the task leased
+        kind (str): The kind of work, either 'pages' or 'recipes'
+        items (List[any]): The search page numbers or recipe urls to process
+        attempts (int): The number of times these items were attempted before this lease
+    """
+
+    taskId: int
+    kind: str
+    items: List[any]
+    attempts: int
+
+
+class WorkQueue:
+    """
+    A queue of crawl work shared between worker processes, possibly on several hosts, through a SQLite file.
+
+    Work is held as tasks, each a batch of search pages or recipe urls, which workers lease for a limited time.
+    A worker extends its lease with heartbeats while it works, and a lease that expires without being completed is returned to the queue for another worker.
+    Recipe urls discovered from search pages are deduplicated before being queued, so each recipe is leased once unless its lease expires or it fails.
+    The rollback journal is used rather than WAL so that the file can be shared over a network filesystem with working locks.
+    """
+
+    def __init__(self, path: str, leaseSeconds: float = 120.0, maxAttempts: int = 3) -> None:
+        """
+        Opens or creates a queue.
+
+        Args:
+            path (str): The SQLite file holding the queue
+            leaseSeconds (float): The number of seconds a lease lasts without a heartbeat
+            maxAttempts (int): The number of times an item is attempted before it is recorded as failed
+        """
+
+        self.path = path
+        self.leaseSeconds = leaseSeconds
+        self.maxAttempts = maxAttempts
+        self.lock = threading.Lock()
+
+        #open the queue in autocommit mode, taking write locks explicitly, and wait on other workers' writes rather than failing
+        self.connection = sqlite3.connect(path, timeout=60.0, isolation_level=None, check_same_thread=False)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS tasks (id INTEGER PRIMARY KEY, kind TEXT NOT NULL, items TEXT NOT NULL, state TEXT NOT NULL, worker TEXT, lease_expires REAL, attempts INTEGER NOT NULL DEFAULT 0)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS recipe_urls (url TEXT PRIMARY KEY)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS failed_items (kind TEXT NOT NULL, item TEXT NOT NULL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, kind)')
+
+
+    def transaction(self) -> None:
+        """
+        Begins a transaction holding the queue's write lock, so that concurrent workers never claim the same task.
+
+        The caller must hold the queue's thread lock, and commit or roll back the transaction.
+
+        Returns:
+            None
+        """
+
+        self.connection.execute('BEGIN IMMEDIATE')
+
+
+    def addTasks(self, kind: str, items: Iterable[any], batchSize: int, attempts: int = 0) -> int:
+        """
+        Adds items to the queue, split into tasks of a given size.
+
+        Recipe urls already queued are skipped.
+
+        Args:
+            kind (str): The kind of work, either 'pages' or 'recipes'
+            items (Iterable[any]): The search page numbers or recipe urls to add
+            batchSize (int): The maximum number of items in each task
+            attempts (int): The number of times the items have already been attempted
+
+        Returns:
+            int: The number of items added
+        """
+
+        with self.lock:
+            self.transaction()
+
+            try:
+                added = self.insertTasks(kind, items, batchSize, attempts)
+                self.connection.execute('COMMIT')
+            except(Exception):
+                self.connection.execute('ROLLBACK')
+                raise
+
+        return added
+
+
+    def insertTasks(self, kind: str, items: Iterable[any], batchSize: int, attempts: int) -> int:
+        """
+        Inserts items as tasks within the current transaction, skipping recipe urls already queued.
+
+        Args:
+            kind (str): The kind of work, either 'pages' or 'recipes'
+            items (Iterable[any]): The search page numbers or recipe urls to add
+            batchSize (int): The maximum number of items in each task
+            attempts (int): The number of times the items have already been attempted
+
+        Returns:
+            int: The number of items inserted
+        """
+
+        newItems = []
+
+        for item in items:
+            #deduplicate newly discovered recipe urls against every url queued before
+            if kind == RECIPES and attempts == 0:
+                if self.connection.execute('INSERT OR IGNORE INTO recipe_urls (url) VALUES (?)', (item,)).rowcount == 0:
+                    continue
+
+            newItems.append(item)
+
+        batchSize = max(1, batchSize)
+
+        for start in range(0, len(newItems), batchSize):
+            self.connection.execute('INSERT INTO tasks (kind, items, state, attempts) VALUES (?, ?, ?, ?)', (kind, json.dumps(newItems[start:start + batchSize]), PENDING, attempts))
+
+        return len(newItems)
+
+
+    def claim(self, workerId: str) -> Lease | None:
+        """
+        Leases the next pending task to a worker, first returning any expired leases to the queue.
+
+        An expired lease counts as an attempt at its task, so a task whose leases keep expiring, such as one that crashes every worker taking it, is recorded as failed once it has been attempted the maximum number of times.
+        Search pages are leased before recipes, so that discovery stays ahead of detail scraping.
+
+        Args:
+            workerId (str): The id of the worker claiming the task
+
+        Returns:
+            Lease | None: The task leased, or None if no task is pending
+        """
+
+        now = time.time()
+
+        with self.lock:
+            self.transaction()
+
+            try:
+                self.expireLeases(now)
+                row = self.connection.execute('SELECT id, kind, items, attempts FROM tasks WHERE state = ? ORDER BY kind = ?, id LIMIT 1', (PENDING, RECIPES)).fetchone()
+
+                if row:
+                    self.connection.execute('UPDATE tasks SET state = ?, worker = ?, lease_expires = ? WHERE id = ?', (LEASED, workerId, now + self.leaseSeconds, row[0]))
+
+                self.connection.execute('COMMIT')
+            except(Exception):
+                self.connection.execute('ROLLBACK')
+                raise
+
+        return Lease(row[0], row[1], json.loads(row[2]), row[3]) if row else None
+
+
+    def expireLeases(self, now: float) -> None:
+        """
+        Returns the tasks of expired leases to the queue within the current transaction, counting each expiry as an attempt.
+
+        Tasks that have run out of attempts are marked as failed and their items recorded as failed.
+
+        Args:
+            now (float): The current time
+
+        Returns:
+            None
+        """
+
+        expired = self.connection.execute('SELECT id, kind, items, attempts FROM tasks WHERE state = ? AND lease_expires < ?', (LEASED, now)).fetchall()
+
+        for taskId, kind, items, attempts in expired:
+            if attempts + 1 < self.maxAttempts:
+                self.connection.execute('UPDATE tasks SET state = ?, worker = NULL, lease_expires = NULL, attempts = ? WHERE id = ?', (PENDING, attempts + 1, taskId))
+            else:
+                self.connection.execute('UPDATE tasks SET state = ?, worker = NULL, lease_expires = NULL, attempts = ? WHERE id = ?', (FAILED, attempts + 1, taskId))
+                self.connection.executemany('INSERT INTO failed_items (kind, item) VALUES (?, ?)', [(kind, str(item)) for item in json.loads(items)])
+
+
+    def heartbeat(self, lease: Lease, workerId: str) -> bool:
+        """
+        Extends a lease held by a worker.
+
+        Args:
+            lease (Lease): The lease to extend
+            workerId (str): The id of the worker holding it
+
+        Returns:
+            bool: Whether the worker still held the lease, which it loses if the lease expired and was claimed by another worker
+        """
+
+        with self.lock:
+            cursor = self.connection.execute('UPDATE tasks SET lease_expires = ? WHERE id = ? AND worker = ? AND state = ?', (time.time() + self.leaseSeconds, lease.taskId, workerId, LEASED))
+
+        return cursor.rowcount > 0
+
+
+    def complete(self, lease: Lease, workerId: str, discoveredUrls: Iterable[str] = (), failedItems: Iterable[any] = (), urlsPerTask: int = 50) -> bool:
+        """
+        Marks a lease as done, atomically queuing the recipe urls it discovered and retrying the items that failed.
+
+        Failed items are queued again in a new task until they have been attempted the maximum number of times, after which they are recorded as failed.
+        Completing a lease the worker no longer holds, because it expired and was returned to the queue or claimed by another worker, changes nothing.
+
+        Args:
+            lease (Lease): The lease completed
+            workerId (str): The id of the worker holding it
+            discoveredUrls (Iterable[str]): The recipe urls found on the lease's search pages
+            failedItems (Iterable[any]): The items of the lease that could not be processed
+            urlsPerTask (int): The maximum number of recipe urls in each task queued
+
+        Returns:
+            bool: Whether the worker still held the lease, and so completed it
+        """
+
+        failedItems = list(failedItems)
+
+        with self.lock:
+            self.transaction()
+
+            try:
+                held = self.connection.execute('UPDATE tasks SET state = ?, worker = NULL, lease_expires = NULL WHERE id = ? AND worker = ? AND state = ?', (DONE, lease.taskId, workerId, LEASED)).rowcount > 0
+
+                if held:
+                    self.insertTasks(RECIPES, discoveredUrls, urlsPerTask, 0)
+
+                    #retry the failed items unless they have run out of attempts
+                    if lease.attempts + 1 < self.maxAttempts:
+                        self.insertTasks(lease.kind, failedItems, len(failedItems), lease.attempts + 1)
+                    else:
+                        self.connection.executemany('INSERT INTO failed_items (kind, item) VALUES (?, ?)', [(lease.kind, str(item)) for item in failedItems])
+
+                self.connection.execute('COMMIT')
+            except(Exception):
+                self.connection.execute('ROLLBACK')
+                raise
+
+        return held
+
+
+    def release(self, lease: Lease, workerId: str) -> None:
+        """
+        Returns a lease to the queue without completing it, such as when a worker is stopped.
+
+        A lease the worker no longer holds is left as it is.
+
+        Args:
+            lease (Lease): The lease to return
+            workerId (str): The id of the worker holding it
+
+        Returns:
+            None
+        """
+
+        with self.lock:
+            self.connection.execute('UPDATE tasks SET state = ?, worker = NULL, lease_expires = NULL WHERE id = ? AND worker = ? AND state = ?', (PENDING, lease.taskId, workerId, LEASED))
+
+
+    def getCounts(self) -> Dict[str, Dict[str, int]]:
+        """
+        Counts the tasks of each kind in each state.
+
+        Returns:
+            Dict[str, Dict[str, int]]: The number of tasks, keyed by kind and then state
+        """
+
+        with self.lock:
+            rows = self.connection.execute('SELECT kind, state, COUNT(*) FROM tasks GROUP BY kind, state').fetchall()
+
+        counts = {}
+
+        for kind, state, count in rows:
+            counts.setdefault(kind, {})[state] = count
+
+        return counts
+
+
+    def isEmpty(self) -> bool:
+        """
+        Determines whether any work has been added to the queue, so a crawl is only planned once.
+
+        Returns:
+            bool: Whether the queue holds no tasks
+        """
+
+        with self.lock:
+            return self.connection.execute('SELECT 1 FROM tasks LIMIT 1').fetchone() is None
+
+
+    def isFinished(self) -> bool:
+        """
+        Determines whether every task has been completed, so that no pending or leased work remains.
+
+        Returns:
+            bool: Whether the crawl is finished
+        """
+
+        with self.lock:
+            return self.connection.execute('SELECT 1 FROM tasks WHERE state IN (?, ?) LIMIT 1', (PENDING, LEASED)).fetchone() is None
+
+
+    def getFailedItems(self) -> List[Dict[str, str]]:
+        """
+        Obtains the items that failed on every attempt.
+
+        Returns:
+            List[Dict[str, str]]: The kind of each failed item and the item itself
+        """
+
+        with self.lock:
+            return [{'kind': kind, 'item': item} for kind, item in self.connection.execute('SELECT kind, item FROM failed_items').fetchall()]
+
+
+    def close(self) -> None:
+        """
+        Closes the queue.
+
+        Returns:
+            None
+        """
+
+        with self.lock:
+            self.connection.close()
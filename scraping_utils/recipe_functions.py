@@ -0,0 +1,364 @@
+#import the necessary modules
+import itertools
+import math
+import sys
+from array import array
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Tuple
+from text_utils.text_manipulation import PendingRawIngredients
+
+
+class Recipe(NamedTuple):
+    """
+    The details of a recipe, as found by getRecipeDetails and read back from a recipe details file.
+
+    A Recipe is a tuple in the order of the recipe details header, so it can be used wherever the plain details tuple was, with its fields also readable by name.
+    Its list fields are held as tuples, and its repeated strings are interned by createRecipe, so that recipes share a single copy of each ingredient name, author and difficulty level.
+    It is a typing convenience rather than a memory saving, taking about as much memory as a dictionary row, so large datasets should be held in a RecipeBatch.
+
+    Attributes:
+        title (str | None): The title of the recipe
+        imageLink (str | None): The url of the recipe image
+        rawIngredients (Tuple[str, ...] | PendingRawIngredients): The raw ingredient names, or the names pending resolution if deferred
+        measuredIngredients (Tuple[str, ...]): The ingredients with their measurements
+        method (Tuple[str, ...]): The cooking steps
+        author (str | None): The author of the recipe
+        prepTime (int | None): The preparation time in minutes
+        cookTime (int | None): The cooking time in minutes
+        difficultyLevel (str | None): The difficulty level of the recipe
+        rating (float | None): The average rating of the recipe
+        ratingsCount (int | None): The number of ratings given
+        calories, fat, saturates, carbs, sugars, fibre, protein, salt (float | None): The nutritional information
+    """
+
+    title: str | None
+    imageLink: str | None
+    rawIngredients: Tuple[str, ...] | PendingRawIngredients
+    measuredIngredients: Tuple[str, ...]
+    method: Tuple[str, ...]
+    author: str | None
+    prepTime: int | None
+    cookTime: int | None
+    difficultyLevel: str | None
+    rating: float | None
+    ratingsCount: int | None
+    calories: float | None
+    fat: float | None
+    saturates: float | None
+    carbs: float | None
+    sugars: float | None
+    fibre: float | None
+    protein: float | None
+    salt: float | None
+
+
+#define the fields drawn from a small vocabulary, whose strings are interned, and the list fields held as tuples
+internedFields = ('rawIngredients', 'author', 'difficultyLevel')
+listFields = ('rawIngredients', 'measuredIngredients', 'method')
+
+#define the numeric fields a RecipeBatch holds in typed arrays, and the value standing in for a missing integer or code
+integerFields = ('prepTime', 'cookTime', 'ratingsCount')
+numberFields = ('rating', 'calories', 'fat', 'saturates', 'carbs', 'sugars', 'fibre', 'protein', 'salt')
+missingInteger = -1
+
+#define the text fields a RecipeBatch dictionary encodes, and the list fields it concatenates into a single string per recipe
+encodedFields = ('author', 'difficultyLevel')
+joinedFields = ('measuredIngredients', 'method')
+
+#find the position of each kind of field
+internedPositions = frozenset(Recipe._fields.index(field) for field in internedFields)
+listPositions = frozenset(Recipe._fields.index(field) for field in listFields)
+
+
+def internText(value: any) -> any:
+    """
+    Interns a string, so that every recipe holding the same string shares one copy of it.
+
+    Args:
+        value (any): The value to intern
+
+    Returns:
+        any: The interned string, or the value unchanged if it is not a string
+    """
+
+    return sys.intern(value) if type(value) is str else value
+
+
+def createRecipe(details: Iterable[any]) -> Recipe:
+    """
+    Creates a Recipe from the values of a recipe's details, in the order of the recipe details header.
+
+    List fields are converted to tuples, and ingredient names, authors and difficulty levels are interned.
+    Raw ingredients pending resolution are kept as they are.
+
+    Args:
+        details (Iterable[any]): The recipe details, such as a plain details tuple or a Recipe received from another process
+
+    Returns:
+        Recipe: The recipe
+    """
+
+    values = []
+
+    for position, value in enumerate(details):
+        if position in listPositions and isinstance(value, (list, tuple)) and not isinstance(value, PendingRawIngredients):
+            value = tuple(internText(item) for item in value) if position in internedPositions else tuple(value)
+        elif position in internedPositions:
+            value = internText(value)
+
+        values.append(value)
+
+    return Recipe(*values)
+
+
+class RecipeBatch:
+    """
+    A column oriented container of many recipes, holding far less memory than a list of recipe rows.
+
+    The times, ratings count, rating and nutrients are stored in typed arrays, with missing integers stored as -1 and missing numbers as NaN.
+    Authors, difficulty levels and raw ingredient names are dictionary encoded against a vocabulary shared by the whole batch, the raw ingredients of every recipe being held in one array of codes.
+    The measured ingredients and method steps of each recipe are concatenated into a single string, with where each item ends held in a typed array, so a recipe holds one string per field rather than one per item and any item text is read back exactly.
+    Recipes are appended and read back as Recipe tuples, with missing lists read back as empty, while the url each was scraped from, if known, is held in urls at the same position.
+    """
+
+    def __init__(self, recipes: Iterable[Tuple[str | None, Tuple[any]]] = ()) -> None:
+        """
+        Creates a batch, holding any recipes given.
+
+        Args:
+            recipes (Iterable[Tuple[str | None, Tuple[any]]]): The pairs of each recipe url, or None if not known, and its details
+        """
+
+        self.urls = []
+        self.vocabulary = []
+        self.codes = {}
+        self.columns = {}
+
+        for field in Recipe._fields:
+            if field in integerFields or field in encodedFields:
+                self.columns[field] = array('i')
+            elif field in numberFields:
+                self.columns[field] = array('d')
+            elif field == 'rawIngredients':
+                self.columns[field] = array('I')
+            else:
+                self.columns[field] = []
+
+        #hold where each recipe's items of each list field begin, with the end of the last recipe's last
+        self.offsets = {field: array('I', [0]) for field in listFields}
+
+        #hold where each item of a concatenated field ends within its recipe's string
+        self.itemEnds = {field: array('I') for field in joinedFields}
+
+        self.extend(recipes)
+
+
+    def encode(self, text: str | None) -> int:
+        """
+        Finds the code of a string in the batch's vocabulary, adding it if new.
+
+        Args:
+            text (str | None): The string to encode
+
+        Returns:
+            int: The code of the string, or -1 if it is None
+        """
+
+        if text is None:
+            return missingInteger
+
+        code = self.codes.get(text)
+
+        if code is None:
+            code = self.codes[text] = len(self.vocabulary)
+            self.vocabulary.append(internText(text))
+
+        return code
+
+
+    def decode(self, code: int) -> str | None:
+        """
+        Finds the string a code of the batch's vocabulary stands for.
+
+        Args:
+            code (int): The code of the string
+
+        Returns:
+            str | None: The string, or None if the code stands for a missing value
+        """
+
+        return None if code == missingInteger else self.vocabulary[code]
+
+
+    def append(self, url: str | None, details: Tuple[any]) -> None:
+        """
+        Adds a recipe to the batch.
+
+        Every value is converted before any is added, so a recipe that cannot be held raises a ValueError, TypeError or OverflowError and leaves the batch unchanged rather than misaligning its columns.
+        Raw ingredient names that are None are skipped.
+
+        Args:
+            url (str | None): The url the recipe was scraped from, or None if not known
+            details (Tuple[any]): The recipe details, in the order of the recipe details header, with any raw ingredients resolved
+
+        Returns:
+            None
+        """
+
+        details = tuple(details)
+
+        if len(details) != len(Recipe._fields):
+            raise ValueError(f'Expected {len(Recipe._fields)} recipe details, found {len(details)}')
+
+        values = dict(zip(Recipe._fields, details))
+
+        #convert the numeric fields into typed arrays of their own first, so that any value that cannot be held raises here
+        integers = array('i', (missingInteger if values[field] is None else int(values[field]) for field in integerFields))
+        numbers = array('d', (math.nan if values[field] is None else float(values[field]) for field in numberFields))
+
+        #check the text and list fields hold only strings, skipping missing raw ingredient names
+        for field in encodedFields:
+            if values[field] is not None and not isinstance(values[field], str):
+                raise TypeError(f'{field} must be a string or None, found {type(values[field]).__name__}')
+
+        lists = {field: tuple(item for item in values[field] or () if field != 'rawIngredients' or item is not None) for field in listFields}
+
+        for field, items in lists.items():
+            if any(not isinstance(item, str) for item in items):
+                raise TypeError(f'{field} must hold only strings')
+
+        #add the recipe, which can no longer fail part way through
+        self.urls.append(url)
+
+        for field, value in zip(integerFields, integers):
+            self.columns[field].append(value)
+
+        for field, value in zip(numberFields, numbers):
+            self.columns[field].append(value)
+
+        for field in encodedFields:
+            self.columns[field].append(self.encode(values[field]))
+
+        self.columns['rawIngredients'].extend(self.encode(name) for name in lists['rawIngredients'])
+
+        for field in joinedFields:
+            self.columns[field].append(''.join(lists[field]))
+            self.itemEnds[field].extend(itertools.accumulate(len(item) for item in lists[field]))
+
+        for field in listFields:
+            self.offsets[field].append(self.offsets[field][-1] + len(lists[field]))
+
+        for field in Recipe._fields:
+            if field not in integerFields and field not in numberFields and field not in encodedFields and field not in listFields:
+                self.columns[field].append(values[field])
+
+
+    def extend(self, recipes: Iterable[Tuple[str | None, Tuple[any]]]) -> None:
+        """
+        Adds many recipes to the batch.
+
+        Args:
+            recipes (Iterable[Tuple[str | None, Tuple[any]]]): The pairs of each recipe url, or None if not known, and its details
+
+        Returns:
+            None
+        """
+
+        for url, details in recipes:
+            self.append(url, details)
+
+
+    def getValue(self, field: str, index: int) -> any:
+        """
+        Obtains a single field of a recipe of the batch, decoded to the type it has in a Recipe.
+
+        Args:
+            field (str): The name of the field, as in Recipe
+            index (int): The position of the recipe
+
+        Returns:
+            any: The value of the field, or None if missing
+        """
+
+        value = self.columns[field] if field == 'rawIngredients' else self.columns[field][index]
+
+        if field in listFields:
+            start, end = self.offsets[field][index], self.offsets[field][index + 1]
+
+        if field in integerFields:
+            return None if value == missingInteger else value
+        elif field in numberFields:
+            return None if math.isnan(value) else value
+        elif field in encodedFields:
+            return self.decode(value)
+        elif field == 'rawIngredients':
+            return tuple(self.vocabulary[code] for code in value[start:end])
+        elif field in joinedFields:
+            itemEnds = self.itemEnds[field][start:end]
+            return tuple(value[itemStart:itemEnd] for itemStart, itemEnd in zip(itertools.chain((0,), itemEnds), itemEnds))
+
+        return value
+
+
+    def column(self, field: str) -> array | List[any]:
+        """
+        Obtains every recipe's value of a field, without creating a Recipe for each.
+
+        Args:
+            field (str): The name of the field, as in Recipe
+
+        Returns:
+            array | List[any]: The typed array of a numeric field, with missing values as -1 or NaN, or the list of decoded values of any other field
+        """
+
+        if field in integerFields or field in numberFields:
+            return self.columns[field]
+
+        return [self.getValue(field, index) for index in range(len(self))]
+
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+
+    def __getitem__(self, index: int) -> Recipe:
+        """
+        Obtains a recipe of the batch.
+
+        Args:
+            index (int): The position of the recipe
+
+        Returns:
+            Recipe: The recipe
+        """
+
+        if index < 0:
+            index += len(self)
+
+        if not 0 <= index < len(self):
+            raise IndexError('RecipeBatch index out of range')
+
+        return Recipe(*(self.getValue(field, index) for field in Recipe._fields))
+
+
+    def __iter__(self) -> Iterator[Recipe]:
+        """
+        Iterates over the recipes of the batch, in the order of its urls.
+
+        Returns:
+            Iterator[Recipe]: The recipes
+        """
+
+        for index in range(len(self)):
+            yield self[index]
+
+
+    def getStatistics(self) -> Dict[str, int]:
+        """
+        Obtains the size of the batch.
+
+        Returns:
+            Dict[str, int]: The number of recipes, the number of distinct encoded strings and the bytes held by the typed arrays
+        """
+
+        arrays = [column for column in self.columns.values() if isinstance(column, array)] + list(self.offsets.values()) + list(self.itemEnds.values())
+        return {'recipes': len(self), 'vocabulary': len(self.vocabulary), 'arrayBytes': sum(column.itemsize * len(column) for column in arrays)}
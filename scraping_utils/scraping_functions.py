@@ -1,14 +1,60 @@
 #import the necessary modules
-import requests
-from typing import List, Dict, Set, Tuple
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Dict, Iterable, Iterator, Set, Tuple
 from bs4 import BeautifulSoup
 from bs4.element import ResultSet
-from text_utils.text_manipulation import timeStringToMinutes, findFirstNumber, findRawIngredient
+from text_utils.text_manipulation import timeStringToMinutes, findFirstNumber, findRawIngredient, findRawIngredients, loadIngredientParser, PendingRawIngredients
+from text_utils.ingredient_cache import configureIngredientCache, getIngredientCache, getIngredientCacheSettings, recordWorkerStatistics
+from scraping_utils.archive_functions import ArchiveRecord, PageArchive, archivePage, readArchivedPage
+from scraping_utils.concurrency_functions import boundedMap
+from scraping_utils.frontier_functions import UrlSet, canonicaliseUrl
+from scraping_utils.http_functions import fetchPage
+from scraping_utils.recipe_functions import Recipe, createRecipe
+from scraping_utils.parser_functions import configureParser, getParserSettings, makeSoup, parserBackends, searchSectionClasses
+from scraping_utils.structured_data_functions import extractStructuredFields, findRecipeNode, structuredFields
+from monitoring_utils.logging_functions import configureLogging, getLoggingSettings
+from monitoring_utils.metrics_functions import getMetrics
 
-headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
+logger = logging.getLogger(__name__)
 
+baseUrl = 'https://www.bbcgoodfood.com'
 
-def obtainIngredients(ingredients: ResultSet[any], precise: bool) -> Tuple[List[str]]:
+
+def configureBaseUrl(url: str) -> None:
+    """
+    Configures the site that search pages are requested from and recipe links resolved against, such as a local stand-in server.
+
+    Args:
+        url (str): The scheme and host of the site, without a trailing slash
+
+    Returns:
+        None
+    """
+
+    global baseUrl
+    baseUrl = url.rstrip('/')
+
+
+def getBaseUrl() -> str:
+    """
+    Obtains the site that search pages are requested from, so that it can be passed to worker processes.
+
+    Returns:
+        str: The scheme and host of the site
+    """
+
+    return baseUrl
+
+
+def obtainIngredients(ingredients: ResultSet[any], precise: bool, deferRaw: bool = False) -> Tuple[List[str] | PendingRawIngredients, List[str]]:
     """
     Finds the measured and raw ingredients from the ingredients content of a recipe page.
 
@@ -18,14 +64,16 @@ def obtainIngredients(ingredients: ResultSet[any], precise: bool) -> Tuple[List[
     Args:
         ingredients (ResultSet[any]): The content of the ingredients list from a recipe page
         precise (bool): Determines whether additional precision should be used for obtaining ingredient names
+        deferRaw (bool): Determines whether ingredients needing the NLP are left pending for resolveRawIngredients, rather than parsed individually
 
     Returns:
-        Tuple[List[str]]: The lists of both raw and measured ingredients obtained from the content parsed
+        Tuple[List[str] | PendingRawIngredients, List[str]]: The lists of both raw and measured ingredients obtained from the content parsed, with the raw ingredients pending if deferred
     """
 
-    #initialise the raw and measured ingredients as sets
+    #initialise the raw and measured ingredients as sets, along with the ingredients awaiting the NLP
     measuredIngredients = set()
     rawIngredients = set()
+    pendingIngredients = []
 
     #for each ingredient in the document, add it to the measured ingredient list
     for ingredient in ingredients:
@@ -34,7 +82,9 @@ def obtainIngredients(ingredients: ResultSet[any], precise: bool) -> Tuple[List[
 
         anchorTag = ingredient.find('a', class_='link--styled')
 
-        if (precise or not(anchorTag)):
+        if ((precise or not(anchorTag)) and deferRaw):
+            pendingIngredients.append(ingredientText)
+        elif (precise or not(anchorTag)):
             rawIngredient = findRawIngredient(ingredientText)
 
             if (rawIngredient):
@@ -42,9 +92,45 @@ def obtainIngredients(ingredients: ResultSet[any], precise: bool) -> Tuple[List[
         else:
             rawIngredients.add(anchorTag.get_text(strip=True).replace(',', ''))
 
+    #if deferring, return the known names alongside the ingredients awaiting the NLP
+    if (deferRaw):
+        return PendingRawIngredients(list(rawIngredients), pendingIngredients), list(measuredIngredients)
+
     return list(rawIngredients), list(measuredIngredients)
 
 
+def resolveRawIngredients(recipeDetails: List[Tuple[any] | None], batchSize: int = 256) -> List[Tuple[any] | None]:
+    """
+    Resolves the deferred raw ingredients of many recipes in a single batched NLP stage.
+
+    The pending ingredient strings of every recipe are pooled, parsed together with findRawIngredients, and the names found scattered back to their recipes.
+    Recipes without pending raw ingredients, and None entries, are returned unchanged.
+
+    Args:
+        recipeDetails (List[Tuple[any] | None]): The recipe tuples, as returned with deferred raw ingredients
+        batchSize (int): The number of distinct uncached strings passed to the parser at once
+
+    Returns:
+        List[Tuple[any] | None]: The recipe tuples with their raw ingredients resolved to lists of names
+    """
+
+    #pool the pending ingredient strings of every recipe
+    pooledTexts = [text for details in recipeDetails if details and isinstance(details[2], PendingRawIngredients) for text in details[2].pending]
+    names = iter(findRawIngredients(pooledTexts, batchSize))
+    resolvedDetails = []
+
+    #scatter the names back to each recipe in turn, combining them with the names already known
+    for details in recipeDetails:
+        if details and isinstance(details[2], PendingRawIngredients):
+            rawIngredients = set(details[2].resolved)
+            rawIngredients.update(name for name in (next(names) for _ in details[2].pending) if name)
+            details = createRecipe(details[:2] + (list(rawIngredients),) + details[3:])
+
+        resolvedDetails.append(details)
+
+    return resolvedDetails
+
+
 def obtainNutrients(nutritionalContent: ResultSet[any]) -> Dict[str, float]:
     """
     Finds the nutrient information from the nutritional content section of a recipe page.
@@ -70,83 +156,741 @@ def obtainNutrients(nutritionalContent: ResultSet[any]) -> Dict[str, float]:
             #add the key-value pair to the dictionary
             nutrients[nutrientType] = nutrientValue
 
-        #if a key-value pair cannot be accessed correctly, silently proceed
-        except(Exception):
-            pass
+        #if a key-value pair cannot be accessed correctly, count the failure and proceed
+        except(Exception) as e:
+            getMetrics().increment('scraper_extraction_failures_total', {'field': 'nutrients'})
+            logger.debug('Skipping unreadable nutrient row: %s', e)
     
     #return the populated dictionary of nutrient information
     return nutrients          
     
 
-def getRecipeUrlsFromPages(startPage: int, endPage: int) -> Set[str]:
+def getRecipeUrlsFromPage(page: int) -> List[str] | None:
     """
-    Finds the recipe urls from the search pages specified.
+    Finds the recipe urls from a single search page.
 
-    Requests the html content of the given pages and scrapes them to obtain a set of recipe urls.
+    Requests the html content of the given page and scrapes it to obtain a list of recipe urls.
     
     Args:
-        startPage (int): The page to begin url scraping on
-        endPage (int): The page to end url scraping on
+        page (int): The search page number to scrape
 
     Returns:
-        Set[str]: The set of recipe urls found.
+        List[str] | None: The list of recipe urls found, or None if the page cannot be reached
     """
 
-    #set the base url and initialise an empty recipe url set
-    baseUrl = 'https://www.bbcgoodfood.com'
-    recipeUrls = set()
+    #generate a url for the page and log the current page under inspection
+    url = f'{baseUrl}/search?page={page}'
+    logger.info('At page %d scraping %s', page, url, extra={'page': page})
 
-    #for each page to inspect, generate a url and obtain the response with an appropriate request
-    for page in range(startPage, endPage + 1):
-        url = f'{baseUrl}/search?page={page}'
-        response = requests.get(url, headers=headers)
+    #obtain the html content of the page through the shared client
+    html = fetchPage(url)
 
-        #print the current page under inspection
-        print(f"At page {page} scraping {url}")
+    #if the page cannot be loaded correctly, log an error and return None
+    if html is None:
+        getMetrics().increment('scraper_search_pages_total', {'result': 'fetch_failed'})
+        logger.warning('Failed to retrieve page %d.', page, extra={'page': page})
+        return None
 
-        #if the page cannot be loaded correctly, print an error and continue with the next page
-        if response.status_code != 200:
-            print(f"Failed to retrieve page {page}. Continuing to the next page...")
-            break
+    recipeUrls = []
 
-        #instantiate a new soup object as a html parser over the response received
-        soup = BeautifulSoup(response.text, 'html.parser')
+    with getMetrics().timeStage('parse'):
+        #instantiate a new soup object over the recipe cards section of the html received
+        soup = makeSoup(html, searchSectionClasses)
 
         try:
             #obtain the recipe cards div on the page and generate a set of anchor tag links
             recipeCards = soup.find('div', class_='layout-md-rail__primary')
             recipeAnchorTags = recipeCards.find_all('a', class_='link d-block')
 
-            #for each anchor tag, obtain its link and add it to the recipe url set
+            #for each anchor tag, obtain its canonical link and add it to the recipe url list
             for anchorTag in recipeAnchorTags:
-                link = f'{baseUrl}{anchorTag['href']}'
-                recipeUrls.add(link)            
-        
-        #if an exception is thrown whilst extracting the data, output the failure and return None
+                link = canonicaliseUrl(f'{baseUrl}{anchorTag["href"]}')
+                recipeUrls.append(link)
+
+        #if an exception is thrown whilst extracting the data, output the failure
         except(Exception):
-            print(f'Error occured accessing recipe at page number {page}')
+            getMetrics().increment('scraper_search_pages_total', {'result': 'extract_failed'})
+            logger.warning('Error occured accessing recipe at page number %d', page, extra={'page': page})
+            return recipeUrls
 
-    return recipeUrls 
+    getMetrics().increment('scraper_search_pages_total', {'result': 'ok'})
+    return recipeUrls
 
 
-def getRecipeDetails(recipeUrl: str, precise: bool) -> Tuple[any] | None:
+def iterRecipeUrlsFromPages(startPage: int, endPage: int, concurrency: int = 1) -> Iterator[str]:
+    """
+    Lazily finds the recipe urls from the search pages specified.
+
+    Up to the given number of pages are requested at once, and the new urls on each page are yielded as soon as it is parsed.
+    Pages are only requested as urls are consumed, and a page that cannot be reached is skipped.
+    The urls already yielded are held in a UrlSet, so memory use stays flat however many pages are crawled.
+    
+    Args:
+        startPage (int): The page to begin url scraping on
+        endPage (int): The page to end url scraping on
+        concurrency (int): The maximum number of pages to request at once
+
+    Returns:
+        Iterator[str]: The distinct canonical recipe urls found
+    """
+
+    #initialise an empty set of the urls already yielded
+    with UrlSet() as seenUrls:
+
+        #for each page inspected, yield the urls not already seen
+        for page, pageUrls in boundedMap(getRecipeUrlsFromPage, range(startPage, endPage + 1), concurrency):
+
+            #if the page cannot be loaded correctly, continue with the next page
+            if pageUrls is None:
+                logger.info('Continuing to the next page...')
+                continue
+
+            for url in pageUrls:
+                if seenUrls.add(url):
+                    yield url
+
+
+def getRecipeUrlsFromPages(startPage: int, endPage: int, concurrency: int = 1) -> Set[str]:
+    """
+    Finds the recipe urls from the search pages specified.
+
+    Requests the html content of the given pages and scrapes them to obtain a set of recipe urls.
+    Up to the given number of pages are requested at once, and a page that cannot be reached is skipped.
+    
+    Args:
+        startPage (int): The page to begin url scraping on
+        endPage (int): The page to end url scraping on
+        concurrency (int): The maximum number of pages to request at once
+
+    Returns:
+        Set[str]: The set of recipe urls found.
+    """
+
+    return set(iterRecipeUrlsFromPages(startPage, endPage, concurrency))
+
+
+def getAvailableCores() -> int:
+    """
+    Finds the number of cores available to this process.
+
+    Returns:
+        int: The number of available cores
+    """
+
+    try:
+        return len(os.sched_getaffinity(0))
+    except(AttributeError):
+        return os.cpu_count() or 1
+
+
+def initialiseExtractionWorker(settings: Dict[str, any], cacheSettings: Dict[str, any], loggingSettings: Dict[str, str]) -> None:
+    """
+    Prepares an extraction worker process, loading the ingredient parser model once so that no recipe pays for it.
+
+    Args:
+        settings (Dict[str, any]): The parser settings of the parent process
+        cacheSettings (Dict[str, any]): The ingredient cache settings of the parent process
+        loggingSettings (Dict[str, str]): The logging settings of the parent process
+
+    Returns:
+        None
+    """
+
+    configureLogging(**loggingSettings)
+    configureParser(**settings)
+    configureIngredientCache(**cacheSettings)
+    loadIngredientParser()
+
+
+def extractRecipeDetailsFromBytes(htmlBytes: bytes, recipeUrl: str, precise: bool, deferRaw: bool = False) -> Tuple[Tuple[any] | None, str, Tuple[int, Dict[str, int]], Dict[str, List]]:
+    """
+    Finds the recipe details from the raw html bytes of a recipe page, for use in an extraction worker process.
+
+    Taking bytes keeps the payload sent to the worker small.
+    Only the recipe tuple, its extraction path, the worker's ingredient cache statistics and the metrics it recorded are sent back.
+
+    Args:
+        htmlBytes (bytes): The utf-8 encoded html content of the recipe page
+        recipeUrl (str): The recipe page url the content was obtained from
+        precise (bool): Determines whether additional precision should be used for obtaining ingredient names
+        deferRaw (bool): Determines whether ingredients needing the NLP are left pending for resolveRawIngredients
+
+    Returns:
+        Tuple[Tuple[any] | None, str, Tuple[int, Dict[str, int]], Dict[str, List]]: The tuple of recipe attributes and its extraction path, as returned by extractRecipeDetailsWithSource, the worker's process id and cache statistics, and the metrics recorded since its last recipe
+    """
+
+    details, source = extractRecipeDetailsWithSource(htmlBytes.decode('utf-8'), recipeUrl, precise, deferRaw)
+    return details, source, (os.getpid(), getIngredientCache().getStatistics()), getMetrics().drain()
+
+
+def getRecipeDetailsMany(recipeUrls: Iterable[str], precise: bool, concurrency: int = 8, ordered: bool = False, processes: int = 0, ingredientBatchSize: int = 0, fetch: Callable[[str], str | None] | None = None) -> Iterator[Tuple[str, Tuple[any] | None]]:
+    """
+    Finds the recipe details from many urls concurrently.
+
+    Keeps up to the given number of recipe pages in flight at once, yielding each recipe's details as soon as they are obtained.
+    A recipe that cannot be reached or scraped yields None as its details, without affecting the others.
+    If processes are requested, fetching stays on the thread pool while html parsing and ingredient NLP run in a process pool, avoiding contention for the GIL.
+    If an ingredient batch size is given, raw ingredient NLP is deferred and run over the pooled ingredients of that many recipes at once, before they are yielded.
+    The metrics recorded by extraction processes are merged into this process's shared metrics.
+    
+    Args:
+        recipeUrls (Iterable[str]): The recipe page urls to scrape from
+        precise (bool): Determines whether additional precision should be used for obtaining ingredient names
+        concurrency (int): The maximum number of recipe pages to request at once, which should be at least the number of processes
+        ordered (bool): Determines whether details are yielded in the same order as the urls supplied
+        processes (int): The number of extraction processes to use, or zero to extract on the fetching threads
+        ingredientBatchSize (int): The number of recipes whose raw ingredients are resolved together, or zero to resolve each recipe's individually
+        fetch (Callable[[str], str | None] | None): The function obtaining the html content of each recipe page, or None to use fetchPage
+
+    Returns:
+        Iterator[Tuple[str, Tuple[any] | None]]: The pairs of each recipe url and its details, as returned by getRecipeDetails
+    """
+
+    #defer raw ingredient resolution to the batch stage if batching
+    deferRaw = ingredientBatchSize > 0
+
+    #create a process pool for extraction if requested, each worker loading the ingredient parser once
+    #the spawn method is used as forking a process that is running fetching threads is unsafe
+    extractionPool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'), initializer=initialiseExtractionWorker, initargs=(getParserSettings(), getIngredientCacheSettings(), getLoggingSettings())) if processes > 0 else None
+    metrics = getMetrics()
+
+    #define the scraping of a single url with the precision given
+    def getDetails(recipeUrl: str) -> Tuple[any] | None:
+        logger.debug('Obtaining details from URL %s', recipeUrl, extra={'url': recipeUrl})
+
+        with metrics.trackInFlight('scraper_recipes_in_flight'):
+            if extractionPool is None:
+                return getRecipeDetails(recipeUrl, precise, deferRaw, fetch)
+
+            #fetch the page on this thread and wait on its extraction in the process pool
+            html = (fetch or fetchPage)(recipeUrl)
+
+            if html is None:
+                metrics.increment('scraper_recipes_total', {'result': 'fetch_failed'})
+                logger.warning('Failed to retrieve recipe page %s.', recipeUrl, extra={'url': recipeUrl})
+                return None
+
+            archivePage(recipeUrl, html)
+
+            with metrics.trackInFlight('scraper_extractions_in_flight'):
+                details, source, (workerId, statistics), workerMetrics = extractionPool.submit(extractRecipeDetailsFromBytes, html.encode('utf-8'), recipeUrl, precise, deferRaw).result()
+
+            metrics.merge(workerMetrics)
+            recordExtractionSource(recipeUrl, source)
+            recordWorkerStatistics(workerId, statistics)
+
+            #intern the recipe's strings again, as they are copied on their way back from the worker
+            return createRecipe(details) if details else None
+
+    try:
+        if (not deferRaw):
+            yield from boundedMap(getDetails, recipeUrls, concurrency, ordered)
+            return
+
+        #gather completed recipes into batches, resolving the raw ingredients of each batch together
+        batch = []
+
+        for recipeUrl, details in boundedMap(getDetails, recipeUrls, concurrency, ordered):
+            batch.append((recipeUrl, details))
+
+            if (len(batch) >= ingredientBatchSize):
+                yield from zip([url for url, _ in batch], resolveRawIngredients([details for _, details in batch]))
+                batch = []
+
+        if (batch):
+            yield from zip([url for url, _ in batch], resolveRawIngredients([details for _, details in batch]))
+
+    finally:
+        if extractionPool:
+            extractionPool.shutdown(cancel_futures=True)
+
+
+def extractArchivedRecipeDetails(records: List[ArchiveRecord], precise: bool, deferRaw: bool = False) -> List[Tuple[str, Tuple[any] | None, str]]:
+    """
+    Finds the recipe details from a batch of archived recipe pages, reading each page straight from its shard.
+
+    If raw ingredients are deferred, those of the whole batch are resolved together once every page is extracted.
+    A record that cannot be read is logged and counted, yielding None as its details.
+
+    Args:
+        records (List[ArchiveRecord]): The locations of the archived pages
+        precise (bool): Determines whether additional precision should be used for obtaining ingredient names
+        deferRaw (bool): Determines whether the raw ingredients of the batch are resolved together
+
+    Returns:
+        List[Tuple[str, Tuple[any] | None, str]]: The url of each page, its recipe details as returned by extractRecipeDetails, and its extraction path, or 'unreadable' if the record could not be read
+    """
+
+    metrics = getMetrics()
+    results = []
+
+    for record in records:
+        #read the page from its shard, skipping a record that is missing or corrupt
+        try:
+            with metrics.timeStage('read'):
+                url, htmlBytes = readArchivedPage(record.path, record.offset, record.length)
+        except(Exception) as e:
+            metrics.increment('scraper_recipes_total', {'result': 'read_failed'})
+            logger.warning('Failed to read archived page %s: %s', record.url, e, extra={'url': record.url, 'error': type(e).__name__})
+            results.append((record.url, None, 'unreadable'))
+            continue
+
+        details, source = extractRecipeDetailsWithSource(htmlBytes, url, precise, deferRaw)
+        results.append((url, details, source))
+
+    if (deferRaw):
+        results = [(url, details, source) for (url, _, source), details in zip(results, resolveRawIngredients([details for _, details, _ in results]))]
+
+    return results
+
+
+def extractArchivedRecipeDetailsInWorker(records: List[ArchiveRecord], precise: bool, deferRaw: bool = False) -> Tuple[List[Tuple[str, Tuple[any] | None, str]], Tuple[int, Dict[str, int]], Dict[str, List]]:
+    """
+    Finds the recipe details from a batch of archived recipe pages, for use in an extraction worker process.
+
+    Only the locations of the pages are sent to the worker, which reads the pages itself, and only the recipe tuples are sent back.
+
+    Args:
+        records (List[ArchiveRecord]): The locations of the archived pages
+        precise (bool): Determines whether additional precision should be used for obtaining ingredient names
+        deferRaw (bool): Determines whether the raw ingredients of the batch are resolved together
+
+    Returns:
+        Tuple[List[Tuple[str, Tuple[any] | None, str]], Tuple[int, Dict[str, int]], Dict[str, List]]: The results, as returned by extractArchivedRecipeDetails, the worker's process id and cache statistics, and the metrics recorded since its last batch
+    """
+
+    results = extractArchivedRecipeDetails(records, precise, deferRaw)
+    return results, (os.getpid(), getIngredientCache().getStatistics()), getMetrics().drain()
+
+
+def iterArchivedRecipeDetails(directory: str, precise: bool, processes: int = 0, batchSize: int = 64, ingredientBatchSize: int = 0) -> Iterator[Tuple[str, Tuple[any] | None]]:
+    """
+    Finds the recipe details from every page in an archive, without making any requests.
+
+    The latest record of each url is extracted, in batches handed to a process pool sized as requested, each worker reading its pages straight from the shards.
+    Only the small location of each page passes between processes, so re-extraction is bound by the parsing and NLP rather than by reading the archive.
+    The metrics recorded by extraction processes are merged into this process's shared metrics.
+
+    Args:
+        directory (str): The directory holding the archive
+        precise (bool): Determines whether additional precision should be used for obtaining ingredient names
+        processes (int): The number of extraction processes to use, or zero to extract in this process
+        batchSize (int): The number of pages handed to a worker at once
+        ingredientBatchSize (int): The number of recipes whose raw ingredients are resolved together, replacing the batch size if given, or zero to resolve each recipe's individually
+
+    Returns:
+        Iterator[Tuple[str, Tuple[any] | None]]: The pairs of each recipe url and its details, as returned by getRecipeDetails
+    """
+
+    deferRaw = ingredientBatchSize > 0
+    batchSize = ingredientBatchSize if deferRaw else batchSize
+
+    #create a process pool for extraction if requested, each worker loading the ingredient parser once
+    extractionPool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'), initializer=initialiseExtractionWorker, initargs=(getParserSettings(), getIngredientCacheSettings(), getLoggingSettings())) if processes > 0 else None
+    metrics = getMetrics()
+
+    #define the extraction of a batch, in the pool if there is one
+    def extractBatch(records: List[ArchiveRecord]) -> List[Tuple[str, Tuple[any] | None, str]]:
+        if extractionPool is None:
+            results = extractArchivedRecipeDetails(records, precise, deferRaw)
+        else:
+            with metrics.trackInFlight('scraper_extractions_in_flight'):
+                results, (workerId, statistics), workerMetrics = extractionPool.submit(extractArchivedRecipeDetailsInWorker, records, precise, deferRaw).result()
+
+            metrics.merge(workerMetrics)
+            recordWorkerStatistics(workerId, statistics)
+            results = [(url, createRecipe(details) if details else None, source) for url, details, source in results]
+
+        for url, _, source in results:
+            recordExtractionSource(url, source)
+
+        return results
+
+    #define the batches of records, read from the index in shard order
+    def iterBatches(archive: PageArchive) -> Iterator[List[ArchiveRecord]]:
+        batch = []
+
+        for record in archive.iterRecords():
+            batch.append(record)
+
+            if (len(batch) >= batchSize):
+                yield batch
+                batch = []
+
+        if (batch):
+            yield batch
+
+    try:
+        with PageArchive(directory) as archive:
+            #keep two batches in flight per worker, so that no worker waits on the next batch
+            for records, results in boundedMap(extractBatch, iterBatches(archive), max(1, processes * 2)):
+                if (results is None):
+                    yield from ((record.url, None) for record in records)
+                    continue
+
+                yield from ((url, details) for url, details, _ in results)
+
+    finally:
+        if extractionPool:
+            extractionPool.shutdown(cancel_futures=True)
+
+
+def getRecipeDetails(recipeUrl: str, precise: bool, deferRaw: bool = False, fetch: Callable[[str], str | None] | None = None) -> Tuple[any] | None:
     """
     Finds the recipe details from a given url.
 
     Requests the html content of the given url page and scrapes useful information off and processes them.
+    If a page archive is configured, the page is appended to it before extraction.
     
     Args:
         recipeUrl (str): The recipe page url to scrape from
         precise (bool): Determines whether additional precision should be used for obtaining ingredient names
+        deferRaw (bool): Determines whether ingredients needing the NLP are left pending for resolveRawIngredients
+        fetch (Callable[[str], str | None] | None): The function obtaining the html content of the page, or None to use fetchPage
+
+    Returns:
+        Tuple[any] | None: The tuple of recipe attributes scraped from the url or None if the page cannot be reached, as described by extractRecipeDetails
+    """
+    #obtain the html content of the recipe page through the shared client
+    html = (fetch or fetchPage)(recipeUrl)
+
+    #if the page loaded did not load correctly, log an error and return None
+    if html is None:
+        getMetrics().increment('scraper_recipes_total', {'result': 'fetch_failed'})
+        logger.warning('Failed to retrieve recipe page %s.', recipeUrl, extra={'url': recipeUrl})
+        return None
+
+    #keep the page in the archive, if configured, so that it can be re-extracted later without requesting it again
+    archivePage(recipeUrl, html)
+
+    return extractRecipeDetails(html, recipeUrl, precise, deferRaw)
+
+
+def extractTitle(soup: BeautifulSoup, precise: bool, deferRaw: bool) -> Dict[str, any]:
+    """
+    Finds the title from the title section of a recipe page.
+
+    Args:
+        soup (BeautifulSoup): The parsed recipe page
+        precise (bool): Unused, accepted for consistency with the other extractors
+        deferRaw (bool): Unused, accepted for consistency with the other extractors
+
+    Returns:
+        Dict[str, any]: The title field
+    """
+
+    return {'title': soup.find('div', class_='post-header__title').get_text(strip=True)}
+
+
+def extractImageLink(soup: BeautifulSoup, precise: bool, deferRaw: bool) -> Dict[str, any]:
+    """
+    Finds the image link from the image section of a recipe page.
+
+    Args:
+        soup (BeautifulSoup): The parsed recipe page
+        precise (bool): Unused, accepted for consistency with the other extractors
+        deferRaw (bool): Unused, accepted for consistency with the other extractors
+
+    Returns:
+        Dict[str, any]: The image link field
+    """
+
+    return {'imageLink': soup.find('div', class_='image__container').find('img', class_='image__img')['src']}
+
+
+def extractIngredients(soup: BeautifulSoup, precise: bool, deferRaw: bool) -> Dict[str, any]:
+    """
+    Finds the raw and measured ingredients from the ingredients section of a recipe page.
+
+    Args:
+        soup (BeautifulSoup): The parsed recipe page
+        precise (bool): Determines whether additional precision should be used for obtaining ingredient names
+        deferRaw (bool): Determines whether ingredients needing the NLP are left pending for resolveRawIngredients
 
     Returns:
-        Tuple[any] | None: The tuple of recipe attributes scraped from the url or None if the page cannot be reached
+        Dict[str, any]: The raw and measured ingredient fields
+    """
+
+    #obtain the list of ingredients and derive the measured and raw ingredient lists
+    ingredients = soup.find('section', class_='recipe__ingredients').find_all('li')
+    rawIngredients, measuredIngredients = obtainIngredients(ingredients, precise, deferRaw)
+
+    return {'rawIngredients': rawIngredients, 'measuredIngredients': measuredIngredients}
+
+
+def extractAuthor(soup: BeautifulSoup, precise: bool, deferRaw: bool) -> Dict[str, any]:
+    """
+    Finds the author from the author section of a recipe page, if one exists.
+
+    Args:
+        soup (BeautifulSoup): The parsed recipe page
+        precise (bool): Unused, accepted for consistency with the other extractors
+        deferRaw (bool): Unused, accepted for consistency with the other extractors
+
+    Returns:
+        Dict[str, any]: The author field, which is None if the recipe has no author
+    """
+
+    #obtain the author div of the page, assigning the author if it exists
+    authorDiv = soup.find('div', class_='author-link')
+
+    return {'author': authorDiv.get_text(strip=True) if authorDiv else None}
+
+
+def extractMethod(soup: BeautifulSoup, precise: bool, deferRaw: bool) -> Dict[str, any]:
+    """
+    Finds the method steps from the method section of a recipe page.
+
+    Args:
+        soup (BeautifulSoup): The parsed recipe page
+        precise (bool): Unused, accepted for consistency with the other extractors
+        deferRaw (bool): Unused, accepted for consistency with the other extractors
+
+    Returns:
+        Dict[str, any]: The method field
+    """
+
+    #extract method steps and populate the method list with the steps found
+    steps = soup.find('section', class_='recipe__method-steps').find_all('p')
+
+    return {'method': [step.get_text(strip=True) for step in steps]}
+
+
+def extractTimes(soup: BeautifulSoup, precise: bool, deferRaw: bool) -> Dict[str, any]:
+    """
+    Finds the prep and cook times from the times section of a recipe page, each defaulting to zero.
+
+    Args:
+        soup (BeautifulSoup): The parsed recipe page
+        precise (bool): Unused, accepted for consistency with the other extractors
+        deferRaw (bool): Unused, accepted for consistency with the other extractors
+
+    Returns:
+        Dict[str, any]: The prep and cook time fields
+    """
+
+    #obtain the set of prep and cook times and set the times to zero
+    timeElements = soup.select('.post-header__cook-and-prep-time time')
+    prepTime=0
+    cookTime=0
+
+    #reassign the prep and cook times dependent upon their existence
+    if (len(timeElements) > 0):
+        prepTime = timeStringToMinutes(timeElements[0].get_text(strip=True))
+        if (len(timeElements) > 1):
+            cookTime = timeStringToMinutes(timeElements[1].get_text(strip=True))
+
+    return {'prepTime': prepTime, 'cookTime': cookTime}
+
+
+def extractDifficultyLevel(soup: BeautifulSoup, precise: bool, deferRaw: bool) -> Dict[str, any]:
+    """
+    Finds the difficulty level from the skill level section of a recipe page.
+
+    Args:
+        soup (BeautifulSoup): The parsed recipe page
+        precise (bool): Unused, accepted for consistency with the other extractors
+        deferRaw (bool): Unused, accepted for consistency with the other extractors
+
+    Returns:
+        Dict[str, any]: The difficulty level field
+    """
+
+    return {'difficultyLevel': soup.find('div', class_='post-header__skill-level').get_text(strip=True)}
+
+
+def extractRating(soup: BeautifulSoup, precise: bool, deferRaw: bool) -> Dict[str, any]:
+    """
+    Finds the rating and ratings count from the rating section of a recipe page.
+
+    Args:
+        soup (BeautifulSoup): The parsed recipe page
+        precise (bool): Unused, accepted for consistency with the other extractors
+        deferRaw (bool): Unused, accepted for consistency with the other extractors
+
+    Returns:
+        Dict[str, any]: The rating and ratings count fields
+    """
+
+    #obtain the rating and ratings count parent div
+    ratingsDiv = soup.find('div', class_='rating__values')
+
+    #find the rating and ratings count numbers by finding the first numerical value in the string
+    rating = findFirstNumber(ratingsDiv.find('span', class_='sr-only').get_text(strip=True))
+    ratingsCount = int(findFirstNumber(ratingsDiv.find('span', class_='rating__count-text').get_text(strip=True)))
+
+    return {'rating': rating, 'ratingsCount': ratingsCount}
+
+
+def extractNutrients(soup: BeautifulSoup, precise: bool, deferRaw: bool) -> Dict[str, any]:
+    """
+    Finds the nutrient fields from the nutrition table of a recipe page.
+
+    Args:
+        soup (BeautifulSoup): The parsed recipe page
+        precise (bool): Unused, accepted for consistency with the other extractors
+        deferRaw (bool): Unused, accepted for consistency with the other extractors
+
+    Returns:
+        Dict[str, any]: The nutrient fields, each of which is None if absent from the table
+    """
+
+    #obtain the nutrient information parent table
+    nutritionalContent = soup.find('table', class_='key-value-blocks').find_all('tr', class_='key-value-blocks__item')
+    nutrients = obtainNutrients(nutritionalContent)
+
+    return {'calories': nutrients.get('kcal'), 'fat': nutrients.get('fat'), 'saturates': nutrients.get('saturates'), 'carbs': nutrients.get('carbs'), 'sugars': nutrients.get('sugars'), 'fibre': nutrients.get('fibre'), 'protein': nutrients.get('protein'), 'salt': nutrients.get('salt')}
+
+
+#define the names of the recipe detail fields, in the order of the details tuple
+recipeFields = Recipe._fields
+
+#define the markup extractors, along with the class of the page section each reads and the fields each provides
+domExtractors = (
+    ('post-header__title', ('title',), extractTitle),
+    ('image__container', ('imageLink',), extractImageLink),
+    ('recipe__ingredients', ('rawIngredients', 'measuredIngredients'), extractIngredients),
+    ('author-link', ('author',), extractAuthor),
+    ('recipe__method-steps', ('method',), extractMethod),
+    ('post-header__cook-and-prep-time', ('prepTime', 'cookTime'), extractTimes),
+    ('post-header__skill-level', ('difficultyLevel',), extractDifficultyLevel),
+    ('rating__values', ('rating', 'ratingsCount'), extractRating),
+    ('key-value-blocks', ('calories', 'fat', 'saturates', 'carbs', 'sugars', 'fibre', 'protein', 'salt'), extractNutrients)
+)
+
+#initialise the counts of which extraction path served each recipe, shared between threads
+extractionSourceCounts = Counter()
+extractionSourceLock = threading.Lock()
+
+
+def recordExtractionSource(recipeUrl: str, source: str) -> None:
+    """
+    Records and logs which extraction path served a recipe.
+
+    Args:
+        recipeUrl (str): The recipe page url
+        source (str): The extraction path, one of 'json-ld', 'mixed' or 'dom'
+
+    Returns:
+        None
+    """
+
+    with extractionSourceLock:
+        extractionSourceCounts[source] += 1
+
+    logger.debug('Extracted details from URL %s via %s', recipeUrl, source, extra={'url': recipeUrl, 'source': source})
+
+
+def getExtractionSourceCounts() -> Dict[str, int]:
+    """
+    Obtains the number of recipes served by each extraction path so far, showing the coverage of the json-ld fast path.
+
+    Returns:
+        Dict[str, int]: The number of recipes, keyed by extraction path
+    """
+
+    with extractionSourceLock:
+        return dict(extractionSourceCounts)
+
+
+def extractRecipeDetailsWithSource(html: str | bytes, recipeUrl: str, precise: bool, deferRaw: bool = False) -> Tuple[Tuple[any] | None, str]:
+    """
+    Finds the recipe details from the html content of a recipe page, along with the extraction path that served them.
+
+    The fields are first taken from the page's schema.org Recipe json-ld, which is located without building a document tree.
+    Only the page sections needed for any fields still missing are then parsed and read, which always includes the image, ingredients, author, skill level and nutrition sections, as the json-ld either lacks their fields or gives them differently to the markup.
+    The recipe is served via 'json-ld' if the json-ld provided every field it can, via 'mixed' if some of those came from the markup instead, and via 'dom' if the json-ld provided nothing.
+    The time taken is recorded as the parse stage, and the outcome counted by extraction path, or by the fields that could not be extracted.
+
+    Args:
+        html (str | bytes): The html content of the recipe page
+        recipeUrl (str): The recipe page url the content was obtained from
+        precise (bool): Determines whether additional precision should be used for obtaining ingredient names
+        deferRaw (bool): Determines whether ingredients needing the NLP are left pending for resolveRawIngredients
+
+    Returns:
+        Tuple[Tuple[any] | None, str]: The recipe details as returned by extractRecipeDetails, and the extraction path of 'json-ld', 'mixed' or 'dom'
+    """
+
+    metrics = getMetrics()
+
+    with metrics.timeStage('parse'):
+        details, source = extractFields(html, recipeUrl, precise, deferRaw)
+
+    metrics.increment('scraper_recipes_total', {'result': source if details else 'extract_failed'})
+    return details, source
+
+
+def extractFields(html: str | bytes, recipeUrl: str, precise: bool, deferRaw: bool, structured: bool = True) -> Tuple[Tuple[any] | None, str]:
+    """
+    Finds the recipe details from the json-ld and page sections of a recipe page, counting the fields of any section that cannot be read.
+
+    Args:
+        html (str | bytes): The html content of the recipe page
+        recipeUrl (str): The recipe page url the content was obtained from
+        precise (bool): Determines whether additional precision should be used for obtaining ingredient names
+        deferRaw (bool): Determines whether ingredients needing the NLP are left pending for resolveRawIngredients
+        structured (bool): Determines whether fields are taken from the json-ld, or every field is read from the page's markup
+
+    Returns:
+        Tuple[Tuple[any] | None, str]: The recipe details, or None if a section could not be read, and the extraction path
+    """
+
+    #obtain the fields available from the json-ld, and the extractors needed for the remainder
+    fields = extractStructuredFields(html) if structured else {}
+    missingExtractors = [extractor for extractor in domExtractors if any(field not in fields for field in extractor[1])]
+
+    #determine the extraction path serving the recipe, judged only on the fields the json-ld can provide
+    if (not fields):
+        source = 'dom'
+    elif (all(field in fields for field in structuredFields)):
+        source = 'json-ld'
+    else:
+        source = 'mixed'
+
+    if (missingExtractors):
+        #create a new soup over only the sections of the html document that are still needed
+        soup = makeSoup(html, [sectionClass for sectionClass, _, _ in missingExtractors])
+
+        try:
+            #fill each missing field from its section
+            for sectionClass, extractorFields, extractor in missingExtractors:
+                for field, value in extractor(soup, precise, deferRaw).items():
+                    fields.setdefault(field, value)
+
+        #if an exception is thrown whilst extracting the data, count the fields of the failing section and return None
+        except(Exception) as e:
+            for field in extractorFields:
+                getMetrics().increment('scraper_extraction_failures_total', {'field': field})
+
+            logger.warning('Error occured accessing recipe at %s', recipeUrl, extra={'url': recipeUrl, 'section': sectionClass, 'error': type(e).__name__})
+            return None, source
+
+    #return the recipe information as a tuple
+    return createRecipe(fields[field] for field in recipeFields), source
+
+
+def extractRecipeDetails(html: str | bytes, recipeUrl: str, precise: bool, deferRaw: bool = False) -> Recipe | None:
+    """
+    Finds the recipe details from the html content of a recipe page.
+
+    Scrapes useful information off the html document and processes them, without making any requests.
+    The structured data embedded in the page is used where possible, falling back to the page's markup for any fields it lacks.
+    
+    Args:
+        html (str | bytes): The html content of the recipe page
+        recipeUrl (str): The recipe page url the content was obtained from
+        precise (bool): Determines whether additional precision should be used for obtaining ingredient names
+        deferRaw (bool): Determines whether ingredients needing the NLP are left pending for resolveRawIngredients
+
+    Returns:
+        Recipe | None: The tuple of recipe attributes scraped from the content or None if it cannot be scraped
         structure:
             - title (str): The title of the recipe.
             - image_link (str): The url of the recipe image.
-            - raw_ingredients (List[str]): List of raw ingredient names.
-            - measured_ingredients (List[str]): List of ingredients with measurements.
-            - method (List[str]): List of cooking steps.
+            - raw_ingredients (Tuple[str, ...] | PendingRawIngredients): Interned raw ingredient names, or the names pending resolution if deferred.
+            - measured_ingredients (Tuple[str, ...]): Ingredients with measurements.
+            - method (Tuple[str, ...]): Cooking steps.
             - author (str): The author of the recipe.
             - prep_time (int): Preparation time in minutes.
             - cook_time (int): Cooking time in minutes.
@@ -155,74 +899,122 @@ def getRecipeDetails(recipeUrl: str, precise: bool) -> Tuple[any] | None:
             - ratings_count (int): Number of ratings given.
             - calories, fat, saturates, carbs, sugars, fibre, protein, salt (float): Nutritional information.
     """
-    #request the url and obtain the response with an appropriate request
-    response = requests.get(recipeUrl)
 
-    #if the page loaded did not load correctly, print an error and return None 
-    if response.status_code != 200:
-        print('Failed to retrieve recipe page.')
-        return None
-        
-    #create a new soup as a html parser over the html document returned
-    soup = BeautifulSoup(response.text, 'html.parser')
+    details, source = extractRecipeDetailsWithSource(html, recipeUrl, precise, deferRaw)
+    recordExtractionSource(recipeUrl, source)
+
+    return details
+
+
+def getRecipeContentHash(html: str) -> str:
+    """
+    Hashes the parts of a recipe page that recipe details are extracted from, so that a page can be recognised as unchanged without extracting it.
+
+    Only the schema.org Recipe json-ld and the page sections read by the markup extractors are hashed, so changes elsewhere on the page, such as adverts or related links, are ignored.
+
+    Args:
+        html (str): The html content of the recipe page
+
+    Returns:
+        str: The hex digest of the recipe content
+    """
+
+    digest = hashlib.sha256()
+
+    #hash the json-ld with its keys sorted, so that reordering alone does not count as a change
+    digest.update(json.dumps(findRecipeNode(html), sort_keys=True).encode('utf-8'))
+
+    #hash the markup of each section in turn
+    sectionClasses = [sectionClass for sectionClass, _, _ in domExtractors]
+    soup = makeSoup(html, sectionClasses)
+
+    for sectionClass in sectionClasses:
+        for section in soup.find_all(class_=sectionClass):
+            digest.update(str(section).encode('utf-8'))
+
+    return digest.hexdigest()
+
+
+def compareParserBackends(html: str, precise: bool = False, repeats: int = 20) -> Dict[str, Tuple[float, bool]]:
+    """
+    Measures the time taken to extract recipe details from a page under each installed parser backend, with and without restricted parsing.
+
+    The json-ld is not used, so that every field is read from the page's markup by its extractor under each configuration.
+    Each configuration's output is checked against that of the full html.parser tree, which the scraper originally used.
+    The configured parser settings are restored afterwards.
+
+    Args:
+        html (str): The html content of a recipe page
+        precise (bool): Determines whether additional precision should be used for obtaining ingredient names
+        repeats (int): The number of times to extract the details under each configuration
+
+    Returns:
+        Dict[str, Tuple[float, bool]]: The mean seconds per page and whether the output matched, keyed by configuration
+    """
+
+    #store the current settings so that they can be restored
+    originalSettings = getParserSettings()
+    results = {}
+    expected = None
 
     try:
-        #obtain the title of  the recipe
-        title = soup.find('div', class_='post-header__title').get_text(strip=True)
+        for backend in parserBackends:
+            for restricted in (False, True):
+                #skip backends that are not installed
+                configureParser(backend, restricted)
 
-        #obtain the image link
-        imageLink = soup.find('div', class_='image__container').find('img', class_='image__img')['src']
+                if getParserSettings()['backend'] != backend:
+                    continue
 
-        #obtain the list of ingredients and initialise measured and raw ingredient list
-        ingredients = soup.find('section', class_='recipe__ingredients').find_all('li')
-        rawIngredients, measuredIngredients = obtainIngredients(ingredients, precise)
+                #time the extraction, keeping the first output for comparison
+                startTime = time.perf_counter()
 
-        #obtain the author div of the page
-        authorDiv = soup.find('div', class_='author-link')
+                for _ in range(repeats):
+                    details, _ = extractFields(html, 'comparison', precise, False, structured=False)
 
-        #if an author for the recipe exists, assign it
-        if (authorDiv):
-            author = authorDiv.get_text(strip=True)
-        else:
-            author = None
+                elapsed = (time.perf_counter() - startTime) / repeats
 
-        #extract method steps and intialise an empty method list
-        steps = soup.find('section', class_='recipe__method-steps').find_all('p')
-        method = []
+                if expected is None:
+                    expected = details
 
-        #populate the method list with the steps found
-        for step in steps:
-            method.append(step.get_text(strip=True))
+                results[f'{backend}{" (restricted)" if restricted else ""}'] = (elapsed, details == expected)
 
-        #obtain the set of prep and cook times and set the times to zero
-        timeElements = soup.select('.post-header__cook-and-prep-time time')
-        prepTime=0
-        cookTime=0
+    finally:
+        configureParser(**originalSettings)
 
-        #reassign the prep and cook times dependent upon their existence
-        if (len(timeElements) > 0):
-            prepTime = timeStringToMinutes(timeElements[0].get_text(strip=True))
-            if (len(timeElements) > 1):
-                cookTime = timeStringToMinutes(timeElements[1].get_text(strip=True))
+    return results
 
-        #obtain the difficulty level of the recipe
-        difficultyLevel = soup.find('div', class_='post-header__skill-level').get_text(strip=True)
 
-        #obtain the rating and ratings count parent div
-        ratingsDiv = soup.find('div', class_='rating__values')
+def compareExtractionPaths(html: str, precise: bool = False) -> Dict[str, Tuple[any, any]]:
+    """
+    Compares the recipe details extracted from a page with and without its json-ld, so that a recorded page can show whether the two paths agree.
+
+    The raw and measured ingredients are compared regardless of order, as neither path keeps the order of the page.
 
-        #find the rating and ratings count numbers by finding the first numerical value in the string
-        rating = findFirstNumber(ratingsDiv.find('span', class_='sr-only').get_text(strip=True))
-        ratingsCount = int(findFirstNumber(ratingsDiv.find('span', class_='rating__count-text').get_text(strip=True)))
+    Args:
+        html (str): The html content of a recipe page
+        precise (bool): Determines whether additional precision should be used for obtaining ingredient names
 
-        #obtain the nutrient information parent table
-        nutritionalContent = soup.find('table', class_='key-value-blocks').find_all('tr', class_='key-value-blocks__item')
-        nutrients = obtainNutrients(nutritionalContent)
+    Returns:
+        Dict[str, Tuple[any, any]]: The value each path gave for every field that differs, with the json-ld path's first, keyed by field
+    """
+
+    structuredDetails, _ = extractFields(html, 'comparison', precise, False)
+    markupDetails, _ = extractFields(html, 'comparison', precise, False, structured=False)
+
+    #if either path could not read the page, report the whole record as differing
+    if structuredDetails is None or markupDetails is None:
+        return {} if structuredDetails == markupDetails else {'details': (structuredDetails, markupDetails)}
+
+    differences = {}
+
+    for field, structuredValue, markupValue in zip(recipeFields, structuredDetails, markupDetails):
+        if field in ('rawIngredients', 'measuredIngredients'):
+            matched = sorted(structuredValue) == sorted(markupValue)
+        else:
+            matched = structuredValue == markupValue
 
-         #return the recipe information as a tuple
-        return (title, imageLink, rawIngredients, measuredIngredients, method, author, prepTime, cookTime, difficultyLevel, rating, ratingsCount, nutrients.get('kcal'), nutrients.get('fat'), nutrients.get('saturates'), nutrients.get('carbs'), nutrients.get('sugars'), nutrients.get('fibre'), nutrients.get('protein'), nutrients.get('salt'))
+        if (not matched):
+            differences[field] = (structuredValue, markupValue)
 
-    #if an exception is thrown whilst extracting the data, output the failure and return None
-    except(Exception):
-        print(f'Error occured accessing recipe at {recipeUrl}')
-        return None
\ No newline at end of file
+    return differences
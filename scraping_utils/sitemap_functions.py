@@ -0,0 +1,204 @@
+#import the necessary modules
+import logging
+import re
+import zlib
+import requests
+from typing import Iterable, Iterator, Tuple
+from urllib.parse import urlsplit
+from xml.etree.ElementTree import ParseError, XMLPullParser
+from scraping_utils.frontier_functions import UrlSet, canonicaliseUrl, recipePathPattern
+from scraping_utils.http_functions import fetchResponse
+from scraping_utils.scraping_functions import getBaseUrl
+from monitoring_utils.metrics_functions import getMetrics
+
+logger = logging.getLogger(__name__)
+
+#define the path of the site's sitemap index, and the pattern picking out recipe sitemaps
+sitemapIndexPath = '/sitemap.xml'
+recipeSitemapPattern = re.compile(r'recipe', re.IGNORECASE)
+
+#set the number of bytes read from a sitemap response at a time
+sitemapChunkSize = 64 * 1024
+
+
+def getLocalName(tag: str) -> str:
+    """
+    Removes the namespace from an element's tag, as sitemaps are written with and without the sitemap namespace.
+
+    Args:
+        tag (str): The tag, such as '{http://www.sitemaps.org/schemas/sitemap/0.9}loc'
+
+    Returns:
+        str: The tag without its namespace, such as 'loc'
+    """
+
+    return tag.rsplit('}', 1)[-1]
+
+
+def iterSitemapEntries(chunks: Iterable[bytes]) -> Iterator[Tuple[str, str, str | None]]:
+    """
+    Parses a sitemap or sitemap index incrementally, yielding each entry as soon as it has been read.
+
+    Each entry's element is discarded once read, so memory use stays flat however many entries the sitemap holds.
+
+    Args:
+        chunks (Iterable[bytes]): The content of the sitemap, in chunks of any size
+
+    Returns:
+        Iterator[Tuple[str, str, str | None]]: The kind of each entry, either 'sitemap' for a child sitemap or 'url' for a page, its location and its lastmod, or None if not given
+    """
+
+    parser = XMLPullParser(events=('start', 'end'))
+    root = None
+
+    for chunk in chunks:
+        parser.feed(chunk)
+
+        for event, element in parser.read_events():
+            if event == 'start':
+                root = element if root is None else root
+                continue
+
+            name = getLocalName(element.tag)
+
+            if name not in ('sitemap', 'url'):
+                continue
+
+            #read the entry's location and lastmod from its children
+            location = lastmod = None
+
+            for child in element:
+                childName = getLocalName(child.tag)
+
+                if childName == 'loc':
+                    location = (child.text or '').strip()
+                elif childName == 'lastmod':
+                    lastmod = (child.text or '').strip() or None
+
+            #discard the entry, detaching it from the root so that read entries do not accumulate
+            element.clear()
+
+            if root is not None and element is not root:
+                try:
+                    root.remove(element)
+                except(ValueError):
+                    pass
+
+            if location:
+                yield name, location, lastmod
+
+    parser.close()
+
+
+def openSitemap(url: str) -> requests.Response | None:
+    """
+    Requests a sitemap through the shared client, without reading its content.
+
+    Args:
+        url (str): The url of the sitemap
+
+    Returns:
+        requests.Response | None: The streamed response, which the caller must close, or None if the sitemap cannot be reached
+    """
+
+    response = fetchResponse(url, stream=True)
+
+    if response is None or response.status_code != 200:
+        status = response.status_code if response is not None else 'unavailable'
+        logger.warning('Failed to retrieve sitemap %s (status %s).', url, status, extra={'url': url, 'status': status})
+
+        if response is not None:
+            response.close()
+
+        return None
+
+    return response
+
+
+def iterSitemapChunks(response: requests.Response) -> Iterator[bytes]:
+    """
+    Reads the content of a streamed sitemap response in chunks, decompressing it if it is a gzipped sitemap.
+
+    Args:
+        response (requests.Response): The streamed response
+
+    Returns:
+        Iterator[bytes]: The chunks of the sitemap's xml
+    """
+
+    #a gzipped sitemap is served as a gzip file, rather than with a gzip content encoding the client decodes
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if urlsplit(response.url).path.endswith('.gz') else None
+
+    for chunk in response.iter_content(sitemapChunkSize):
+        yield decompressor.decompress(chunk) if decompressor else chunk
+
+    if decompressor:
+        yield decompressor.flush()
+
+
+def isRecipeUrl(url: str) -> bool:
+    """
+    Determines whether a url is of a recipe page, rather than a collection, category or other page.
+
+    Args:
+        url (str): The url of the page
+
+    Returns:
+        bool: Whether the url is of a recipe page
+    """
+
+    return recipePathPattern.match(urlsplit(url).path) is not None
+
+
+def iterRecipeUrlsFromSitemap(sitemapUrl: str | None = None) -> Iterator[Tuple[str, str | None]]:
+    """
+    Lazily finds the recipe urls listed in the site's sitemaps, along with when each was last modified.
+
+    The sitemap index is read first, then each recipe sitemap it lists, following nested indexes.
+    Every sitemap is streamed and parsed incrementally, so urls are yielded as they are read and only requested as they are consumed.
+    Urls are canonicalised, and deduplicated through a UrlSet so that memory use stays flat however many recipes are listed.
+    A sitemap that cannot be reached or parsed is skipped, and each sitemap's outcome is counted.
+
+    Args:
+        sitemapUrl (str | None): The url of the sitemap index, or None to use the index of the configured base url
+
+    Returns:
+        Iterator[Tuple[str, str | None]]: The distinct recipe urls found, with their lastmod, or None if not given
+    """
+
+    pendingSitemaps = [sitemapUrl or f'{getBaseUrl()}{sitemapIndexPath}']
+    seenSitemaps = set(pendingSitemaps)
+    metrics = getMetrics()
+
+    with UrlSet() as seenUrls:
+        while pendingSitemaps:
+            url = pendingSitemaps.pop(0)
+            logger.info('Reading sitemap %s', url, extra={'url': url})
+            response = openSitemap(url)
+
+            if response is None:
+                metrics.increment('scraper_sitemaps_total', {'result': 'fetch_failed'})
+                continue
+
+            try:
+                with response:
+                    for kind, location, lastmod in iterSitemapEntries(iterSitemapChunks(response)):
+                        #queue each child sitemap listing recipes, and yield each canonical recipe url not already seen
+                        if kind == 'sitemap':
+                            if location not in seenSitemaps and recipeSitemapPattern.search(location):
+                                seenSitemaps.add(location)
+                                pendingSitemaps.append(location)
+
+                        elif isRecipeUrl(location):
+                            location = canonicaliseUrl(location)
+
+                            if seenUrls.add(location):
+                                yield location, lastmod
+
+            #if the sitemap is malformed or its connection drops, skip the rest of it
+            except(ParseError, zlib.error, requests.exceptions.RequestException) as e:
+                metrics.increment('scraper_sitemaps_total', {'result': 'parse_failed'})
+                logger.warning('Error occured parsing sitemap %s: %s', url, e, extra={'url': url, 'error': type(e).__name__})
+                continue
+
+            metrics.increment('scraper_sitemaps_total', {'result': 'ok'})
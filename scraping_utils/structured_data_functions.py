@@ -0,0 +1,165 @@
+#import the necessary modules
+import html as htmlEntities
+import json
+import re
+from typing import Dict, List
+from text_utils.text_manipulation import findFirstNumber, isoDurationToMinutes
+
+#define a regex pattern locating the json-ld script blocks of a page, without building a document tree
+jsonLdPattern = re.compile(r'<script[^>]*type\s*=\s*["\']application/ld\+json["\'][^>]*>(.*?)</script\s*>', re.IGNORECASE | re.DOTALL)
+tagPattern = re.compile(r'<[^>]+>')
+
+#define the recipe detail fields taken from the json-ld, which it gives exactly as the page's markup shows them
+#the image link, author, ingredients and nutrients are always read from the markup, as the json-ld gives a different image rendition, every author rather than the byline, ingredient text without the markup's whitespace and link text, and nutrients without salt
+structuredFields = ('title', 'method', 'prepTime', 'cookTime', 'rating', 'ratingsCount')
+
+
+def cleanText(text: str) -> str:
+    """
+    Removes any markup and entities from a piece of structured data text.
+
+    Args:
+        text (str): The text to clean
+
+    Returns:
+        str: The plain text, with surrounding whitespace removed
+    """
+
+    return htmlEntities.unescape(tagPattern.sub('', text)).strip()
+
+
+def isRecipe(node: any) -> bool:
+    """
+    Determines whether a json-ld node describes a schema.org Recipe.
+
+    Args:
+        node (any): The decoded json-ld node
+
+    Returns:
+        bool: Whether the node is a Recipe
+    """
+
+    if not isinstance(node, dict):
+        return False
+
+    nodeType = node.get('@type')
+    return nodeType == 'Recipe' or (isinstance(nodeType, list) and 'Recipe' in nodeType)
+
+
+def findRecipeNode(html: str) -> Dict[str, any] | None:
+    """
+    Finds the schema.org Recipe node in the json-ld blocks of a page.
+
+    Blocks may hold a single node, a list of nodes or a @graph of nodes. Blocks that cannot be decoded are skipped.
+
+    Args:
+        html (str): The html content of the page
+
+    Returns:
+        Dict[str, any] | None: The decoded Recipe node, or None if the page has none
+    """
+
+    for match in jsonLdPattern.finditer(html):
+        try:
+            data = json.loads(match.group(1))
+        except(ValueError):
+            continue
+
+        #gather the candidate nodes in the block
+        nodes = data if isinstance(data, list) else [data]
+        nodes = nodes + [node for parent in nodes if isinstance(parent, dict) for node in parent.get('@graph', [])]
+
+        for node in nodes:
+            if isRecipe(node):
+                return node
+
+    return None
+
+
+def obtainMethod(instructions: any) -> List[str] | None:
+    """
+    Finds the method steps from schema.org instructions, which may be text, HowToSteps or HowToSections of steps.
+
+    Args:
+        instructions (any): The recipeInstructions property of a Recipe node
+
+    Returns:
+        List[str] | None: The text of each step, or None if no steps are found
+    """
+
+    method = []
+
+    #flatten the instructions into their steps
+    pending = list(instructions) if isinstance(instructions, list) else [instructions]
+
+    while pending:
+        step = pending.pop(0)
+
+        if isinstance(step, str):
+            text = cleanText(step)
+        elif isinstance(step, dict) and 'itemListElement' in step:
+            pending = list(step['itemListElement']) + pending
+            continue
+        elif isinstance(step, dict):
+            text = cleanText(str(step.get('text', '')))
+        else:
+            continue
+
+        if text:
+            method.append(text)
+
+    return method or None
+
+
+def extractStructuredFields(html: str | bytes) -> Dict[str, any]:
+    """
+    Finds the recipe detail fields available from the schema.org Recipe json-ld of a page.
+
+    Only the fields of structuredFields that are present and well formed are returned, so that the remainder can be obtained from the page's markup.
+
+    Args:
+        html (str | bytes): The html content of the recipe page
+
+    Returns:
+        Dict[str, any]: The recipe detail fields found, keyed by field name
+    """
+
+    if isinstance(html, bytes):
+        html = html.decode('utf-8', errors='replace')
+
+    #find the recipe node, returning no fields if there is none
+    recipe = findRecipeNode(html)
+    fields = {}
+
+    if recipe is None:
+        return fields
+
+    #obtain the title and method
+    if isinstance(recipe.get('name'), str) and recipe['name'].strip():
+        fields['title'] = cleanText(recipe['name'])
+
+    method = obtainMethod(recipe.get('recipeInstructions'))
+
+    if method:
+        fields['method'] = method
+
+    #obtain the prep and cook times from their durations
+    for field, key in (('prepTime', 'prepTime'), ('cookTime', 'cookTime')):
+        if isinstance(recipe.get(key), str):
+            minutes = isoDurationToMinutes(recipe[key])
+
+            if minutes is not None:
+                fields[field] = minutes
+
+    #obtain the rating and ratings count
+    aggregateRating = recipe.get('aggregateRating')
+
+    if isinstance(aggregateRating, dict):
+        rating = findFirstNumber(str(aggregateRating.get('ratingValue', '')))
+        ratingsCount = findFirstNumber(str(aggregateRating.get('ratingCount', aggregateRating.get('reviewCount', ''))))
+
+        if rating is not None and ratingsCount is not None:
+            fields['rating'] = rating
+            fields['ratingsCount'] = int(ratingsCount)
+
+    return fields
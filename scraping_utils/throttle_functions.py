@@ -0,0 +1,357 @@
+#import the necessary modules
+import logging
+import threading
+import time
+from typing import Dict
+from urllib.parse import urlsplit
+from monitoring_utils.metrics_functions import getMetrics
+
+logger = logging.getLogger(__name__)
+
+#define the status codes signalling that a host is overloaded or throttling requests
+throttleStatusCodes = {429, 503}
+
+
+class TokenBucket:
+    """
+    A token bucket pacing requests to a rate, allowing a short burst after an idle period.
+
+    The bucket holds no lock of its own, as it is only used under its HostController's lock.
+    """
+
+    def __init__(self, rate: float, burst: float) -> None:
+        """
+        Creates a full bucket.
+
+        Args:
+            rate (float): The number of tokens added per second
+            burst (float): The maximum number of tokens held
+        """
+
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+
+    def refill(self, now: float) -> None:
+        """
+        Adds the tokens accrued since the bucket was last updated.
+
+        Args:
+            now (float): The current monotonic time
+
+        Returns:
+            None
+        """
+
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+    def take(self, now: float) -> float:
+        """
+        Takes a token if one is available.
+
+        Args:
+            now (float): The current monotonic time
+
+        Returns:
+            float: Zero if a token was taken, or otherwise the number of seconds until one is available
+        """
+
+        self.refill(now)
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+
+        return (1 - self.tokens) / self.rate
+
+
+class HostController:
+    """
+    Paces and limits the requests made to a single host, adapting both to how the host responds.
+
+    Requests wait for a token from a token bucket and for a free slot under the concurrency limit.
+    The rate and limit rise additively after each window of healthy responses, and are cut multiplicatively on a 429 or 503 response,
+    a dropped connection, or a smoothed latency rising well above its recent best, at most once per cooldown.
+    A Retry-After header pauses every request to the host until the time it gives.
+    """
+
+    def __init__(self, host: str, initialRate: float = 4.0, minRate: float = 0.5, maxRate: float = 20.0, initialConcurrency: int = 2, minConcurrency: int = 1, maxConcurrency: int = 8, rateIncrease: float = 0.5, decreaseFactor: float = 0.5, latencyTolerance: float = 2.0, cooldown: float = 2.0, burst: float = 2.0) -> None:
+        """
+        Creates a controller for a host.
+
+        Args:
+            host (str): The host whose requests are controlled
+            initialRate (float): The number of requests per second allowed at first
+            minRate (float): The lowest rate backing off can reach
+            maxRate (float): The highest rate increases can reach
+            initialConcurrency (int): The number of requests allowed in flight at first
+            minConcurrency (int): The lowest concurrency limit backing off can reach
+            maxConcurrency (int): The highest concurrency limit increases can reach
+            rateIncrease (float): The requests per second added after each window of healthy responses
+            decreaseFactor (float): The factor the rate and concurrency limit are multiplied by when backing off
+            latencyTolerance (float): The multiple of the baseline latency beyond which latency is treated as congestion
+            cooldown (float): The minimum number of seconds between back offs, so that one burst of failures only counts once
+            burst (float): The number of requests that can be sent at once after an idle period
+        """
+
+        self.host = host
+        self.minRate = minRate
+        self.maxRate = max(minRate, maxRate)
+        self.minConcurrency = max(1, minConcurrency)
+        self.maxConcurrency = max(self.minConcurrency, maxConcurrency)
+        self.rateIncrease = rateIncrease
+        self.decreaseFactor = decreaseFactor
+        self.latencyTolerance = latencyTolerance
+        self.cooldown = cooldown
+
+        self.bucket = TokenBucket(min(max(initialRate, minRate), self.maxRate), burst)
+        self.concurrency = min(max(initialConcurrency, self.minConcurrency), self.maxConcurrency)
+        self.condition = threading.Condition()
+        self.inFlight = 0
+        self.successes = 0
+        self.latency = None
+        self.baselineLatency = None
+        self.pausedUntil = 0.0
+        self.lastDecrease = 0.0
+
+        self.publish()
+
+
+    def acquire(self) -> None:
+        """
+        Waits until a request can be sent to the host, then counts it as in flight.
+
+        Returns:
+            None
+        """
+
+        with self.condition:
+            while True:
+                now = time.monotonic()
+
+                #wait out any pause requested by the host, and for a free slot under the limit
+                if now < self.pausedUntil:
+                    self.condition.wait(self.pausedUntil - now)
+                    continue
+
+                if self.inFlight >= self.concurrency:
+                    self.condition.wait()
+                    continue
+
+                #wait for a token, re-checking the pause and limit as either may have changed meanwhile
+                wait = self.bucket.take(now)
+
+                if wait > 0:
+                    self.condition.wait(wait)
+                    continue
+
+                self.inFlight += 1
+                return
+
+
+    def release(self, status: int | None, latency: float) -> None:
+        """
+        Counts a request as finished, adapting the rate and concurrency limit to its outcome.
+
+        Args:
+            status (int | None): The status code of the response, or None if the connection failed
+            latency (float): The number of seconds the request took
+
+        Returns:
+            None
+        """
+
+        with self.condition:
+            self.inFlight -= 1
+
+            if status is None or status in throttleStatusCodes:
+                self.decrease('throttled' if status else 'connection')
+            elif status < 500:
+                #smooth the latency, tracking the fastest smoothed latency as the healthy baseline
+                #the baseline drifts slowly towards the current latency, so a lasting change in the host's speed becomes the new norm
+                self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+                self.baselineLatency = self.latency if self.baselineLatency is None else min(self.latency, self.baselineLatency + 0.01 * (self.latency - self.baselineLatency))
+
+                if self.latency > self.latencyTolerance * self.baselineLatency:
+                    self.decrease('latency')
+                else:
+                    self.increase()
+
+            self.condition.notify_all()
+
+
+    def increase(self) -> None:
+        """
+        Raises the rate and concurrency limit additively once a full window of healthy responses has been received.
+
+        The caller must hold the controller's lock.
+
+        Returns:
+            None
+        """
+
+        self.successes += 1
+
+        if self.successes < self.concurrency:
+            return
+
+        self.successes = 0
+        self.concurrency = min(self.concurrency + 1, self.maxConcurrency)
+        self.bucket.rate = min(self.bucket.rate + self.rateIncrease, self.maxRate)
+        self.publish()
+
+
+    def decrease(self, reason: str) -> None:
+        """
+        Cuts the rate and concurrency limit multiplicatively, unless they were already cut within the cooldown.
+
+        The caller must hold the controller's lock.
+
+        Args:
+            reason (str): Why the host appears overloaded, either 'throttled', 'connection' or 'latency'
+
+        Returns:
+            None
+        """
+
+        now = time.monotonic()
+        self.successes = 0
+
+        if now - self.lastDecrease < self.cooldown:
+            return
+
+        self.lastDecrease = now
+        self.concurrency = max(int(self.concurrency * self.decreaseFactor), self.minConcurrency)
+        self.bucket.rate = max(self.bucket.rate * self.decreaseFactor, self.minRate)
+
+        #allow the latency to recover to its baseline before it can trigger another cut
+        if reason == 'latency':
+            self.latency = self.baselineLatency
+
+        getMetrics().increment('scraper_throttle_events_total', {'host': self.host, 'reason': reason})
+        logger.info('Backing off %s (%s): %.1f requests per second, %d in flight', self.host, reason, self.bucket.rate, self.concurrency, extra={'host': self.host, 'reason': reason})
+        self.publish()
+
+
+    def pause(self, seconds: float) -> None:
+        """
+        Pauses every request to the host, as asked by a Retry-After header.
+
+        Args:
+            seconds (float): The number of seconds to pause for
+
+        Returns:
+            None
+        """
+
+        with self.condition:
+            self.pausedUntil = max(self.pausedUntil, time.monotonic() + seconds)
+            self.condition.notify_all()
+
+
+    def publish(self) -> None:
+        """
+        Exposes the current rate and concurrency limit as gauges.
+
+        Returns:
+            None
+        """
+
+        getMetrics().setGauge('scraper_host_rate', self.bucket.rate, {'host': self.host})
+        getMetrics().setGauge('scraper_host_concurrency', self.concurrency, {'host': self.host})
+
+
+    def getState(self) -> Dict[str, any]:
+        """
+        Obtains the controller's current rate, limit and view of the host.
+
+        Returns:
+            Dict[str, any]: The requests per second, concurrency limit, requests in flight, smoothed and baseline latency, and seconds left of any pause
+        """
+
+        with self.condition:
+            return {
+                'rate': self.bucket.rate,
+                'concurrency': self.concurrency,
+                'inFlight': self.inFlight,
+                'latency': self.latency,
+                'baselineLatency': self.baselineLatency,
+                'pausedFor': max(0.0, self.pausedUntil - time.monotonic())
+            }
+
+
+#hold the settings of the rate limiter, which is disabled until configured, and the controller of each host
+rateLimiterSettings = None
+controllers = {}
+controllersLock = threading.Lock()
+
+
+def configureRateLimiter(enabled: bool = True, **settings: any) -> None:
+    """
+    Configures the adaptive rate limiting applied to every request made by the scraper, discarding the state of each host.
+
+    Args:
+        enabled (bool): Determines whether requests are rate limited at all
+        **settings (any): The keyword arguments of HostController, such as maxRate and maxConcurrency, applied to each host
+
+    Returns:
+        None
+    """
+
+    global rateLimiterSettings
+
+    with controllersLock:
+        rateLimiterSettings = dict(settings) if enabled else None
+        controllers.clear()
+
+
+def getRateLimiterSettings() -> Dict[str, any]:
+    """
+    Obtains the settings of the rate limiter, so that they can be passed to worker processes.
+
+    Returns:
+        Dict[str, any]: The keyword arguments of configureRateLimiter that recreate the current configuration
+    """
+
+    return dict(rateLimiterSettings, enabled=True) if rateLimiterSettings is not None else {'enabled': False}
+
+
+def getHostController(url: str) -> HostController | None:
+    """
+    Obtains the controller of the host a url belongs to, creating it on first use.
+
+    Args:
+        url (str): The url about to be requested
+
+    Returns:
+        HostController | None: The host's controller, or None if rate limiting is disabled
+    """
+
+    if rateLimiterSettings is None:
+        return None
+
+    host = urlsplit(url).netloc
+
+    with controllersLock:
+        if host not in controllers:
+            controllers[host] = HostController(host, **rateLimiterSettings)
+
+        return controllers[host]
+
+
+def getRateLimiterState() -> Dict[str, Dict[str, any]]:
+    """
+    Obtains the current rate and concurrency limit of each host, for tuning throughput against politeness.
+
+    Returns:
+        Dict[str, Dict[str, any]]: The state of each host's controller, as returned by getState, keyed by host
+    """
+
+    with controllersLock:
+        hostControllers = dict(controllers)
+
+    return {host: controller.getState() for host, controller in hostControllers.items()}
@@ -1,10 +1,11 @@
 import subprocess
 import nltk
 
-#install bs4 and requests
+#install bs4, requests and numpy
 subprocess.run(['pip', 'install', 'requests'])
 subprocess.run(['pip', 'install', 'bs4'])
 subprocess.run(['pip', 'install', 'ingredient-parser-nlp'])
+subprocess.run(['pip', 'install', 'numpy'])
 
 # Download NLTK resources
 nltk.download('averaged_perceptron_tagger')
@@ -0,0 +1,274 @@
+#import the necessary modules
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from importlib.metadata import PackageNotFoundError, version
+from typing import Dict, Tuple
+from monitoring_utils.metrics_functions import getMetrics
+
+
+def getParserVersion() -> str:
+    """
+    Finds the installed version of the ingredient parser, which determines whether cached results are still valid.
+
+    Returns:
+        str: The installed version, or 'unknown' if it cannot be determined
+    """
+
+    try:
+        return version('ingredient-parser-nlp')
+    except(PackageNotFoundError):
+        return 'unknown'
+
+
+def normaliseIngredientText(ingredientText: str) -> str:
+    """
+    Normalises a measured ingredient string so that trivially different forms share a cache entry.
+
+    Unicode compatibility forms (such as fraction characters) are normalised and runs of whitespace collapsed.
+    Case is preserved, as the parser's output can depend on it.
+
+    Args:
+        ingredientText (str): The measured ingredient string
+
+    Returns:
+        str: The normalised string
+    """
+
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFKC', ingredientText)).strip()
+
+
+class IngredientCache:
+    """
+    A two tier cache of raw ingredient names keyed on normalised measured ingredient text.
+
+    The first tier is an in-process least recently used cache. The optional second tier is a SQLite store shared between runs and worker processes.
+    The store is cleared whenever the installed ingredient parser version differs from the one that populated it.
+    """
+
+    def __init__(self, path: str | None = None, memorySize: int = 50000) -> None:
+        """
+        Creates a cache, opening or creating its persistent store if a path is given.
+
+        Args:
+            path (str | None): The SQLite file to persist results in, or None to keep results in memory only
+            memorySize (int): The maximum number of results held in memory
+        """
+
+        self.path = path
+        self.memorySize = memorySize
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.statistics = {'memoryHits': 0, 'diskHits': 0, 'misses': 0}
+        self.connection = None
+
+        if path:
+            #open the store, shared with other processes, waiting on their writes rather than failing
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.connection = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS ingredients (text TEXT PRIMARY KEY, name TEXT)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT)')
+
+            #invalidate the stored results if they were produced by a different parser version
+            parserVersion = getParserVersion()
+            row = self.connection.execute("SELECT value FROM metadata WHERE key = 'parserVersion'").fetchone()
+
+            if row is None or row[0] != parserVersion:
+                self.connection.execute('DELETE FROM ingredients')
+                self.connection.execute("INSERT OR REPLACE INTO metadata (key, value) VALUES ('parserVersion', ?)", (parserVersion,))
+
+            self.connection.commit()
+
+
+    def get(self, key: str) -> Tuple[bool, str | None]:
+        """
+        Finds the cached raw ingredient name for a normalised ingredient string.
+
+        Args:
+            key (str): The normalised ingredient string
+
+        Returns:
+            Tuple[bool, str | None]: Whether a result was cached, and the cached name (which may itself be None)
+        """
+
+        with self.lock:
+            #check the in memory tier, marking the entry as recently used
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.statistics['memoryHits'] += 1
+                result, outcome = (True, self.memory[key]), 'memory_hit'
+
+            else:
+                #check the persistent tier, promoting any result found into memory
+                row = self.connection.execute('SELECT name FROM ingredients WHERE text = ?', (key,)).fetchone() if self.connection else None
+
+                if row:
+                    self.statistics['diskHits'] += 1
+                    self.remember(key, row[0])
+                    result, outcome = (True, row[0]), 'disk_hit'
+                else:
+                    self.statistics['misses'] += 1
+                    result, outcome = (False, None), 'miss'
+
+        getMetrics().increment('scraper_ingredient_cache_requests_total', {'result': outcome})
+        return result
+
+
+    def put(self, key: str, name: str | None) -> None:
+        """
+        Stores the raw ingredient name found for a normalised ingredient string in both tiers.
+
+        Args:
+            key (str): The normalised ingredient string
+            name (str | None): The raw ingredient name found, or None if the parser found no name
+
+        Returns:
+            None
+        """
+
+        with self.lock:
+            self.remember(key, name)
+
+            if self.connection:
+                self.connection.execute('INSERT OR REPLACE INTO ingredients (text, name) VALUES (?, ?)', (key, name))
+                self.connection.commit()
+
+
+    def remember(self, key: str, name: str | None) -> None:
+        """
+        Stores a result in the in memory tier, evicting the least recently used result if full.
+
+        The caller must hold the cache lock.
+
+        Args:
+            key (str): The normalised ingredient string
+            name (str | None): The raw ingredient name
+
+        Returns:
+            None
+        """
+
+        self.memory[key] = name
+        self.memory.move_to_end(key)
+
+        if len(self.memory) > self.memorySize:
+            self.memory.popitem(last=False)
+
+
+    def getStatistics(self) -> Dict[str, int]:
+        """
+        Obtains the hit and miss counts of this cache.
+
+        Returns:
+            Dict[str, int]: The number of memory hits, disk hits and misses
+        """
+
+        with self.lock:
+            return dict(self.statistics)
+
+
+    def close(self) -> None:
+        """
+        Closes the persistent store, if one is open.
+
+        Returns:
+            None
+        """
+
+        with self.lock:
+            if self.connection:
+                self.connection.close()
+                self.connection = None
+
+
+#hold the cache used by findRawIngredient and the settings it was created with, so they can be passed to worker processes
+ingredientCacheSettings = {'path': None, 'memorySize': 50000}
+ingredientCache = IngredientCache()
+
+#hold the latest statistics reported by each worker process
+workerStatistics = {}
+workerStatisticsLock = threading.Lock()
+
+
+def configureIngredientCache(path: str | None = None, memorySize: int = 50000) -> None:
+    """
+    Configures the cache used for raw ingredient names.
+
+    Args:
+        path (str | None): The SQLite file to persist results in, or None to keep results in memory only
+        memorySize (int): The maximum number of results held in memory
+
+    Returns:
+        None
+    """
+
+    global ingredientCache
+
+    ingredientCache.close()
+    ingredientCacheSettings.update(path=path, memorySize=memorySize)
+    ingredientCache = IngredientCache(path, memorySize)
+
+
+def getIngredientCache() -> IngredientCache:
+    """
+    Obtains the cache used for raw ingredient names.
+
+    Returns:
+        IngredientCache: The configured cache
+    """
+
+    return ingredientCache
+
+
+def getIngredientCacheSettings() -> Dict[str, any]:
+    """
+    Obtains a copy of the settings of the cache used for raw ingredient names, so that they can be passed to worker processes.
+
+    Returns:
+        Dict[str, any]: The current cache settings
+    """
+
+    return dict(ingredientCacheSettings)
+
+
+def recordWorkerStatistics(workerId: int, statistics: Dict[str, int]) -> None:
+    """
+    Records the latest cache statistics reported by a worker process.
+
+    Args:
+        workerId (int): The process id of the worker
+        statistics (Dict[str, int]): The worker's cumulative cache statistics
+
+    Returns:
+        None
+    """
+
+    with workerStatisticsLock:
+        workerStatistics[workerId] = statistics
+
+
+def getIngredientCacheStatistics() -> Dict[str, any]:
+    """
+    Obtains the combined hit and miss counts of this process's cache and those reported by worker processes.
+
+    Returns:
+        Dict[str, any]: The number of memory hits, disk hits and misses, along with the overall hit rate
+    """
+
+    #sum the statistics of this process and each worker
+    totals = ingredientCache.getStatistics()
+
+    with workerStatisticsLock:
+        for statistics in workerStatistics.values():
+            for key, value in statistics.items():
+                totals[key] += value
+
+    #derive the proportion of lookups served by either tier
+    lookups = totals['memoryHits'] + totals['diskHits'] + totals['misses']
+    totals['hitRate'] = (totals['memoryHits'] + totals['diskHits']) / lookups if lookups else 0.0
+
+    return totals
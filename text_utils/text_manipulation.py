@@ -1,7 +1,22 @@
 #import the regex library
 import re
-from typing import List
-from ingredient_parser import parse_ingredient
+from types import ModuleType
+from typing import Iterable, List, NamedTuple
+from text_utils.ingredient_cache import getIngredientCache, normaliseIngredientText
+from monitoring_utils.metrics_functions import getMetrics
+
+class PendingRawIngredients(NamedTuple):
+    """
+    The raw ingredients of a recipe whose NLP resolution has been deferred to a batch stage.
+
+    Attributes:
+        resolved (List[str]): The raw ingredient names already known, such as those taken from ingredient links
+        pending (List[str]): The measured ingredient strings still to be run through the NLP
+    """
+
+    resolved: List[str]
+    pending: List[str]
+
 
 def findFirstNumber(text: str) -> float | None:
     """
@@ -69,12 +84,57 @@ def timeStringToMinutes(text: str) -> int:
     totalMinutes += totalHours * 60
 
     return totalMinutes
+
+
+def isoDurationToMinutes(text: str) -> int | None:
+    """
+    Finds the total number of minutes from an ISO-8601 duration, such as PT1H10M.
+
+    Days, hours and minutes are summed, and any seconds are rounded down to whole minutes.
+    
+    Args:
+        text (str): The duration to inspect
+
+    Returns:
+        int | None: The total number of minutes in the duration, or None if the text is not a duration
+    """
+
+    #define a regex pattern for the day, hour, minute and second components of a duration
+    durationPattern = re.compile(r'^P(?:(\d+(?:\.\d+)?)D)?(?:T(?:(\d+(?:\.\d+)?)H)?(?:(\d+(?:\.\d+)?)M)?(?:(\d+(?:\.\d+)?)S)?)?$')
+
+    #if the text is not a duration, return None
+    match = durationPattern.match(text.strip().upper())
+
+    if not match:
+        return None
+
+    #convert each component present to minutes and sum them
+    days, hours, minutes, seconds = (float(value) if value else 0.0 for value in match.groups())
+
+    return int(days * 1440 + hours * 60 + minutes + seconds / 60)
+
+
+
+def getIngredientParser() -> ModuleType:
+    """
+    Obtains the ingredient_parser module, importing it on first use.
+
+    Importing the module loads its NLP model, which is slow, so it is deferred until an ingredient actually needs parsing.
+
+    Returns:
+        ModuleType: The ingredient_parser module
+    """
+
+    import ingredient_parser
+    return ingredient_parser
+
         
 def findRawIngredient(ingredientText: str) -> str:
     """
     Approximates a raw ingredient from a measured ingredient piece of text.
 
     Calls the ingredient_parser NLP to find and return the most suitable ingredient name.
+    Results are memoised against the normalised text, so repeated ingredients are only parsed once.
     
     Args:
         ingredientText (str): The measured ingredient string to inspect
@@ -82,7 +142,118 @@ def findRawIngredient(ingredientText: str) -> str:
     Returns:
         str | None: The raw ingredient name, or None if no name could be found
     """
+
+    #serve the name from the cache if this ingredient has already been parsed
+    cache = getIngredientCache()
+    key = normaliseIngredientText(ingredientText)
+    cached, name = cache.get(key)
+
+    if cached:
+        return name
+
+    #otherwise parse the ingredient, timed as the nlp stage, only caching the result if the parser ran successfully
     try:
-        return parse_ingredient(ingredientText).name.text
+        with getMetrics().timeStage('nlp'):
+            name = obtainIngredientName(getIngredientParser().parse_ingredient(key))
     except(Exception):
+        getMetrics().increment('scraper_extraction_failures_total', {'field': 'rawIngredients'})
         return None
+
+    cache.put(key, name)
+    return name
+
+
+def findRawIngredients(ingredientTexts: Iterable[str], batchSize: int = 256) -> List[str | None]:
+    """
+    Approximates the raw ingredients from many measured ingredient pieces of text at once.
+
+    The texts are normalised and deduplicated, and only those not already cached are run through the ingredient_parser NLP, in batches.
+    The results are then scattered back to match the order of the texts supplied.
+    
+    Args:
+        ingredientTexts (Iterable[str]): The measured ingredient strings to inspect, which may be pooled from many recipes
+        batchSize (int): The number of distinct uncached strings passed to the parser at once
+
+    Returns:
+        List[str | None]: The raw ingredient name of each string, or None where no name could be found
+    """
+
+    #normalise each text, finding the distinct strings not already cached
+    cache = getIngredientCache()
+    keys = [normaliseIngredientText(ingredientText) for ingredientText in ingredientTexts]
+    names = {}
+
+    for key in dict.fromkeys(keys):
+        cached, name = cache.get(key)
+
+        if cached:
+            names[key] = name
+
+    uncachedKeys = [key for key in dict.fromkeys(keys) if key not in names]
+
+    #parse the uncached strings in batches, caching each result
+    for start in range(0, len(uncachedKeys), max(1, batchSize)):
+        batch = uncachedKeys[start:start + max(1, batchSize)]
+
+        for key, name in zip(batch, parseIngredientBatch(batch)):
+            names[key] = name
+
+    #scatter the names back to the order supplied
+    return [names.get(key) for key in keys]
+
+
+def parseIngredientBatch(keys: List[str]) -> List[str | None]:
+    """
+    Runs a batch of normalised ingredient strings through the ingredient_parser NLP, caching each successful result.
+
+    If the batch as a whole fails, each string is parsed individually so that one bad string does not lose the rest.
+
+    Args:
+        keys (List[str]): The normalised ingredient strings to parse
+
+    Returns:
+        List[str | None]: The raw ingredient name of each string, or None where no name could be found
+    """
+
+    cache = getIngredientCache()
+
+    try:
+        with getMetrics().timeStage('nlp'):
+            names = [obtainIngredientName(parsedIngredient) for parsedIngredient in getIngredientParser().parse_multiple_ingredients(keys)]
+    except(Exception):
+        return [findRawIngredient(key) for key in keys]
+
+    for key, name in zip(keys, names):
+        cache.put(key, name)
+
+    return names
+
+
+def obtainIngredientName(parsedIngredient: any) -> str | None:
+    """
+    Finds the ingredient name from a parsed ingredient, which is a single name in older versions of ingredient_parser and a list of names in newer ones.
+
+    Args:
+        parsedIngredient (any): The parsed ingredient returned by parse_ingredient
+
+    Returns:
+        str | None: The text of the first ingredient name, or None if the parser found no name
+    """
+
+    name = parsedIngredient.name
+
+    if isinstance(name, list):
+        name = name[0] if name else None
+
+    return name.text if name else None
+
+
+def loadIngredientParser() -> None:
+    """
+    Loads the ingredient_parser NLP model ahead of use, by parsing a sample ingredient.
+
+    Returns:
+        None
+    """
+
+    findRawIngredient('1 tbsp olive oil')